@@ -7,6 +7,31 @@ class Settings(BaseSettings):
     # Configuración de la base de datos
     DATABASE_URL: str = "sqlite:///./app.db"
 
+    # Pragmas de SQLite por conexión: en WAL los lectores no esperan al escritor y
+    # synchronous=NORMAL es seguro con WAL (sin fsync por commit). busy_timeout hace que un
+    # segundo escritor espere el bloqueo en vez de fallar con "database is locked".
+    # Medir con scripts/benchmark_database.py
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_CACHE_SIZE_KIB: int = 64 * 1024
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+
+    # Pool de conexiones de cada motor (uno síncrono y otro asíncrono por proceso). En SQLite
+    # hay un solo escritor a la vez: más conexiones solo sirven para lecturas concurrentes
+    SQLITE_POOL_SIZE: int = 5
+    SQLITE_MAX_OVERFLOW: int = 10
+    # PostgreSQL: cada worker de cada nodo abre hasta 2 × (POOL_SIZE + MAX_OVERFLOW)
+    # conexiones; el total de la flota tiene que entrar en max_connections del servidor
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_MAX_OVERFLOW: int = 5
+    DATABASE_POOL_TIMEOUT: float = 30.0
+    # Pre-ping y reciclado: descartar conexiones que cortó el servidor o un balanceador
+    DATABASE_POOL_PRE_PING: bool = True
+    DATABASE_POOL_RECYCLE_SECONDS: int = 1800
+    # Tiempo máximo de una sentencia en PostgreSQL (0 = sin límite); las migraciones no lo usan
+    DATABASE_STATEMENT_TIMEOUT_MS: int = 30000
+
     # Configuración de seguridad
     SECRET_KEY: str = "tu_clave_secreta_aqui"  # Cambiar en producción
     ALGORITHM: str = "HS256"
@@ -16,8 +41,135 @@ class Settings(BaseSettings):
     MODEL_PATH: str = str(Path(__file__).parent / "models" / "keras_model.h5")
     CLASS_NAMES: list[str] = ["Sanas", "Coriza", "Gumboro", "Newcastle", "Bronquitis"]
 
+    # Backend de inferencia: "keras" (h5 original), "tflite", "onnx" o "remoto"
+    INFERENCE_BACKEND: str = "keras"
+    TFLITE_MODEL_PATH: str = str(Path(__file__).parent / "models" / "keras_model_int8.tflite")
+    ONNX_MODEL_PATH: str = str(Path(__file__).parent / "models" / "keras_model.onnx")
+
+    # Servidor de inferencia dedicado (INFERENCE_BACKEND="remoto"): socket Unix dentro de un
+    # directorio privado (0700, lo crea el servidor) o host:puerto solo en loopback.
+    # El canal intercambia pickle: la clave compartida es obligatoria y no tiene valor por
+    # defecto (definirla en el entorno o en .env, al menos 16 caracteres)
+    INFERENCE_SERVER_ADDRESSES: list[str] = ["/tmp/farmeye-inferencia/inferencia.sock"]
+    INFERENCE_SERVER_AUTHKEY: str = ""
+    INFERENCE_SERVER_BACKEND: str = "keras"
+    INFERENCE_SHM_SLOTS: int = 4
+
+    # Hilos y afinidad de CPU de la inferencia (0 / vacío = valores por defecto del runtime).
+    # Elegir el perfil por tipo de máquina con scripts/benchmark_inference.py
+    INFERENCE_INTRA_OP_THREADS: int = 0
+    INFERENCE_INTER_OP_THREADS: int = 0
+    INFERENCE_CPU_AFFINITY: list[int] = []
+
+    # Cascada: un modelo destilado responde primero y el completo solo si duda
+    CASCADE_ENABLED: bool = False
+    CASCADE_BACKEND: str = "keras"
+    CASCADE_MODEL_PATH: str = str(Path(__file__).parent / "models" / "keras_model_small.h5")
+    CASCADE_THRESHOLD: float = 0.9
+
+    # Configuración de inferencia por micro-lotes
+    INFERENCE_BATCHING_ENABLED: bool = True
+    INFERENCE_MAX_BATCH_SIZE: int = 8
+    INFERENCE_MAX_WAIT_MS: float = 5.0
+
+    # Ejecutores dedicados para decodificación e inferencia (fuera del event loop)
+    IMAGE_EXECUTOR_WORKERS: int = 4
+    IMAGE_EXECUTOR_MAX_PENDING: int = 32
+    INFERENCE_EXECUTOR_WORKERS: int = 1
+    INFERENCE_EXECUTOR_MAX_PENDING: int = 16
+
+    # Decodificación rápida: reducción DCT de JPEG (draft) antes del remuestreo final.
+    # Medir otros filtros con scripts/benchmark_preprocessing.py antes de cambiarlo.
+    IMAGE_FAST_DECODE: bool = True
+    IMAGE_RESAMPLE_FILTER: str = "lanczos"
+
+    # Caché de predicciones por hash del archivo subido (directorio vacío = solo memoria)
+    PREDICTION_CACHE_ENABLED: bool = True
+    PREDICTION_CACHE_MAX_ENTRIES: int = 1024
+    PREDICTION_CACHE_DIR: str = ""
+
+    # Reutilizar la predicción de fotos casi idénticas del mismo usuario (hash perceptual)
+    PHASH_ENABLED: bool = True
+    PHASH_MAX_DISTANCE: int = 4
+    PHASH_WINDOW_SECONDS: float = 120.0
+    PHASH_MAX_ENTRIES_PER_USER: int = 32
+
+    # Presupuesto de tiempo de un escaneo, incluida la recomendación de OpenRouter en
+    # segundo plano (0 = sin límite)
+    SCAN_DEADLINE_SECONDS: float = 20.0
+
+    # Escaneo por lote (/api/scan/batch)
+    SCAN_BATCH_MAX_FILES: int = 500
+    SCAN_BATCH_MAX_FILE_BYTES: int = 20 * 1024 * 1024
+
+    # Escaneos asíncronos (/api/scan/jobs): cola persistente en la base de datos
+    SCAN_JOBS_ENABLED: bool = False
+    SCAN_JOB_WORKERS: int = 2
+    SCAN_JOB_MAX_ATTEMPTS: int = 3
+    SCAN_JOB_RETRY_BACKOFF_SECONDS: float = 5.0
+    SCAN_JOB_LEASE_SECONDS: float = 120.0
+    SCAN_JOB_POLL_SECONDS: float = 2.0
+
+    # Escaneo en vivo por WebSocket (/api/scan/live)
+    LIVE_SCAN_MIN_CHANGE_BITS: int = 6
+    LIVE_SCAN_EMA_ALPHA: float = 0.4
+    LIVE_SCAN_MAX_FRAME_BYTES: int = 2 * 1024 * 1024
+
+    # Modo rebaño (/api/scan/flock): teselas de 224x224 superpuestas sobre la foto completa
+    TILING_MAX_SIDE: int = 1120
+    TILING_OVERLAP: float = 0.25
+    TILING_MIN_CONFIDENCE: float = 0.7
+    TILING_MIN_DISEASED_TILES: int = 1
+    # Topes por foto, controlados con las dimensiones de la cabecera antes de decodificar: el
+    # lado menor nunca baja de 224, así que una panorámica angosta se agrandaría y un solape
+    # alto multiplica la grilla. Por encima se rechaza la foto con 400 (0 = sin límite)
+    TILING_MAX_TILES: int = 64
+    TILING_MAX_ASPECT_RATIO: float = 8.0
+
+    # Calentamiento del modelo al arrancar (vacío = potencias de dos hasta el lote máximo)
+    MODEL_WARMUP_ENABLED: bool = False
+    MODEL_WARMUP_BATCH_SIZES: list[int] = []
+    MODEL_WARMUP_ITERATIONS: int = 2
+
     # Agregado para OpenRouter
     OPENROUTER_API_KEY: str = ""
+    # Cliente HTTP compartido (pool de conexiones; HTTP/2 si está instalado httpx[http2]).
+    # Apuntar OPENROUTER_BASE_URL a scripts/fake_openrouter.py para medir sin red
+    OPENROUTER_BASE_URL: str = "https://openrouter.ai/api/v1"
+    OPENROUTER_MODEL: str = "mistralai/mistral-7b-instruct"
+    OPENROUTER_HTTP2: bool = True
+    # Pedir la recomendación en streaming para reenviarla por SSE mientras se genera
+    OPENROUTER_STREAM: bool = True
+    OPENROUTER_MAX_CONNECTIONS: int = 20
+    OPENROUTER_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    OPENROUTER_KEEPALIVE_EXPIRY_SECONDS: float = 60.0
+    OPENROUTER_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    OPENROUTER_POOL_TIMEOUT_SECONDS: float = 5.0
+    OPENROUTER_TIMEOUT_SECONDS: float = 15.0
+    # Circuit breaker: se abre con OPENROUTER_BREAKER_ERROR_RATE de fallos (o llamadas más
+    # lentas que SLOW_CALL_SECONDS) en las últimas WINDOW llamadas; mientras está abierto se
+    # usan las recomendaciones locales sin esperar y, pasado OPEN_SECONDS, se prueba de nuevo
+    OPENROUTER_BREAKER_ENABLED: bool = True
+    OPENROUTER_BREAKER_WINDOW: int = 20
+    OPENROUTER_BREAKER_MIN_CALLS: int = 5
+    OPENROUTER_BREAKER_ERROR_RATE: float = 0.5
+    OPENROUTER_BREAKER_SLOW_CALL_SECONDS: float = 8.0
+    OPENROUTER_BREAKER_OPEN_SECONDS: float = 30.0
+    OPENROUTER_BREAKER_HALF_OPEN_PROBES: int = 1
+    # Caché de recomendaciones por (clase, banda de confianza, síntomas) en la tabla
+    # recommendation_cache, con un nivel en memoria delante
+    RECOMMENDATION_CACHE_ENABLED: bool = True
+    RECOMMENDATION_CACHE_CONFIDENCE_STEP: float = 0.1
+    RECOMMENDATION_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    RECOMMENDATION_CACHE_MAX_ENTRIES: int = 5000
+    RECOMMENDATION_CACHE_MEMORY_ENTRIES: int = 256
+    # Cada cuánto se vuelcan a la tabla los aciertos acumulados en memoria
+    RECOMMENDATION_CACHE_HITS_FLUSH_SECONDS: float = 60.0
+    # Tabla precalculada offline (scripts/build_recommendation_table.py), mapeada en memoria
+    # al arrancar; si no existe se usa solo la caché y OpenRouter
+    RECOMMENDATION_TABLE_PATH: str = str(Path(__file__).parent / "models" / "recommendations.bin")
+    # Sondeo de /recommendation/events cuando la recomendación se completa en otro proceso
+    RECOMMENDATION_POLL_SECONDS: float = 2.0
 
     class Config:
         env_file = ".env"
@@ -1,17 +1,148 @@
-from sqlalchemy import create_engine
+from typing import Any, Dict
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 from app.config import settings
 
+# Driver asíncrono para cada motor (el síncrono sigue usándose en scripts y workers)
+DRIVERS_ASINCRONOS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def url_asincrona(url: str) -> str:
+    """
+    Traduce una URL de base de datos síncrona a su driver asíncrono.
+
+    Args:
+        url: URL de SQLAlchemy (p. ej. ``sqlite:///./app.db``)
+
+    Returns:
+        La misma base con aiosqlite o asyncpg (las URL que ya traen un driver no cambian)
+    """
+    url_sa = make_url(url)
+    driver = DRIVERS_ASINCRONOS.get(url_sa.drivername)
+    return url if driver is None else url_sa.set(drivername=driver).render_as_string(False)
+
+
+def es_sqlite_en_memoria(url: str) -> bool:
+    """Indica si la URL es una base SQLite en memoria (una sola conexión, sin pool)."""
+    url_sa = make_url(url)
+    return url_sa.get_backend_name() == "sqlite" and (
+        url_sa.database in (None, "", ":memory:") or url_sa.query.get("mode") == "memory"
+    )
+
+
+def opciones_motor(url: str) -> Dict[str, Any]:
+    """
+    Argumentos de ``create_engine`` según el motor de la URL.
+
+    Args:
+        url: URL de SQLAlchemy (síncrona o asíncrona)
+
+    Returns:
+        ``connect_args`` y tamaño del pool: SQLite en archivo usa ``SQLITE_POOL_SIZE``, el
+        resto ``DATABASE_POOL_SIZE`` con pre-ping, reciclado y (en PostgreSQL) tiempo máximo
+        por sentencia; SQLite en memoria conserva el pool por defecto
+    """
+    url_sa = make_url(url)
+    if url_sa.get_backend_name() != "sqlite":
+        opciones: Dict[str, Any] = {
+            "pool_size": settings.DATABASE_POOL_SIZE,
+            "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+            "pool_timeout": settings.DATABASE_POOL_TIMEOUT,
+            "pool_pre_ping": settings.DATABASE_POOL_PRE_PING,
+            "pool_recycle": settings.DATABASE_POOL_RECYCLE_SECONDS,
+        }
+        if url_sa.get_backend_name() == "postgresql" and settings.DATABASE_STATEMENT_TIMEOUT_MS:
+            opciones["connect_args"] = _timeout_postgres(
+                url_sa.get_driver_name(), settings.DATABASE_STATEMENT_TIMEOUT_MS
+            )
+        return opciones
+    opciones = {"connect_args": {"check_same_thread": False}}
+    if not es_sqlite_en_memoria(url):
+        # aiosqlite usa NullPool por defecto: una conexión (y un hilo) nueva por sesión, ~1,6 ms
+        # más por solicitud. Con pool, sus hilos no son daemon: hay que llamar a
+        # async_engine.dispose() al terminar (lo hace el lifespan de la app)
+        asincrono = url_sa.get_driver_name() == "aiosqlite"
+        opciones.update(
+            poolclass=AsyncAdaptedQueuePool if asincrono else QueuePool,
+            pool_size=settings.SQLITE_POOL_SIZE,
+            max_overflow=settings.SQLITE_MAX_OVERFLOW,
+            pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        )
+    return opciones
+
+
+def _timeout_postgres(driver: str, milisegundos: int) -> Dict[str, Any]:
+    """``connect_args`` que fijan ``statement_timeout`` en cada conexión nueva."""
+    if driver == "asyncpg":
+        return {"server_settings": {"statement_timeout": str(milisegundos)}}
+    return {"options": f"-c statement_timeout={milisegundos}"}  # psycopg2 / libpq
+
+
+def aplicar_pragmas_sqlite(conexion_dbapi: Any, _registro: Any) -> None:
+    """Configura cada conexión SQLite nueva con los pragmas de ``settings``."""
+    cursor = conexion_dbapi.cursor()
+    # El timeout primero: cambiar el modo de journal también necesita el bloqueo
+    cursor.execute(f"PRAGMA busy_timeout = {int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.execute(f"PRAGMA journal_mode = {settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous = {settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size = {int(settings.SQLITE_MMAP_SIZE)}")
+    # Negativo: tamaño en KiB en vez de páginas
+    cursor.execute(f"PRAGMA cache_size = -{int(settings.SQLITE_CACHE_SIZE_KIB)}")
+    cursor.close()
+
+
+def crear_motor(url: str, **opciones: Any) -> Engine:
+    """
+    Crea un motor síncrono con el pool y los pragmas que corresponden a la URL.
+
+    Args:
+        url: URL de SQLAlchemy
+        **opciones: argumentos de ``create_engine`` que reemplazan a los de ``opciones_motor``
+
+    Returns:
+        El motor configurado
+    """
+    motor = create_engine(url, **_combinar_opciones(url, opciones))
+    if motor.dialect.name == "sqlite":
+        event.listen(motor, "connect", aplicar_pragmas_sqlite)
+    return motor
+
+
+def crear_motor_asincrono(url: str, **opciones: Any) -> AsyncEngine:
+    """Igual que ``crear_motor`` pero con el driver asíncrono de ``url_asincrona``."""
+    url = url_asincrona(url)
+    motor = create_async_engine(url, **_combinar_opciones(url, opciones))
+    if motor.dialect.name == "sqlite":
+        event.listen(motor.sync_engine, "connect", aplicar_pragmas_sqlite)
+    return motor
+
+
+def _combinar_opciones(url: str, opciones: Dict[str, Any]) -> Dict[str, Any]:
+    base = opciones_motor(url)
+    if "poolclass" in opciones:
+        # Un pool explícito (NullPool, StaticPool) no acepta tamaños
+        for clave in ("poolclass", "pool_size", "max_overflow", "pool_timeout"):
+            base.pop(clave, None)
+    return {**base, **opciones}
+
+
 # Crear el motor de la base de datos
-engine = create_engine(
-    settings.DATABASE_URL, connect_args={"check_same_thread": False}  # Solo necesario para SQLite
-)
+engine = crear_motor(settings.DATABASE_URL)
 
 # Crear la sesión
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Motor y sesiones asíncronas para las rutas: las esperas de la base no bloquean el event loop.
+# Sin expirar al hacer commit: los objetos se siguen leyendo después sin otra consulta
+async_engine = crear_motor_asincrono(settings.DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
 # Crear la base para los modelos
 Base = declarative_base()
 
@@ -23,3 +154,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
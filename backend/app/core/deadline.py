@@ -0,0 +1,69 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Instante (time.monotonic) en que vence el presupuesto de la solicitud en curso.
+# Las tareas creadas dentro de la solicitud heredan una copia del contexto, así que
+# la recomendación en segundo plano sigue contando contra el mismo plazo.
+_vence_en: ContextVar[Optional[float]] = ContextVar("vence_en", default=None)
+
+
+class PlazoVencido(asyncio.TimeoutError):
+    """Se agotó el presupuesto de tiempo de la solicitud."""
+
+
+@contextmanager
+def plazo(segundos: Optional[float]) -> Iterator[None]:
+    """
+    Fija un presupuesto de tiempo para todo lo que se ejecute dentro del bloque.
+
+    Si ya hay un plazo activo se conserva el más cercano. ``None`` o un valor
+    menor o igual a cero no agregan límite.
+    """
+    vence = _vence_en.get()
+    if segundos is not None and segundos > 0:
+        propio = time.monotonic() + segundos
+        vence = propio if vence is None else min(vence, propio)
+    token = _vence_en.set(vence)
+    try:
+        yield
+    finally:
+        _vence_en.reset(token)
+
+
+def restante() -> Optional[float]:
+    """Segundos que quedan del plazo actual (None si no hay plazo)."""
+    vence = _vence_en.get()
+    if vence is None:
+        return None
+    return vence - time.monotonic()
+
+
+def acotar_timeout(timeout: float) -> float:
+    """
+    Recorta ``timeout`` a lo que queda del plazo.
+
+    Raises:
+        PlazoVencido: si el plazo ya se agotó
+    """
+    queda = restante()
+    if queda is None:
+        return timeout
+    if queda <= 0:
+        raise PlazoVencido("Plazo de la solicitud agotado")
+    return min(timeout, queda)
+
+
+async def con_plazo(operacion: Awaitable[T]) -> T:
+    """Espera ``operacion`` como mucho hasta que venza el plazo actual."""
+    queda = restante()
+    if queda is None:
+        return await operacion
+    try:
+        return await asyncio.wait_for(operacion, max(queda, 0))
+    except asyncio.TimeoutError:
+        raise PlazoVencido("Plazo de la solicitud agotado") from None
@@ -1,12 +1,23 @@
+import asyncio
 import logging
 import os
+from contextlib import asynccontextmanager
 
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.utils import get_openapi
 
-from app.routes import auth, image
+from app.config import settings
+from app.core.database import async_engine
+from app.routes import auth, health, image, metrics, scan_jobs
+from app.services.diagnosis import detener_recomendaciones
+from app.services.executor import cerrar_ejecutores
+from app.services.image import detener_batcher, liberar_modelo
+from app.services.openrouter import cerrar_cliente, iniciar_cliente
+from app.services.recommendation_table import cargar_tabla, liberar_tabla
+from app.services.scan_jobs import detener_workers, iniciar_workers
+from app.services.warmup import iniciar_calentamiento
 
 # Load environment variables
 load_dotenv()
@@ -21,10 +32,43 @@ logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s",
 )
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up the model in the background; /health/ready reports 503 until it finishes
+    warmup_task = None
+    if settings.MODEL_WARMUP_ENABLED:
+        warmup_task = asyncio.create_task(iniciar_calentamiento())
+    # One pooled HTTP client for every OpenRouter call in this process
+    iniciar_cliente()
+    # Offline-built recommendation table, memory-mapped once for every request
+    cargar_tabla()
+    # Background workers draining the persistent scan job queue
+    if settings.SCAN_JOBS_ENABLED:
+        iniciar_workers()
+
+    yield
+
+    await detener_workers()
+    # Pending OpenRouter recommendations are dropped; those diagnoses keep the local ones
+    await detener_recomendaciones()
+    await cerrar_cliente()
+    liberar_tabla()
+    await async_engine.dispose()
+
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    # Stop the inference batching worker and the decode/inference thread pools
+    await detener_batcher()
+    cerrar_ejecutores()
+    liberar_modelo()
+
+
 app = FastAPI(
     title="FarmEye Backend",
     description="API para analizar imágenes de gallinas y detectar enfermedades visibles.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Configure CORS
@@ -63,6 +107,9 @@ app.openapi = custom_openapi
 # Include routers
 app.include_router(auth.router)
 app.include_router(image.router)
+app.include_router(scan_jobs.router)
+app.include_router(metrics.router)
+app.include_router(health.router)
 
 # Log startup
 logging.info("FarmEye Backend started successfully")
@@ -1,2 +1,5 @@
 from app.models.diagnosis import Diagnosis
+from app.models.recommendation_cache import RecommendationCacheEntry
+from app.models.refresh_token import RefreshToken
+from app.models.scan_job import ScanJob
 from app.models.user import User
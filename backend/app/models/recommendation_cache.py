@@ -0,0 +1,21 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Float, Integer, String, Text
+
+from app.core.database import Base
+
+
+class RecommendationCacheEntry(Base):
+    """Recomendación de OpenRouter ya generada para una (clase, banda de confianza, síntomas)."""
+
+    __tablename__ = "recommendation_cache"
+
+    clave = Column(String, primary_key=True)  # Hash de la consulta normalizada
+    clase = Column(String, nullable=False)
+    banda_confianza = Column(Float, nullable=False)
+    sintomas = Column(Text, nullable=False)  # Lista JSON ordenada y sin duplicados
+    modelo = Column(String, nullable=False)
+    recomendacion = Column(Text, nullable=False)
+    hits = Column(Integer, nullable=False, default=0)
+    creado_en = Column(DateTime, default=datetime.utcnow, index=True)
+    usado_en = Column(DateTime, default=datetime.utcnow, index=True)
@@ -0,0 +1,24 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, LargeBinary, String, Text
+
+from app.core.database import Base
+
+
+class ScanJob(Base):
+    """Escaneo encolado para procesarse en segundo plano (POST /api/scan/jobs)."""
+
+    __tablename__ = "scan_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    estado = Column(String, nullable=False, default="pendiente", index=True)
+    archivo = Column(String)
+    sintomas = Column(Text)
+    imagen = Column(LargeBinary)  # Se libera al terminar el trabajo
+    intentos = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+    diagnosis_id = Column(Integer, ForeignKey("diagnosis.id"), nullable=True)
+    disponible_en = Column(DateTime, default=datetime.utcnow, index=True)
+    creado_en = Column(DateTime, default=datetime.utcnow)
+    actualizado_en = Column(DateTime, default=datetime.utcnow)
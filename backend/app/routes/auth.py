@@ -4,12 +4,14 @@ from datetime import timedelta
 
 import bcrypt
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel, EmailStr
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.config import settings
-from app.core.database import get_db
+from app.core.database import get_async_db, get_db
 from app.models.refresh_token import RefreshToken
 from app.models.user import User as UserModel
 from app.schemas.auth import RefreshRequest, Token, UserCreate, UserOut
@@ -72,12 +74,14 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(
+    form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)
+):
     """
     Autentica un usuario y devuelve un token de acceso (formulario OAuth2).
     """
     try:
-        user = authenticate_user(form_data.username, form_data.password, db)
+        user = await authenticate_user(form_data.username, form_data.password, db)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -93,7 +97,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
         # Crear refresh token
         refresh_token = RefreshToken(user_id=user.id)
         db.add(refresh_token)
-        db.commit()
+        await db.commit()
 
         logging.info(f"Login exitoso para usuario: {user.username}")
         return {
@@ -111,12 +115,12 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
 
 
 @router.post("/login/json", response_model=Token)
-async def login_json(login_data: LoginRequest, db: Session = Depends(get_db)):
+async def login_json(login_data: LoginRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Autentica un usuario y devuelve un token de acceso (JSON).
     """
     try:
-        user = authenticate_user(login_data.username, login_data.password, db)
+        user = await authenticate_user(login_data.username, login_data.password, db)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -132,7 +136,7 @@ async def login_json(login_data: LoginRequest, db: Session = Depends(get_db)):
         # Crear refresh token
         refresh_token = RefreshToken(user_id=user.id)
         db.add(refresh_token)
-        db.commit()
+        await db.commit()
 
         logging.info(f"Login exitoso para usuario: {user.username}")
         return {
@@ -258,9 +262,9 @@ def update_profile(
 
 
 @router.post("/change-password")
-def change_password(
+async def change_password(
     password_data: ChangePasswordRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_user),
 ):
     """
@@ -268,21 +272,23 @@ def change_password(
     """
     try:
         # Verificar contraseña actual
-        if not bcrypt.checkpw(
-            password_data.old_password.encode("utf-8"), current_user.hashed_password.encode("utf-8")
+        if not await run_in_threadpool(
+            bcrypt.checkpw,
+            password_data.old_password.encode("utf-8"),
+            current_user.hashed_password.encode("utf-8"),
         ):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, detail="Contraseña actual incorrecta"
             )
 
         # Hashear nueva contraseña
-        new_hashed_password = bcrypt.hashpw(
-            password_data.new_password.encode("utf-8"), bcrypt.gensalt()
+        new_hashed_password = await run_in_threadpool(
+            bcrypt.hashpw, password_data.new_password.encode("utf-8"), bcrypt.gensalt()
         )
 
-        # Actualizar contraseña
+        # Actualizar contraseña (current_user pertenece a esta misma sesión)
         current_user.hashed_password = new_hashed_password.decode("utf-8")
-        db.commit()
+        await db.commit()
 
         logging.info(f"Contraseña actualizada para usuario: {current_user.username}")
         return {"message": "Contraseña actualizada exitosamente"}
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
+
+from app.services.warmup import estado
+
+router = APIRouter(prefix="/health", tags=["health"])
+
+
+@router.get("/live", summary="El proceso está vivo")
+def live():
+    return {"estado": "vivo"}
+
+
+@router.get("/ready", summary="El worker está listo para recibir tráfico")
+def ready():
+    """
+    Responde 503 hasta que termina el calentamiento del modelo, para que el
+    balanceador solo envíe tráfico a workers con el modelo cargado.
+    """
+    contenido = {
+        "estado": "listo" if estado["listo"] else "calentando",
+        "fases": {fase: round(segundos, 3) for fase, segundos in estado["fases"].items()},
+        "error": estado["error"],
+    }
+    if not estado["listo"]:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content=contenido)
+    return contenido
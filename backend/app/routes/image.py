@@ -1,3 +1,5 @@
+import asyncio
+import base64
 import json
 import logging
 import os
@@ -5,74 +7,215 @@ from datetime import datetime
 from io import BytesIO
 from typing import Optional
 
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
-from fastapi.responses import FileResponse
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    Form,
+    HTTPException,
+    Request,
+    UploadFile,
+    WebSocket,
+    status,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
 from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from reportlab.lib import colors
 
+from app.config import settings
+from app.core.deadline import PlazoVencido, con_plazo, plazo
 from app.models.diagnosis import Diagnosis
 from app.models.user import User
-from app.schemas.image import DiagnosticoOut
-from app.services.auth import get_current_user, get_db
-from app.services.diagnosis import ajustar_diagnostico, guardar_diagnostico
-from app.services.image import get_prediction_confidence, process_image
+from app.schemas.image import DiagnosticoDetalleOut, DiagnosticoOut, RebanoOut
+from app.services.auth import get_async_db, get_current_user
+from app.services.batch_scan import LectorMultipart, NDJSONStreamingResponse, escanear_lote
+from app.services.diagnosis import (
+    ESTADOS_RECOMENDACION_FINALES,
+    ajustar_diagnostico,
+    esperar_recomendacion,
+    estado_recomendacion,
+    fragmentos_recomendacion,
+    guardar_diagnostico,
+)
+from app.services.image import predecir_bytes
+from app.services.live_scan import nueva_sesion
+from app.services.tiling import escanear_rebano
 
 router = APIRouter(prefix="/api", tags=["image"])
 
 
+def _diagnostico_detalle(diagnosis: Diagnosis) -> dict:
+    datos = DiagnosticoOut.model_validate(diagnosis).model_dump(mode="json")
+    datos["estado_recomendacion"] = estado_recomendacion(diagnosis)
+    return datos
+
+
 @router.post(
-    "/scan", response_model=DiagnosticoOut, summary="Analiza imagen de gallina y guarda diagnóstico"
+    "/scan",
+    response_model=DiagnosticoDetalleOut,
+    summary="Analiza imagen de gallina y guarda diagnóstico",
 )
 async def scan_image(
     file: UploadFile = File(...),
     sintomas: str = Form("[]"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user),
 ):
     """
     Procesa una imagen y genera un diagnóstico basado en la imagen y los síntomas reportados.
+
+    La respuesta trae las recomendaciones locales; si `estado_recomendacion` es
+    "pendiente", la de OpenRouter se consulta luego en `GET /api/analyses/{id}` o se
+    espera en `/api/analyses/{id}/recommendation/events`.
     """
     try:
-        logging.info(f"Procesando imagen: {file.filename} para usuario {current_user.username}")
+        # Un solo presupuesto de tiempo para la inferencia y la recomendación posterior
+        with plazo(settings.SCAN_DEADLINE_SECONDS):
+            return await _escanear(file, sintomas, db, current_user)
+
+    except PlazoVencido:
+        logging.error(f"Plazo agotado en /api/scan para {file.filename}")
+        raise HTTPException(status_code=504, detail="El análisis superó el tiempo máximo")
+    except Exception as e:
+        logging.error(f"Error en /api/scan: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error procesando la imagen: {str(e)}")
 
-        # Procesar la imagen
-        processed_image = await process_image(file)
 
-        # Obtener predicción y nivel de confianza
-        prediction, confidence = get_prediction_confidence(processed_image)
+async def _escanear(file: UploadFile, sintomas: str, db: AsyncSession, current_user: User) -> dict:
+    logging.info(f"Procesando imagen: {file.filename} para usuario {current_user.username}")
 
-        # Convertir síntomas de string a lista
-        sintomas_list = json.loads(sintomas)
+    # Leer la imagen
+    image_bytes = await file.read()
 
-        # Generar diagnóstico detallado
-        diagnostico = ajustar_diagnostico(prediction, sintomas_list, confidence)
+    # Obtener predicción y nivel de confianza (con caché y detección de casi-duplicados)
+    prediction, confidence = await con_plazo(predecir_bytes(image_bytes, user_id=current_user.id))
+
+    # Convertir síntomas de string a lista
+    sintomas_list = json.loads(sintomas)
+
+    # Generar diagnóstico detallado
+    diagnostico = ajustar_diagnostico(prediction, sintomas_list, confidence)
+
+    # Guardar diagnóstico (la recomendación de OpenRouter llega en segundo plano)
+    saved_diagnosis = await guardar_diagnostico(
+        db=db,
+        user=current_user,
+        resultado=diagnostico,
+        archivo=file.filename,
+        sintomas=sintomas_list,
+    )
+
+    # Retornar el diagnóstico guardado con los campos esperados por DiagnosticoOut
+    return {
+        "id": saved_diagnosis.id,
+        "resultado": saved_diagnosis.resultado,
+        "recomendacion": saved_diagnosis.recomendacion,
+        "archivo": saved_diagnosis.archivo,
+        "sintomas": saved_diagnosis.sintomas,
+        "timestamp": saved_diagnosis.timestamp,
+        "user_id": saved_diagnosis.user_id,
+        "estado_recomendacion": estado_recomendacion(saved_diagnosis),
+    }
+
+
+@router.post("/scan/batch", summary="Analiza muchas imágenes en una sola petición (NDJSON)")
+async def scan_batch(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Recibe un multipart/form-data con varios archivos y un campo opcional `sintomas`.
 
-        # Guardar diagnóstico (ahora es asíncrono)
-        saved_diagnosis = await guardar_diagnostico(
-            db=db,
-            user=current_user,
-            resultado=diagnostico,
-            archivo=file.filename,
-            sintomas=sintomas_list,
+    Las imágenes se decodifican a medida que llegan, se clasifican en lotes del
+    tamaño del modelo y cada resultado se devuelve como una línea NDJSON. La
+    última línea es un resumen con los IDs de los diagnósticos guardados.
+    """
+    try:
+        lector = LectorMultipart(
+            request.headers.get("content-type", ""), settings.SCAN_BATCH_MAX_FILE_BYTES
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        # Retornar el diagnóstico guardado con los campos esperados por DiagnosticoOut
-        return {
-            "id": saved_diagnosis.id,
-            "resultado": saved_diagnosis.resultado,
-            "recomendacion": saved_diagnosis.recomendacion,
-            "archivo": saved_diagnosis.archivo,
-            "sintomas": saved_diagnosis.sintomas,
-            "timestamp": saved_diagnosis.timestamp,
-            "user_id": saved_diagnosis.user_id,
-        }
+    logging.info(f"Escaneo por lote para usuario {current_user.username}")
+    return NDJSONStreamingResponse(escanear_lote(request, lector, db, current_user.id))
+
+
+@router.websocket("/scan/live")
+async def scan_live(
+    websocket: WebSocket, token: str = "", db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Escaneo con la cámara en vivo.
+
+    El cliente se autentica con `?token=<access_token>` y envía frames JPEG como
+    mensajes binarios (o data URLs en base64 como texto). Si el modelo va atrasado
+    se descartan los frames intermedios; cada predicción nueva se devuelve como JSON
+    con el promedio reciente y las estadísticas de la conexión.
+    """
+    try:
+        user = await get_current_user(db=db, token=token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    finally:
+        # La sesión solo se usa para autenticar; no retener la conexión
+        await db.close()
+
+    await websocket.accept()
+    logging.info(f"Escaneo en vivo iniciado para usuario {user.username}")
+    sesion = nueva_sesion()
+    procesador = asyncio.create_task(sesion.ejecutar(websocket.send_json))
+    try:
+        while not procesador.done():
+            mensaje = await websocket.receive()
+            if mensaje["type"] == "websocket.disconnect":
+                break
+            if mensaje.get("bytes"):
+                sesion.recibir(mensaje["bytes"])
+            elif mensaje.get("text"):
+                try:
+                    sesion.recibir(base64.b64decode(mensaje["text"].split(",")[-1]))
+                except ValueError:
+                    await websocket.send_json({"error": "Frame en base64 inválido"})
+    finally:
+        sesion.cerrar()
+        procesador.cancel()
+        await asyncio.gather(procesador, return_exceptions=True)
+        logging.info(f"Escaneo en vivo finalizado: {sesion.estadisticas()}")
+
+
+@router.post(
+    "/scan/flock",
+    response_model=RebanoOut,
+    summary="Analiza una foto amplia del gallinero por teselas",
+)
+async def scan_flock(
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Divide la foto en teselas superpuestas de 224x224, las clasifica en una sola
+    pasada del modelo y devuelve la grilla junto con un veredicto para el rebaño.
+    """
+    try:
+        logging.info(
+            f"Procesando foto de rebaño: {file.filename} para usuario {current_user.username}"
+        )
+        image_bytes = await file.read()
+        resultado = await escanear_rebano(image_bytes)
+        return {**resultado, "archivo": file.filename, "timestamp": datetime.utcnow()}
 
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logging.error(f"Error en /api/scan: {str(e)}")
+        logging.error(f"Error en /api/scan/flock: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error procesando la imagen: {str(e)}")
 
 
@@ -81,7 +224,7 @@ async def scan_image(
     response_model=list[DiagnosticoOut],
     summary="Historial de diagnósticos del usuario autenticado",
 )
-def obtener_historial(
+async def obtener_historial(
     page: int = 1,
     limit: int = 10,
     fecha_inicio: Optional[datetime] = None,
@@ -89,7 +232,7 @@ def obtener_historial(
     ordenar_por: str = "timestamp",
     orden: str = "desc",
     busqueda: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user),
 ):
     """
@@ -111,17 +254,17 @@ def obtener_historial(
         offset = (page - 1) * limit
 
         # Query base
-        query = db.query(Diagnosis).filter(Diagnosis.user_id == current_user.id)
+        query = select(Diagnosis).where(Diagnosis.user_id == current_user.id)
 
         # Aplicar filtros de fecha
         if fecha_inicio:
-            query = query.filter(Diagnosis.timestamp >= fecha_inicio)
+            query = query.where(Diagnosis.timestamp >= fecha_inicio)
         if fecha_fin:
-            query = query.filter(Diagnosis.timestamp <= fecha_fin)
+            query = query.where(Diagnosis.timestamp <= fecha_fin)
 
         # Aplicar búsqueda
         if busqueda:
-            query = query.filter(
+            query = query.where(
                 or_(
                     Diagnosis.resultado.ilike(f"%{busqueda}%"),
                     Diagnosis.recomendacion.ilike(f"%{busqueda}%"),
@@ -141,10 +284,10 @@ def obtener_historial(
             query = query.order_by(order_column.desc())
 
         # Obtener total de diagnósticos
-        total = query.count()
+        total = await db.scalar(select(func.count()).select_from(query.order_by(None).subquery()))
 
         # Obtener diagnósticos paginados
-        diagnósticos = query.offset(offset).limit(limit).all()
+        diagnósticos = (await db.scalars(query.offset(offset).limit(limit))).all()
 
         logging.info(f"Encontrados {len(diagnósticos)} diagnósticos en la página {page}")
 
@@ -160,19 +303,106 @@ def obtener_historial(
         raise HTTPException(status_code=500, detail="Error obteniendo historial de diagnósticos")
 
 
+async def _obtener_diagnostico(db: AsyncSession, diagnosis_id: int, user: User) -> Diagnosis:
+    diagnosis = await db.scalar(
+        select(Diagnosis).where(Diagnosis.id == diagnosis_id, Diagnosis.user_id == user.id)
+    )
+    if not diagnosis:
+        raise HTTPException(status_code=404, detail="Diagnóstico no encontrado")
+    return diagnosis
+
+
+@router.get(
+    "/analyses/{diagnosis_id}",
+    response_model=DiagnosticoDetalleOut,
+    summary="Diagnóstico guardado con el estado de su recomendación",
+)
+async def obtener_diagnostico(
+    diagnosis_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
+):
+    return _diagnostico_detalle(await _obtener_diagnostico(db, diagnosis_id, current_user))
+
+
+@router.get(
+    "/analyses/{diagnosis_id}/recommendation/events",
+    summary="Evento SSE cuando la recomendación de OpenRouter está lista",
+)
+async def eventos_recomendacion(
+    diagnosis_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Emite `event: recomendacion` con el diagnóstico actualizado en cuanto la
+    recomendación deja de estar pendiente (de inmediato si ya terminó).
+    """
+    diagnosis = await _obtener_diagnostico(db, diagnosis_id, current_user)
+    return StreamingResponse(_evento_final(db, diagnosis), media_type="text/event-stream")
+
+
+async def _evento_final(db: AsyncSession, diagnosis: Diagnosis):
+    """Eventos SSE hasta que la recomendación deja de estar pendiente."""
+    while True:
+        await db.refresh(diagnosis)
+        # Cerrar la transacción de lectura: la conexión vuelve al pool durante la espera (el
+        # stream puede durar minutos y la sesión de la solicitud vive hasta que termina)
+        await db.commit()
+        if estado_recomendacion(diagnosis) in ESTADOS_RECOMENDACION_FINALES:
+            datos = json.dumps(_diagnostico_detalle(diagnosis), ensure_ascii=False)
+            yield f"event: recomendacion\ndata: {datos}\n\n"
+            return
+        # Comentario SSE para mantener viva la conexión mientras se espera
+        yield ": pendiente\n\n"
+        await esperar_recomendacion(diagnosis.id, settings.RECOMMENDATION_POLL_SECONDS)
+
+
+@router.get(
+    "/analyses/{diagnosis_id}/recommendation/stream",
+    summary="Recomendación de OpenRouter en streaming (SSE) mientras se genera",
+)
+async def stream_recomendacion(
+    diagnosis_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Reenvía la recomendación de OpenRouter a medida que se genera: un
+    `event: fragmento` (`{"texto": ...}`) por cada trozo y, al final,
+    `event: recomendacion` con el diagnóstico ya guardado. Si la recomendación
+    ya terminó, o se genera en otro proceso, solo llega el evento final.
+    """
+    diagnosis = await _obtener_diagnostico(db, diagnosis_id, current_user)
+    # Los fragmentos no usan la base: no retener una conexión del pool mientras llegan
+    await db.commit()
+
+    async def eventos():
+        # Si el cliente se desconecta solo se deja de leer: la llamada sigue y se guarda
+        async for fragmento in fragmentos_recomendacion(diagnosis_id):
+            datos = json.dumps({"texto": fragmento}, ensure_ascii=False)
+            yield f"event: fragmento\ndata: {datos}\n\n"
+        async for evento in _evento_final(db, diagnosis):
+            yield evento
+
+    return StreamingResponse(eventos(), media_type="text/event-stream")
+
+
 @router.get("/analyses/{diagnosis_id}/pdf", summary="Descargar diagnóstico en PDF")
 async def download_diagnosis_pdf(
-    diagnosis_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)
+    diagnosis_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
 ):
     """
     Genera y descarga un PDF con el diagnóstico detallado, incluyendo gráficos y estadísticas.
     """
     try:
         # Obtener el diagnóstico
-        diagnosis = (
-            db.query(Diagnosis)
-            .filter(Diagnosis.id == diagnosis_id, Diagnosis.user_id == current_user.id)
-            .first()
+        diagnosis = await db.scalar(
+            select(Diagnosis).where(
+                Diagnosis.id == diagnosis_id, Diagnosis.user_id == current_user.id
+            )
         )
 
         if not diagnosis:
@@ -278,8 +508,8 @@ async def download_diagnosis_pdf(
             )
         ))
 
-        # Construir el PDF
-        doc.build(story)
+        # Construir el PDF (reportlab es bloqueante, se ejecuta fuera del event loop)
+        await run_in_threadpool(doc.build, story)
         buffer.seek(0)
 
         # Generar nombre de archivo
@@ -0,0 +1,107 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.services import openrouter, scan_jobs
+from app.services.auth import get_db
+from app.services.cascade import CascadeBackend
+from app.services.diagnosis import estadisticas_recomendaciones
+from app.services.executor import get_image_executor, get_inference_executor
+from app.services.image import (
+    get_batcher,
+    get_perceptual_index,
+    get_prediction_cache,
+    modelo_cargado,
+)
+from app.services.recommendation_cache import get_recommendation_cache
+from app.services.recommendation_table import get_recommendation_table
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("/inference", summary="Estadísticas del planificador de inferencia")
+def metricas_inferencia():
+    """
+    Devuelve profundidad de cola y distribución de tamaños de lote del micro-batching.
+    """
+    return get_batcher().estadisticas()
+
+
+@router.get("/executors", summary="Estado de los pools de decodificación e inferencia")
+def metricas_ejecutores():
+    """
+    Devuelve trabajos en curso y esperas por saturación de cada pool.
+    """
+    return {
+        "imagen": get_image_executor().estadisticas(),
+        "inferencia": get_inference_executor().estadisticas(),
+    }
+
+
+@router.get("/prediction-cache", summary="Aciertos y fallos de la caché de predicciones")
+def metricas_cache_predicciones():
+    cache = get_prediction_cache()
+    return cache.estadisticas() if cache is not None else {"habilitada": False}
+
+
+@router.get(
+    "/recommendation-cache", summary="Aciertos de la caché de recomendaciones de OpenRouter"
+)
+def metricas_cache_recomendaciones():
+    cache = get_recommendation_cache()
+    return cache.estadisticas() if cache is not None else {"habilitada": False}
+
+
+@router.get(
+    "/recommendation-table", summary="Cobertura de la tabla precalculada de recomendaciones"
+)
+def metricas_tabla_recomendaciones():
+    tabla = get_recommendation_table()
+    return tabla.estadisticas() if tabla is not None else {"cargada": False}
+
+
+@router.get(
+    "/recommendations", summary="Recomendaciones en curso y llamadas a OpenRouter ahorradas"
+)
+def metricas_recomendaciones():
+    """
+    Devuelve las tareas en segundo plano pendientes y cuántas llamadas idénticas
+    concurrentes se resolvieron con una sola petición a OpenRouter.
+    """
+    return estadisticas_recomendaciones()
+
+
+@router.get("/openrouter", summary="Estado del circuit breaker y del cliente de OpenRouter")
+def metricas_openrouter():
+    """
+    Devuelve el estado del circuito (cerrado, abierto o semiabierto), la tasa de
+    error y la latencia recientes, y cuántas llamadas se rechazaron sin intentarlas.
+    """
+    return openrouter.estadisticas()
+
+
+@router.get("/near-duplicates", summary="Reutilización de predicciones por hash perceptual")
+def metricas_casi_duplicados():
+    indice = get_perceptual_index()
+    return indice.estadisticas() if indice is not None else {"habilitado": False}
+
+
+@router.get("/cascade", summary="Resolución por etapa de la inferencia en cascada")
+def metricas_cascada():
+    """
+    Devuelve cuántas imágenes resolvió el modelo rápido y la tasa de escalado al completo.
+    """
+    if not settings.CASCADE_ENABLED:
+        return {"habilitada": False}
+    # Sin cargar el modelo: una consulta de métricas no debe inicializar TensorFlow
+    modelo = modelo_cargado()
+    if not isinstance(modelo, CascadeBackend):
+        return {"habilitada": True, "cargada": False}
+    return modelo.estadisticas()
+
+
+@router.get("/scan-jobs", summary="Profundidad y resultados de la cola de escaneos asíncronos")
+def metricas_trabajos(db: Session = Depends(get_db)):
+    if not settings.SCAN_JOBS_ENABLED:
+        return {"habilitada": False}
+    return scan_jobs.estadisticas(db)
@@ -0,0 +1,105 @@
+import json
+import logging
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.diagnosis import Diagnosis
+from app.models.scan_job import ScanJob
+from app.models.user import User
+from app.schemas.image import DiagnosticoOut, ScanJobOut
+from app.services.auth import get_async_db, get_current_user
+from app.services.scan_jobs import ESTADOS_FINALES, encolar_escaneo, esperar_cambio
+
+router = APIRouter(prefix="/api/scan/jobs", tags=["scan-jobs"])
+
+
+async def _obtener_trabajo(db: AsyncSession, job_id: int, user: User) -> ScanJob:
+    job = await db.scalar(select(ScanJob).where(ScanJob.id == job_id, ScanJob.user_id == user.id))
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return job
+
+
+async def _serializar(db: AsyncSession, job: ScanJob) -> dict:
+    datos = ScanJobOut.model_validate(job).model_dump(mode="json")
+    if job.diagnosis_id is not None:
+        diagnostico = await db.get(Diagnosis, job.diagnosis_id)
+        if diagnostico is not None:
+            datos["diagnostico"] = DiagnosticoOut.model_validate(diagnostico).model_dump(
+                mode="json"
+            )
+    return datos
+
+
+@router.post(
+    "",
+    response_model=ScanJobOut,
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Encola un escaneo para procesarlo en segundo plano",
+)
+async def crear_trabajo(
+    file: UploadFile = File(...),
+    sintomas: str = Form("[]"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Acepta la imagen de inmediato y la guarda en la cola persistente. El resultado
+    se consulta en `GET /api/scan/jobs/{id}` o se espera en `/api/scan/jobs/{id}/events`.
+    """
+    if not settings.SCAN_JOBS_ENABLED:
+        raise HTTPException(status_code=503, detail="Los escaneos asíncronos están deshabilitados")
+    try:
+        sintomas_list = json.loads(sintomas)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="El campo sintomas no es una lista JSON")
+
+    image_bytes = await file.read()
+    job = await db.run_sync(
+        encolar_escaneo, current_user.id, file.filename, image_bytes, sintomas_list
+    )
+    logging.info(f"Escaneo {job.id} encolado para usuario {current_user.username}")
+    return job
+
+
+@router.get("/{job_id}", response_model=ScanJobOut, summary="Estado de un escaneo asíncrono")
+async def obtener_trabajo(
+    job_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
+):
+    return await _serializar(db, await _obtener_trabajo(db, job_id, current_user))
+
+
+@router.get("/{job_id}/events", summary="Eventos SSE hasta que el escaneo termina")
+async def eventos_trabajo(
+    job_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Emite `event: estado` en cada cambio y `event: fin` con el resultado final.
+    """
+    job = await _obtener_trabajo(db, job_id, current_user)
+
+    async def eventos():
+        anterior = None
+        while True:
+            await db.refresh(job)
+            datos = await _serializar(db, job)
+            # Devolver la conexión al pool antes de esperar el próximo cambio
+            await db.commit()
+            if job.estado in ESTADOS_FINALES:
+                yield f"event: fin\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n"
+                return
+            if (job.estado, job.intentos) != anterior:
+                anterior = (job.estado, job.intentos)
+                yield f"event: estado\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n"
+            # Aviso inmediato si el worker corre en este proceso; si no, sondeo
+            await esperar_cambio(job_id, settings.SCAN_JOB_POLL_SECONDS)
+
+    return StreamingResponse(eventos(), media_type="text/event-stream")
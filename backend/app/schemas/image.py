@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, ConfigDict
 
@@ -24,3 +25,51 @@ class DiagnosticoOut(BaseModel):
     user_id: int
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class DiagnosticoDetalleOut(DiagnosticoOut):
+    """Diagnóstico guardado con el estado de la recomendación de OpenRouter"""
+
+    estado_recomendacion: str
+
+
+class TeselaOut(BaseModel):
+    """Clasificación de una tesela de la foto del gallinero"""
+
+    fila: int
+    columna: int
+    x: int
+    y: int
+    resultado: str
+    confianza: float
+
+
+class RebanoOut(BaseModel):
+    """Grilla de teselas y veredicto agregado para una foto del gallinero"""
+
+    veredicto: str
+    confianza: float
+    filas: int
+    columnas: int
+    tamano_tesela: int
+    teselas_concluyentes: int
+    distribucion: Dict[str, int]
+    teselas: List[TeselaOut]
+    archivo: str
+    timestamp: datetime
+
+
+class ScanJobOut(BaseModel):
+    """Estado de un escaneo asíncrono"""
+
+    id: int
+    estado: str
+    archivo: str
+    intentos: int
+    error: Optional[str] = None
+    diagnosis_id: Optional[int] = None
+    creado_en: datetime
+    actualizado_en: datetime
+    diagnostico: Optional[DiagnosticoOut] = None
+
+    model_config = ConfigDict(from_attributes=True)
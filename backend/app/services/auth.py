@@ -4,12 +4,14 @@ from typing import Optional
 
 import bcrypt
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
-from app.core.database import SessionLocal
+from app.core.database import SessionLocal, get_async_db  # noqa: F401 (se reexporta)
 from app.models.user import User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
@@ -23,12 +25,20 @@ def get_db():
         db.close()
 
 
-def authenticate_user(username: str, password: str, db: Session):
-    user = db.query(User).filter(User.username == username).first()
+async def buscar_usuario(db: AsyncSession, username: str) -> Optional[User]:
+    resultado = await db.execute(select(User).where(User.username == username))
+    return resultado.scalars().first()
+
+
+async def authenticate_user(username: str, password: str, db: AsyncSession):
+    user = await buscar_usuario(db, username)
     if not user:
         logging.warning(f"Usuario no encontrado: {username}")
         return False
-    if not bcrypt.checkpw(password.encode("utf-8"), user.hashed_password.encode("utf-8")):
+    # bcrypt tarda cientos de ms a propósito: fuera del event loop
+    if not await run_in_threadpool(
+        bcrypt.checkpw, password.encode("utf-8"), user.hashed_password.encode("utf-8")
+    ):
         logging.warning(f"Contraseña incorrecta para usuario: {username}")
         return False
     logging.info(f"Autenticación exitosa para usuario: {username}")
@@ -44,7 +54,9 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
 
-async def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+async def get_current_user(
+    db: AsyncSession = Depends(get_async_db), token: str = Depends(oauth2_scheme)
+):
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         username: str = payload.get("sub")
@@ -53,7 +65,7 @@ async def get_current_user(db: Session = Depends(get_db), token: str = Depends(o
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido")
 
-    user = db.query(User).filter(User.username == username).first()
+    user = await buscar_usuario(db, username)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Usuario no encontrado"
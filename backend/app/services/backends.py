@@ -0,0 +1,270 @@
+import contextlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from app.config import settings
+
+
+def fijar_afinidad(cpus: Optional[List[int]] = None) -> None:
+    """
+    Fija el hilo actual a las CPUs indicadas (por defecto ``INFERENCE_CPU_AFFINITY``).
+
+    Los hilos que cree después, como los pools internos del runtime, heredan la
+    misma máscara. No hace nada si la lista está vacía o la plataforma no lo admite.
+    """
+    cpus = settings.INFERENCE_CPU_AFFINITY if cpus is None else cpus
+    if not cpus or not hasattr(os, "sched_setaffinity"):
+        return
+    try:
+        os.sched_setaffinity(0, set(cpus))
+    except OSError as e:
+        logging.warning(f"No se pudo fijar la afinidad de CPU {cpus}: {str(e)}")
+
+
+@contextlib.contextmanager
+def afinidad_temporal(cpus: Optional[List[int]] = None) -> Iterator[None]:
+    """Aplica ``fijar_afinidad`` mientras dura el bloque y restaura la máscara original."""
+    if not hasattr(os, "sched_getaffinity"):
+        yield
+        return
+    original = os.sched_getaffinity(0)
+    fijar_afinidad(cpus)
+    try:
+        yield
+    finally:
+        os.sched_setaffinity(0, original)
+
+
+def _hilos(valor: int) -> Optional[int]:
+    return valor if valor > 0 else None
+
+
+class InferenceBackend:
+    """
+    Interfaz común de los runtimes de inferencia.
+
+    ``predict`` recibe un lote ``(N, 224, 224, 3)`` en ``input_dtype`` y
+    devuelve las probabilidades ``(N, num_clases)`` como float32. Los modelos
+    exportados con ``scripts/export_uint8_model.py`` declaran ``np.uint8`` y
+    hacen la conversión y el escalado dentro del grafo.
+    """
+
+    nombre = "base"
+    input_dtype: Any = np.float32
+
+    def __init__(self, model_path: str):
+        self.model_path = model_path
+        self.tiempo_carga = 0.0
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Libera recursos externos del backend (conexiones, memoria compartida)."""
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "backend": self.nombre,
+            "model_path": self.model_path,
+            "input_dtype": np.dtype(self.input_dtype).name,
+            "tiempo_carga_s": round(self.tiempo_carga, 3),
+        }
+
+
+class KerasBackend(InferenceBackend):
+    """Modelo .h5 original ejecutado con Keras/TensorFlow."""
+
+    nombre = "keras"
+
+    def __init__(self, model_path: str, intra_op_threads: int = 0, inter_op_threads: int = 0):
+        super().__init__(model_path)
+        inicio = time.perf_counter()
+        # Import diferido: solo este backend necesita TensorFlow completo
+        import tensorflow as tf
+        from keras.models import load_model
+
+        # Solo tiene efecto antes de que TensorFlow cree su contexto de ejecución
+        try:
+            if intra_op_threads > 0:
+                tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+            if inter_op_threads > 0:
+                tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+        except RuntimeError as e:
+            logging.warning(f"No se pudo ajustar los hilos de TensorFlow: {str(e)}")
+
+        self.model = load_model(model_path, compile=False)
+        self.input_dtype = np.dtype(self.model.inputs[0].dtype.name)
+        self.tiempo_carga = time.perf_counter() - inicio
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        # predict_on_batch evita montar el pipeline de tf.data que usa predict()
+        return np.asarray(self.model.predict_on_batch(batch), dtype=np.float32)
+
+
+class TFLiteBackend(InferenceBackend):
+    """
+    Modelo TFLite (float16 o int8). Usa ``tflite_runtime`` si está instalado,
+    evitando importar TensorFlow; si no, recurre a ``tf.lite``.
+    """
+
+    nombre = "tflite"
+
+    def __init__(self, model_path: str, num_threads: Optional[int] = None):
+        super().__init__(model_path)
+        inicio = time.perf_counter()
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            try:
+                import tensorflow as tf
+
+                Interpreter = tf.lite.Interpreter
+            except ImportError:
+                raise RuntimeError(
+                    "El backend tflite requiere 'tflite-runtime' o 'tensorflow' instalado"
+                )
+
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_actual = int(self._input["shape"][0])
+        if self._input["dtype"] == np.uint8 and not self._input["quantization"][0]:
+            self.input_dtype = np.uint8
+        # El intérprete no es seguro entre hilos
+        self._lock = threading.Lock()
+        self.tiempo_carga = time.perf_counter() - inicio
+
+    def _ajustar_batch(self, n: int) -> None:
+        if n == self._batch_actual:
+            return
+        shape = list(self._input["shape"])
+        shape[0] = n
+        self.interpreter.resize_tensor_input(self._input["index"], shape)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_actual = n
+
+    def _cuantizar(self, batch: np.ndarray) -> np.ndarray:
+        dtype = self._input["dtype"]
+        if dtype == np.float32:
+            return batch.astype(np.float32, copy=False)
+        scale, zero_point = self._input["quantization"]
+        if not scale:
+            return batch.astype(dtype, copy=False)
+        info = np.iinfo(dtype)
+        q = np.round(batch / scale + zero_point)
+        return np.clip(q, info.min, info.max).astype(dtype)
+
+    def _decuantizar(self, salida: np.ndarray) -> np.ndarray:
+        if salida.dtype == np.float32:
+            return salida
+        scale, zero_point = self._output["quantization"]
+        return ((salida.astype(np.float32) - zero_point) * scale).astype(np.float32)
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        with self._lock:
+            self._ajustar_batch(batch.shape[0])
+            self.interpreter.set_tensor(self._input["index"], self._cuantizar(batch))
+            self.interpreter.invoke()
+            salida = self.interpreter.get_tensor(self._output["index"])
+        return self._decuantizar(salida)
+
+
+class OnnxBackend(InferenceBackend):
+    """Modelo ONNX ejecutado con ONNX Runtime en CPU."""
+
+    nombre = "onnx"
+
+    def __init__(self, model_path: str, intra_op_threads: int = 0, inter_op_threads: int = 0):
+        super().__init__(model_path)
+        inicio = time.perf_counter()
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("El backend onnx requiere 'onnxruntime' instalado")
+
+        opciones = ort.SessionOptions()
+        opciones.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opciones.intra_op_num_threads = max(0, intra_op_threads)
+        opciones.inter_op_num_threads = max(0, inter_op_threads)
+        self.session = ort.InferenceSession(
+            model_path, sess_options=opciones, providers=["CPUExecutionProvider"]
+        )
+        entrada = self.session.get_inputs()[0]
+        self._input_name = entrada.name
+        if entrada.type == "tensor(uint8)":
+            self.input_dtype = np.uint8
+        self.tiempo_carga = time.perf_counter() - inicio
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        entrada = batch.astype(self.input_dtype, copy=False)
+        salida = self.session.run(None, {self._input_name: entrada})
+        return np.asarray(salida[0], dtype=np.float32)
+
+
+def ruta_modelo(nombre: Optional[str] = None) -> str:
+    """Ruta del archivo de modelo que usa el backend indicado (o el configurado)."""
+    nombre = (nombre or settings.INFERENCE_BACKEND).lower()
+    if nombre == "remoto":
+        # El servidor comparte el sistema de archivos: su modelo identifica las predicciones
+        return ruta_modelo(settings.INFERENCE_SERVER_BACKEND)
+    rutas = {
+        "keras": settings.MODEL_PATH,
+        "tflite": settings.TFLITE_MODEL_PATH,
+        "onnx": settings.ONNX_MODEL_PATH,
+    }
+    if nombre not in rutas:
+        raise ValueError(f"Backend de inferencia desconocido: {nombre}")
+    return rutas[nombre]
+
+
+def crear_backend(
+    nombre: Optional[str] = None, model_path: Optional[str] = None
+) -> InferenceBackend:
+    """
+    Crea el backend de inferencia configurado en ``INFERENCE_BACKEND``.
+
+    Args:
+        nombre: Backend a usar; por defecto el de la configuración
+        model_path: Ruta del modelo; por defecto la configurada para ese backend
+
+    Returns:
+        InferenceBackend: Backend con el modelo ya cargado
+    """
+    nombre = (nombre or settings.INFERENCE_BACKEND).lower()
+    if nombre == "remoto":
+        from app.services.inference_server import RemoteBackend
+
+        backend: InferenceBackend = RemoteBackend(
+            settings.INFERENCE_SERVER_ADDRESSES,
+            settings.INFERENCE_SERVER_AUTHKEY.encode(),
+            slots=settings.INFERENCE_SHM_SLOTS,
+            max_batch_size=settings.INFERENCE_MAX_BATCH_SIZE,
+        )
+        logging.info(f"Backend de inferencia remoto conectado a {backend.model_path}")
+        return backend
+
+    model_path = model_path or ruta_modelo(nombre)
+    intra = settings.INFERENCE_INTRA_OP_THREADS
+    inter = settings.INFERENCE_INTER_OP_THREADS
+    # Los pools de hilos del runtime se crean al cargar y heredan la afinidad
+    with afinidad_temporal():
+        if nombre == "keras":
+            backend = KerasBackend(model_path, intra, inter)
+        elif nombre == "tflite":
+            backend = TFLiteBackend(model_path, num_threads=_hilos(intra))
+        else:
+            backend = OnnxBackend(model_path, intra, inter)
+
+    logging.info(
+        f"Backend de inferencia '{backend.nombre}' cargado desde {backend.model_path} "
+        f"en {backend.tiempo_carga:.2f}s"
+    )
+    return backend
@@ -0,0 +1,238 @@
+import asyncio
+import json
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from multipart.multipart import MultipartParser, parse_options_header
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from app.config import CLASS_NAMES, settings
+from app.services.diagnosis import ajustar_diagnostico, construir_diagnostico
+from app.services.executor import get_image_executor, get_inference_executor
+from app.services.image import predecir_lote, preprocesar_bytes
+
+# Parte del formulario ya recibida: (nombre del campo, nombre de archivo, contenido)
+Parte = Tuple[str, Optional[str], bytes]
+
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """
+    Respuesta NDJSON que se escribe mientras se sigue leyendo el cuerpo.
+
+    ``StreamingResponse`` escucha la desconexión del cliente con ``receive``,
+    lo que le robaría al generador los fragmentos del cuerpo multipart. Aquí
+    solo se transmite; una desconexión la detecta ``request.stream()``.
+    """
+
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+class LectorMultipart:
+    """
+    Parser incremental de multipart/form-data.
+
+    Cada fragmento se pasa a ``escribir``; las partes completas quedan
+    disponibles en ``completas()``. Solo se mantiene en memoria la parte actual.
+    """
+
+    def __init__(self, content_type: str, max_bytes_parte: int):
+        _, opciones = parse_options_header(content_type)
+        boundary = opciones.get(b"boundary")
+        if not boundary:
+            raise ValueError("Falta el boundary del multipart/form-data")
+        self.max_bytes_parte = max_bytes_parte
+        self._listas: List[Parte] = []
+        self._cabecera = b""
+        self._valor = b""
+        self._cabeceras: Dict[bytes, bytes] = {}
+        self._datos = bytearray()
+        self._excedida = False
+        self._parser = MultipartParser(
+            boundary,
+            callbacks={
+                "on_part_begin": self._inicio_parte,
+                "on_header_field": self._campo_cabecera,
+                "on_header_value": self._valor_cabecera,
+                "on_header_end": self._fin_cabecera,
+                "on_part_data": self._datos_parte,
+                "on_part_end": self._fin_parte,
+            },
+        )
+
+    def _inicio_parte(self) -> None:
+        self._cabeceras = {}
+        self._datos = bytearray()
+        self._excedida = False
+
+    def _campo_cabecera(self, data: bytes, start: int, end: int) -> None:
+        self._cabecera += data[start:end]
+
+    def _valor_cabecera(self, data: bytes, start: int, end: int) -> None:
+        self._valor += data[start:end]
+
+    def _fin_cabecera(self) -> None:
+        self._cabeceras[self._cabecera.lower()] = self._valor
+        self._cabecera = b""
+        self._valor = b""
+
+    def _datos_parte(self, data: bytes, start: int, end: int) -> None:
+        if len(self._datos) + end - start > self.max_bytes_parte:
+            self._excedida = True
+            return
+        self._datos += data[start:end]
+
+    def _fin_parte(self) -> None:
+        _, opciones = parse_options_header(self._cabeceras.get(b"content-disposition", b""))
+        nombre = opciones.get(b"name", b"").decode("utf-8", "replace")
+        archivo = opciones.get(b"filename")
+        archivo_str = archivo.decode("utf-8", "replace") if archivo is not None else None
+        # Una parte demasiado grande se entrega vacía para informar el error
+        self._listas.append((nombre, archivo_str, b"" if self._excedida else bytes(self._datos)))
+        self._datos = bytearray()
+
+    def escribir(self, fragmento: bytes) -> None:
+        self._parser.write(fragmento)
+
+    def completas(self) -> List[Parte]:
+        listas, self._listas = self._listas, []
+        return listas
+
+
+def _linea(datos: Dict[str, Any]) -> str:
+    return json.dumps(datos, ensure_ascii=False) + "\n"
+
+
+async def _procesar_grupo(
+    grupo: List[Tuple[int, str, "asyncio.Future[np.ndarray]"]],
+) -> List[Dict[str, Any]]:
+    """Espera la decodificación del grupo y lo clasifica en una sola pasada del modelo."""
+    tensores = await asyncio.gather(*(tarea for _, _, tarea in grupo), return_exceptions=True)
+    validos = [i for i, t in enumerate(tensores) if not isinstance(t, BaseException)]
+    probabilidades = None
+    if validos:
+        lote = np.concatenate([tensores[i] for i in validos])
+        probabilidades = await get_inference_executor().run(predecir_lote, lote)
+
+    resultados = []
+    fila = 0
+    for i, (indice, archivo, _) in enumerate(grupo):
+        if isinstance(tensores[i], BaseException):
+            resultados.append(
+                {"indice": indice, "archivo": archivo, "error": "Imagen inválida o ilegible"}
+            )
+            continue
+        prediccion = probabilidades[fila]
+        fila += 1
+        clase = CLASS_NAMES[int(np.argmax(prediccion))]
+        resultados.append(
+            {
+                "indice": indice,
+                "archivo": archivo,
+                "resultado": clase,
+                "confianza": float(np.max(prediccion)),
+            }
+        )
+    return resultados
+
+
+async def escanear_lote(
+    request: Request, lector: LectorMultipart, db: Union[Session, AsyncSession], user_id: int
+) -> AsyncIterator[str]:
+    """
+    Lee el multipart a medida que llega y emite una línea NDJSON por imagen.
+
+    Cada archivo se decodifica en el pool de imágenes apenas termina su parte;
+    al juntar ``INFERENCE_MAX_BATCH_SIZE`` imágenes se clasifican en una pasada
+    y se emiten sus resultados. El campo opcional ``sintomas`` (lista JSON) se
+    aplica a todas las imágenes. Al final se insertan todos los diagnósticos
+    juntos y se emite una línea de resumen con sus IDs.
+    """
+    tamano_lote = max(1, settings.INFERENCE_MAX_BATCH_SIZE)
+    sintomas: List[str] = []
+    pendientes: List[Tuple[int, str, "asyncio.Future[np.ndarray]"]] = []
+    exitosos: List[Dict[str, Any]] = []
+    total = errores = 0
+
+    async def vaciar(hasta: int) -> AsyncIterator[str]:
+        nonlocal errores
+        while len(pendientes) >= hasta and pendientes:
+            grupo = pendientes[:tamano_lote]
+            del pendientes[:tamano_lote]
+            for resultado in await _procesar_grupo(grupo):
+                if "error" in resultado:
+                    errores += 1
+                else:
+                    exitosos.append(resultado)
+                yield _linea(resultado)
+
+    try:
+        async for fragmento in request.stream():
+            lector.escribir(fragmento)
+            for nombre, archivo, contenido in lector.completas():
+                if archivo is None:
+                    if nombre == "sintomas" and contenido:
+                        try:
+                            sintomas = json.loads(contenido)
+                        except ValueError:
+                            yield _linea({"error": "El campo sintomas no es una lista JSON"})
+                    continue
+                if total >= settings.SCAN_BATCH_MAX_FILES or not contenido:
+                    errores += 1
+                    motivo = (
+                        "Límite de imágenes alcanzado"
+                        if contenido
+                        else "Archivo vacío o demasiado grande"
+                    )
+                    yield _linea({"archivo": archivo, "error": motivo})
+                    continue
+                tarea = asyncio.ensure_future(
+                    get_image_executor().run(preprocesar_bytes, contenido)
+                )
+                pendientes.append((total, archivo, tarea))
+                total += 1
+            async for linea in vaciar(tamano_lote):
+                yield linea
+        async for linea in vaciar(1):
+            yield linea
+    finally:
+        for _, _, tarea in pendientes:
+            tarea.cancel()
+
+    # Un único INSERT para todos los diagnósticos del lote
+    filas = []
+    for r in exitosos:
+        diagnostico = ajustar_diagnostico(r["resultado"], sintomas, r["confianza"])
+        filas.append(
+            construir_diagnostico(
+                user_id=user_id,
+                resultado=diagnostico,
+                archivo=r["archivo"],
+                sintomas=sintomas,
+                recomendacion="\n".join(diagnostico["recomendaciones"]),
+            )
+        )
+
+    def insertar(sesion: Session) -> List[int]:
+        sesion.add_all(filas)
+        sesion.flush()
+        ids = [f.id for f in filas]
+        sesion.commit()
+        return ids
+
+    ids: List[int] = []
+    if filas:
+        ids = await db.run_sync(insertar) if isinstance(db, AsyncSession) else insertar(db)
+    logging.info(f"Escaneo por lote: {total} imágenes, {len(ids)} guardadas, {errores} errores")
+    yield _linea(
+        {"resumen": {"total": total, "guardados": len(ids), "errores": errores, "ids": ids}}
+    )
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Elemento de la cola: (tensor de entrada, future del solicitante, instante de encolado)
+_Pendiente = Tuple[np.ndarray, "asyncio.Future[np.ndarray]", float]
+
+
+class InferenceBatcher:
+    """
+    Agrupa solicitudes de inferencia concurrentes en micro-lotes.
+
+    Cada solicitud encola un tensor ``(1, H, W, C)`` y espera su vector de
+    probabilidades. Un único worker toma de la cola hasta ``max_batch_size``
+    elementos, esperando como máximo ``max_wait_ms`` desde el primero, ejecuta
+    una sola pasada del modelo y reparte los resultados. La pasada corre en
+    ``executor`` para no bloquear el event loop.
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[np.ndarray], np.ndarray],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+        executor: Optional[Executor] = None,
+    ):
+        self.predict_fn = predict_fn
+        self.executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional["asyncio.Queue[_Pendiente]"] = None
+        self._worker: Optional["asyncio.Task[None]"] = None
+
+        # Estadísticas para ajustar el tamaño de lote y la espera
+        self.total_solicitudes = 0
+        self.total_lotes = 0
+        self.total_procesadas = 0
+        self.max_profundidad = 0
+        self.espera_total = 0.0
+        self.histograma_lotes: Counter = Counter()
+
+    def _asegurar_worker(self) -> "asyncio.Queue[_Pendiente]":
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop or not self._worker or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._procesar())
+        return self._queue
+
+    async def predict(self, tensor: np.ndarray) -> np.ndarray:
+        """
+        Encola un tensor y espera su resultado.
+
+        Args:
+            tensor: Imagen preprocesada con forma (1, H, W, C)
+
+        Returns:
+            np.ndarray: Vector de probabilidades de esa imagen
+        """
+        queue = self._asegurar_worker()
+        future: "asyncio.Future[np.ndarray]" = asyncio.get_running_loop().create_future()
+        queue.put_nowait((tensor, future, time.perf_counter()))
+        self.total_solicitudes += 1
+        self.max_profundidad = max(self.max_profundidad, queue.qsize())
+        return await future
+
+    async def _recolectar(self, queue: "asyncio.Queue[_Pendiente]") -> List[_Pendiente]:
+        lote = [await queue.get()]
+        limite = time.perf_counter() + self.max_wait
+        while len(lote) < self.max_batch_size:
+            if not queue.empty():
+                lote.append(queue.get_nowait())
+                continue
+            restante = limite - time.perf_counter()
+            if restante <= 0:
+                break
+            try:
+                lote.append(await asyncio.wait_for(queue.get(), restante))
+            except asyncio.TimeoutError:
+                break
+        return lote
+
+    async def _procesar(self) -> None:
+        queue = self._queue
+        assert queue is not None
+        while True:
+            lote = await self._recolectar(queue)
+            # Descartar solicitudes cuyo cliente ya no espera (p. ej. desconexión)
+            lote = [item for item in lote if not item[1].done()]
+            if lote:
+                await self._ejecutar(lote)
+
+    def _predecir(self, tensores: List[np.ndarray]) -> np.ndarray:
+        # El apilado también es una copia: se hace en el executor, no en el loop
+        return self.predict_fn(np.concatenate(tensores, axis=0))
+
+    async def _ejecutar(self, lote: List[_Pendiente]) -> None:
+        inicio = time.perf_counter()
+        self.total_lotes += 1
+        self.total_procesadas += len(lote)
+        self.histograma_lotes[len(lote)] += 1
+        self.espera_total += sum(inicio - encolado for _, _, encolado in lote)
+
+        try:
+            tensores = [tensor for tensor, _, _ in lote]
+            loop = asyncio.get_running_loop()
+            resultados = await loop.run_in_executor(self.executor, self._predecir, tensores)
+        except asyncio.CancelledError:
+            for _, future, _ in lote:
+                future.cancel()
+            raise
+        except Exception as e:
+            logging.error(f"Error en lote de inferencia ({len(lote)} imágenes): {str(e)}")
+            for _, future, _ in lote:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for i, (_, future, _) in enumerate(lote):
+            if not future.done():
+                future.set_result(resultados[i])
+
+    async def detener(self) -> None:
+        """Cancela el worker; las solicitudes pendientes reciben CancelledError."""
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        if self._queue is not None:
+            while not self._queue.empty():
+                _, future, _ = self._queue.get_nowait()
+                future.cancel()
+        self._worker = None
+        self._queue = None
+        self._loop = None
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Devuelve profundidad de cola y distribución de tamaños de lote."""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "profundidad_cola": self._queue.qsize() if self._queue is not None else 0,
+            "max_profundidad_cola": self.max_profundidad,
+            "total_solicitudes": self.total_solicitudes,
+            "total_lotes": self.total_lotes,
+            "total_procesadas": self.total_procesadas,
+            "tamano_medio_lote": (
+                self.total_procesadas / self.total_lotes if self.total_lotes else 0.0
+            ),
+            "espera_media_ms": (
+                self.espera_total * 1000.0 / self.total_procesadas if self.total_procesadas else 0.0
+            ),
+            "histograma_lotes": {str(k): v for k, v in sorted(self.histograma_lotes.items())},
+        }
@@ -0,0 +1,81 @@
+import threading
+import time
+from typing import Any, Dict
+
+import numpy as np
+
+from app.services.backends import InferenceBackend
+
+
+class CascadeBackend(InferenceBackend):
+    """
+    Clasificador en dos etapas.
+
+    Un modelo pequeño (destilado con ``scripts/distill_model.py``) responde
+    primero; solo las imágenes cuya confianza máxima queda bajo ``threshold``
+    pasan por el modelo completo, en un único sub-lote.
+    """
+
+    nombre = "cascada"
+
+    def __init__(self, rapido: InferenceBackend, completo: InferenceBackend, threshold: float):
+        if np.dtype(rapido.input_dtype) != np.dtype(completo.input_dtype):
+            raise ValueError(
+                "Los modelos de la cascada deben usar el mismo tipo de entrada "
+                f"({np.dtype(rapido.input_dtype).name} != {np.dtype(completo.input_dtype).name})"
+            )
+        super().__init__(model_path=completo.model_path)
+        self.rapido = rapido
+        self.completo = completo
+        self.threshold = threshold
+        self.input_dtype = completo.input_dtype
+        self.tiempo_carga = rapido.tiempo_carga + completo.tiempo_carga
+        self._lock = threading.Lock()
+
+        self.total_imagenes = 0
+        self.escaladas = 0
+        self.tiempo_etapa1 = 0.0
+        self.tiempo_etapa2 = 0.0
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        inicio = time.perf_counter()
+        probabilidades = np.array(self.rapido.predict(batch), dtype=np.float32)
+        etapa1 = time.perf_counter() - inicio
+
+        dudosas = np.flatnonzero(probabilidades.max(axis=1) < self.threshold)
+        etapa2 = 0.0
+        if dudosas.size:
+            inicio = time.perf_counter()
+            probabilidades[dudosas] = self.completo.predict(batch[dudosas])
+            etapa2 = time.perf_counter() - inicio
+
+        with self._lock:
+            self.total_imagenes += batch.shape[0]
+            self.escaladas += int(dudosas.size)
+            self.tiempo_etapa1 += etapa1
+            self.tiempo_etapa2 += etapa2
+        return probabilidades
+
+    def close(self) -> None:
+        self.rapido.close()
+        self.completo.close()
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            **super().info(),
+            "umbral": self.threshold,
+            "etapa1": self.rapido.info(),
+            "etapa2": self.completo.info(),
+        }
+
+    def estadisticas(self) -> Dict[str, Any]:
+        resueltas = self.total_imagenes - self.escaladas
+        return {
+            "umbral": self.threshold,
+            "total_imagenes": self.total_imagenes,
+            "resueltas_etapa1": resueltas,
+            "escaladas": self.escaladas,
+            "tasa_escalado": self.escaladas / self.total_imagenes if self.total_imagenes else 0.0,
+            "tiempo_etapa1_s": round(self.tiempo_etapa1, 3),
+            "tiempo_etapa2_s": round(self.tiempo_etapa2, 3),
+        }
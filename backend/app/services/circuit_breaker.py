@@ -0,0 +1,137 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict
+
+CERRADO = "cerrado"
+ABIERTO = "abierto"
+SEMIABIERTO = "semiabierto"
+
+
+class CircuitoAbierto(Exception):
+    """La dependencia está fuera de servicio; se rechaza la llamada sin intentarla."""
+
+
+class CircuitBreaker:
+    """
+    Disyuntor para una dependencia externa.
+
+    Registra el resultado de las últimas ``ventana`` llamadas; una llamada más
+    lenta que ``latencia_lenta_s`` cuenta como fallo. Con al menos
+    ``min_llamadas`` registradas y una tasa de fallos de ``umbral_error`` o más,
+    se abre: durante ``tiempo_abierto_s`` rechaza todo al instante. Después pasa
+    a semiabierto y deja pasar hasta ``sondas`` llamadas de prueba: si salen
+    bien se cierra, y si alguna falla vuelve a abrirse.
+    """
+
+    def __init__(
+        self,
+        nombre: str,
+        ventana: int = 20,
+        min_llamadas: int = 5,
+        umbral_error: float = 0.5,
+        latencia_lenta_s: float = 8.0,
+        tiempo_abierto_s: float = 30.0,
+        sondas: int = 1,
+        reloj: Callable[[], float] = time.monotonic,
+    ):
+        self.nombre = nombre
+        self.min_llamadas = max(1, min_llamadas)
+        self.umbral_error = umbral_error
+        self.latencia_lenta_s = latencia_lenta_s
+        self.tiempo_abierto_s = tiempo_abierto_s
+        self.sondas = max(1, sondas)
+        self._reloj = reloj
+        self._lock = threading.Lock()
+        self._resultados: Deque[bool] = deque(maxlen=max(1, ventana))
+        self._latencias: Deque[float] = deque(maxlen=max(1, ventana))
+        self.estado = CERRADO
+        self._abierto_desde = 0.0
+        self._sondas_en_curso = 0
+
+        self.total_llamadas = 0
+        self.total_fallos = 0
+        self.total_rechazadas = 0
+        self.aperturas = 0
+
+    def _abrir(self) -> None:
+        self.estado = ABIERTO
+        self._abierto_desde = self._reloj()
+        self._sondas_en_curso = 0
+        self.aperturas += 1
+        logging.warning(f"Circuito {self.nombre} abierto durante {self.tiempo_abierto_s} s")
+
+    def permitir(self) -> bool:
+        """Indica si se puede intentar una llamada (y reserva la sonda si está semiabierto)."""
+        with self._lock:
+            if self.estado == ABIERTO:
+                if self._reloj() - self._abierto_desde < self.tiempo_abierto_s:
+                    self.total_rechazadas += 1
+                    return False
+                self.estado = SEMIABIERTO
+                logging.info(f"Circuito {self.nombre} semiabierto: probando la dependencia")
+            if self.estado == SEMIABIERTO:
+                if self._sondas_en_curso >= self.sondas:
+                    self.total_rechazadas += 1
+                    return False
+                self._sondas_en_curso += 1
+            return True
+
+    def disponible(self) -> bool:
+        """Como ``permitir`` pero sin reservar nada: False solo mientras está abierto."""
+        with self._lock:
+            return not (
+                self.estado == ABIERTO
+                and self._reloj() - self._abierto_desde < self.tiempo_abierto_s
+            )
+
+    def registrar(self, exito: bool, duracion: float) -> None:
+        """Registra el resultado de una llamada que ``permitir`` dejó pasar."""
+        exito = exito and duracion < self.latencia_lenta_s
+        with self._lock:
+            self.total_llamadas += 1
+            self.total_fallos += 0 if exito else 1
+            self._latencias.append(duracion)
+            if self.estado == SEMIABIERTO:
+                self._sondas_en_curso = max(0, self._sondas_en_curso - 1)
+                if not exito:
+                    self._abrir()
+                    return
+                if self._sondas_en_curso == 0:
+                    self.estado = CERRADO
+                    self._resultados.clear()
+                    logging.info(f"Circuito {self.nombre} cerrado")
+                return
+            self._resultados.append(exito)
+            fallos = self._resultados.count(False)
+            if (
+                self.estado == CERRADO
+                and len(self._resultados) >= self.min_llamadas
+                and fallos / len(self._resultados) >= self.umbral_error
+            ):
+                self._abrir()
+
+    def liberar(self) -> None:
+        """Devuelve una sonda reservada por ``permitir`` cuya llamada no llegó a registrarse."""
+        with self._lock:
+            if self.estado == SEMIABIERTO:
+                self._sondas_en_curso = max(0, self._sondas_en_curso - 1)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            recientes = len(self._resultados)
+            latencias = sorted(self._latencias)
+            return {
+                "estado": self.estado,
+                "tasa_error_reciente": (
+                    self._resultados.count(False) / recientes if recientes else 0.0
+                ),
+                "llamadas_recientes": recientes,
+                "latencia_p50_s": latencias[len(latencias) // 2] if latencias else None,
+                "latencia_max_s": latencias[-1] if latencias else None,
+                "total_llamadas": self.total_llamadas,
+                "total_fallos": self.total_fallos,
+                "total_rechazadas": self.total_rechazadas,
+                "aperturas": self.aperturas,
+            }
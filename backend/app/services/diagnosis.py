@@ -1,16 +1,68 @@
+import asyncio
 import json
+import logging
 import os
 from collections import Counter
 from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set
 
-import httpx
 from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
+from app.config import settings
+from app.core.database import SessionLocal
 from app.models.diagnosis import Diagnosis
+from app.services.openrouter import completar_chat
+from app.services.openrouter import disponible as openrouter_disponible
+from app.services.openrouter import stream_chat
+from app.services.recommendation_cache import (
+    ConsultaRecomendacion,
+    get_recommendation_cache,
+    normalizar_consulta,
+)
+from app.services.recommendation_table import get_recommendation_table
+from app.services.single_flight import SingleFlight
 
 load_dotenv()
 
+# Estados de la recomendación de OpenRouter guardados en diagnosis_metadata
+RECOMENDACION_PENDIENTE = "pendiente"
+RECOMENDACION_COMPLETA = "completa"
+RECOMENDACION_LOCAL = "local"
+ESTADOS_RECOMENDACION_FINALES = (RECOMENDACION_COMPLETA, RECOMENDACION_LOCAL)
+
+# Tareas en segundo plano que completan recomendaciones y esperas de /recommendation/events
+_tareas_recomendacion: Set["asyncio.Task[None]"] = set()
+_suscriptores: Dict[int, asyncio.Event] = {}
+# Diagnósticos equivalentes concurrentes comparten una sola llamada a OpenRouter
+_vuelos_openrouter = SingleFlight("openrouter")
+
+
+class RecomendacionEnCurso:
+    """Texto que OpenRouter va generando para una consulta, para reenviarlo por SSE."""
+
+    def __init__(self) -> None:
+        self.partes: List[str] = []
+        self.terminada = False
+        # Se reemplaza en cada cambio: quien espera toma el evento antes de leer las partes
+        self.cambio = asyncio.Event()
+
+    def agregar(self, fragmento: str) -> None:
+        self.partes.append(fragmento)
+        self.cambio.set()
+        self.cambio = asyncio.Event()
+
+    def terminar(self) -> None:
+        self.terminada = True
+        self.cambio.set()
+
+
+# Generaciones en curso por clave de consulta y clave de cada diagnóstico pendiente
+_en_curso: Dict[str, RecomendacionEnCurso] = {}
+_claves_pendientes: Dict[int, str] = {}
+
 # Base de conocimiento de síntomas y recomendaciones
 SYMPTOM_DATABASE = {
     "fiebre": {
@@ -39,54 +91,55 @@ SYMPTOM_DATABASE = {
 }
 
 
-async def recomendacion_openrouter(diagnostico: str, sintomas: List[str]) -> str:
+async def recomendacion_openrouter(
+    diagnostico: str,
+    sintomas: List[str],
+    al_recibir: Optional[Callable[[str], None]] = None,
+) -> Optional[str]:
     """
     Obtiene recomendaciones detalladas de OpenRouter usando Mistral-7B.
+
+    Usa el cliente HTTP compartido de ``app.services.openrouter``. Con
+    ``al_recibir`` la respuesta se pide en streaming y cada fragmento se le
+    entrega apenas llega; igual se devuelve el texto completo.
+
+    Los errores de la llamada se propagan: ``completar_recomendacion`` los
+    registra y conserva las recomendaciones locales, y ``SingleFlight`` los
+    comparte con los diagnósticos equivalentes que esperan la misma respuesta.
+
+    Raises:
+        CircuitoAbierto: si OpenRouter está marcado como caído
+        PlazoVencido: si no queda tiempo del plazo de la solicitud
+        httpx.HTTPError: si la llamada falla o vence el timeout
     """
-    api_key = os.getenv("OPENROUTER_API_KEY")
-    if not api_key:
+    if not os.getenv("OPENROUTER_API_KEY"):
         return None
 
-    try:
-        prompt = (
-            f"Eres un veterinario especializado en aves de corral con 30 años de experiencia, "
-            f"especialmente en gallinas ponedoras. Tu objetivo es proporcionar recomendaciones "
-            f"precisas y prácticas para el manejo de la salud de las gallinas.\n\nDiagnóstico actual: "
-            f"{diagnostico}\nSíntomas reportados: {', '.join(sintomas) if sintomas else 'No se reportaron síntomas específicos'}\n\n"
-            "Por favor, proporciona una respuesta estructurada en los siguientes puntos:\n\n"
-            "1. EVALUACIÓN DEL ESTADO:\n   - Interpretación del diagnóstico y nivel de confianza\n   - Análisis de los síntomas reportados\n   - Estado general de la gallina\n\n"
-            "2. RECOMENDACIONES INMEDIATAS:\n   - Tratamiento específico (si es necesario)\n   - Aislamiento o medidas de cuarentena\n   - Ajustes en el ambiente (temperatura ideal: 20-25°C, humedad: 60-70%)\n\n"
-            "3. MANEJO DEL AMBIENTE:\n   - Condiciones óptimas del gallinero\n   - Ventilación y limpieza\n   - Espacio y densidad de población\n\n"
-            "4. NUTRICIÓN Y SUPLEMENTOS:\n   - Ajustes en la dieta\n   - Suplementos recomendados\n   - Agua y acceso a alimento\n\n"
-            "5. PREVENCIÓN Y MONITOREO:\n   - Medidas preventivas específicas\n   - Frecuencia de revisión\n   - Vacunación (si aplica)\n\n"
-            "6. SEÑALES DE ALERTA:\n   - Síntomas que requieren atención inmediata\n   - Cuándo contactar al veterinario\n   - Indicadores de mejora o empeoramiento\n\n"
-            "Responde de manera profesional pero accesible, usando lenguaje claro y conciso. "
-            "Enfócate en recomendaciones prácticas y específicas para gallinas ponedoras."
-        )
-
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "HTTP-Referer": "http://localhost:8000",
-            "X-Title": "farmeye",
-            "Content-Type": "application/json",
-        }
-        payload = {
-            "model": "mistralai/mistral-7b-instruct",
-            "messages": [{"role": "user", "content": prompt}],
-        }
+    prompt = (
+        f"Eres un veterinario especializado en aves de corral con 30 años de experiencia, "
+        f"especialmente en gallinas ponedoras. Tu objetivo es proporcionar recomendaciones "
+        f"precisas y prácticas para el manejo de la salud de las gallinas.\n\nDiagnóstico actual: "
+        f"{diagnostico}\nSíntomas reportados: {', '.join(sintomas) if sintomas else 'No se reportaron síntomas específicos'}\n\n"
+        "Por favor, proporciona una respuesta estructurada en los siguientes puntos:\n\n"
+        "1. EVALUACIÓN DEL ESTADO:\n   - Interpretación del diagnóstico y nivel de confianza\n   - Análisis de los síntomas reportados\n   - Estado general de la gallina\n\n"
+        "2. RECOMENDACIONES INMEDIATAS:\n   - Tratamiento específico (si es necesario)\n   - Aislamiento o medidas de cuarentena\n   - Ajustes en el ambiente (temperatura ideal: 20-25°C, humedad: 60-70%)\n\n"
+        "3. MANEJO DEL AMBIENTE:\n   - Condiciones óptimas del gallinero\n   - Ventilación y limpieza\n   - Espacio y densidad de población\n\n"
+        "4. NUTRICIÓN Y SUPLEMENTOS:\n   - Ajustes en la dieta\n   - Suplementos recomendados\n   - Agua y acceso a alimento\n\n"
+        "5. PREVENCIÓN Y MONITOREO:\n   - Medidas preventivas específicas\n   - Frecuencia de revisión\n   - Vacunación (si aplica)\n\n"
+        "6. SEÑALES DE ALERTA:\n   - Síntomas que requieren atención inmediata\n   - Cuándo contactar al veterinario\n   - Indicadores de mejora o empeoramiento\n\n"
+        "Responde de manera profesional pero accesible, usando lenguaje claro y conciso. "
+        "Enfócate en recomendaciones prácticas y específicas para gallinas ponedoras."
+    )
 
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            response = await client.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers=headers,
-                json=payload,
-            )
-            response.raise_for_status()
-            return response.json()["choices"][0]["message"]["content"]
+    mensajes = [{"role": "user", "content": prompt}]
+    if al_recibir is None:
+        return await completar_chat(mensajes)
 
-    except Exception as e:
-        print(f"⚠️ Error con OpenRouter: {e}")
-        return None
+    partes = []
+    async for fragmento in stream_chat(mensajes):
+        partes.append(fragmento)
+        al_recibir(fragmento)
+    return "".join(partes) or None
 
 
 def analizar_sintomas(sintomas: List[str]) -> Dict[str, Any]:
@@ -163,6 +216,7 @@ def ajustar_diagnostico(clase: str, sintomas: List[str], confianza: float = 0.0)
 
     return {
         "diagnostico": diagnostico_base,
+        "clase": clase,
         "nivel_confianza": confianza,
         "severidad": analisis["severity"],
         "recomendaciones": analisis["recommendations"],
@@ -170,54 +224,320 @@ def ajustar_diagnostico(clase: str, sintomas: List[str], confianza: float = 0.0)
     }
 
 
-async def guardar_diagnostico(
+def construir_diagnostico(
     *,
-    db,
-    user,
+    user_id: int,
     resultado: Dict[str, Any],
     archivo: str,
     sintomas: List[str],
-    recomendacion: str = None,
-):
+    recomendacion: str,
+    estado_recomendacion: str = RECOMENDACION_LOCAL,
+) -> Diagnosis:
     """
-    Guarda un diagnóstico en la base de datos con información detallada.
+    Arma la fila de Diagnosis (sin guardarla) a partir del diagnóstico detallado.
 
     Args:
-        db: sesión de la base de datos
-        user: usuario autenticado
-        resultado: diagnóstico detallado
+        user_id: ID del usuario
+        resultado: diagnóstico detallado de ``ajustar_diagnostico``
         archivo: nombre del archivo procesado
         sintomas: lista de síntomas
-        recomendacion: recomendación personalizada
+        recomendacion: texto de recomendación
+        estado_recomendacion: "pendiente" si OpenRouter todavía la va a reemplazar
 
     Returns:
-        instancia de Diagnosis guardada
+        instancia de Diagnosis sin persistir
     """
-    # Obtener recomendación de OpenRouter
-    diagnostico_texto = resultado["diagnostico"]
-    recomendacion_ia = await recomendacion_openrouter(diagnostico_texto, sintomas)
-
-    # Si no hay recomendación de IA, usar las recomendaciones locales
-    if not recomendacion_ia:
-        recomendacion_ia = "\n".join(resultado["recomendaciones"])
-
-    diagnostico = Diagnosis(
+    return Diagnosis(
         resultado=resultado["diagnostico"],
         archivo=archivo,
         sintomas=json.dumps(sintomas),
-        recomendacion=recomendacion or recomendacion_ia,
-        user_id=user.id,
+        recomendacion=recomendacion,
+        user_id=user_id,
         timestamp=datetime.utcnow(),
         diagnosis_metadata=json.dumps(
             {
                 "nivel_confianza": resultado["nivel_confianza"],
                 "severidad": resultado["severidad"],
                 "estadisticas": resultado["estadisticas"],
+                "estado_recomendacion": estado_recomendacion,
             }
         ),
     )
-    db.add(diagnostico)
-    db.commit()
+
+
+def estado_recomendacion(diagnostico: Diagnosis) -> str:
+    """Estado de la recomendación de un diagnóstico (los anteriores a este campo son finales)."""
+    try:
+        metadata = json.loads(diagnostico.diagnosis_metadata or "{}")
+    except ValueError:
+        metadata = {}
+    return metadata.get("estado_recomendacion", RECOMENDACION_COMPLETA)
+
+
+def _notificar(diagnosis_id: int) -> None:
+    evento = _suscriptores.pop(diagnosis_id, None)
+    if evento is not None:
+        evento.set()
+
+
+async def esperar_recomendacion(diagnosis_id: int, timeout: float) -> None:
+    """Espera a que termine la recomendación del diagnóstico o a que venza ``timeout``."""
+    evento = _suscriptores.setdefault(diagnosis_id, asyncio.Event())
+    try:
+        await asyncio.wait_for(evento.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+
+
+def recomendacion_precalculada(consulta: ConsultaRecomendacion) -> Optional[str]:
+    """Recomendación de la tabla generada offline, sin red ni base de datos (None si no está)."""
+    tabla = get_recommendation_table()
+    if tabla is None:
+        return None
+    try:
+        return tabla.buscar(consulta)
+    except Exception as e:
+        logging.warning(f"No se pudo leer la tabla de recomendaciones: {e}")
+        return None
+
+
+def recomendacion_cacheada(db, consulta: ConsultaRecomendacion) -> Optional[str]:
+    """Recomendación ya generada para la consulta, o None (si la caché falla, sigue el scan)."""
+    cache = get_recommendation_cache()
+    if cache is None:
+        return None
+    try:
+        return cache.get(db, consulta)
+    except Exception as e:
+        db.rollback()
+        logging.warning(f"No se pudo leer la caché de recomendaciones: {e}")
+        return None
+
+
+def _terminar_en_curso(clave: str, en_curso: RecomendacionEnCurso) -> None:
+    """Termina la generación y la quita de ``_en_curso`` si sigue siendo la registrada."""
+    en_curso.terminar()
+    if _en_curso.get(clave) is en_curso:
+        del _en_curso[clave]
+
+
+async def _pedir_y_cachear(consulta: ConsultaRecomendacion) -> Optional[str]:
+    en_curso = _en_curso.setdefault(consulta.clave, RecomendacionEnCurso())
+    try:
+        if settings.OPENROUTER_STREAM:
+            recomendacion_ia = await recomendacion_openrouter(
+                consulta.diagnostico, list(consulta.sintomas), al_recibir=en_curso.agregar
+            )
+        else:
+            recomendacion_ia = await recomendacion_openrouter(
+                consulta.diagnostico, list(consulta.sintomas)
+            )
+    finally:
+        _terminar_en_curso(consulta.clave, en_curso)
+    if recomendacion_ia and get_recommendation_cache() is not None:
+        # Sesión síncrona en un hilo: una escritura bloqueada no frena el event loop
+        await run_in_threadpool(_guardar_en_cache, consulta, recomendacion_ia)
+    return recomendacion_ia
+
+
+def _guardar_en_cache(consulta: ConsultaRecomendacion, recomendacion_ia: str) -> None:
+    cache = get_recommendation_cache()
+    if cache is None:
+        return
+    db = SessionLocal()
+    try:
+        cache.set(db, consulta, recomendacion_ia)
+    except Exception as e:
+        db.rollback()
+        logging.warning(f"No se pudo guardar en la caché de recomendaciones: {e}")
+    finally:
+        db.close()
+
+
+async def obtener_recomendacion_ia(consulta: ConsultaRecomendacion) -> Optional[str]:
+    """
+    Recomendación de OpenRouter para la consulta, con una sola llamada por clave en vuelo.
+
+    Los diagnósticos equivalentes que llegan mientras la llamada sigue en curso
+    esperan esa misma respuesta (y la misma excepción, si falla), que se guarda
+    una sola vez en la caché de recomendaciones.
+    """
+    return await _vuelos_openrouter.ejecutar(consulta.clave, lambda: _pedir_y_cachear(consulta))
+
+
+async def completar_recomendacion(
+    diagnosis_id: int,
+    consulta: ConsultaRecomendacion,
+    en_curso: Optional[RecomendacionEnCurso] = None,
+) -> None:
+    """
+    Pide la recomendación a OpenRouter y actualiza el diagnosis ya guardado.
+
+    Si OpenRouter no responde se conservan las recomendaciones locales y el
+    diagnóstico queda en estado "local".
+
+    Args:
+        diagnosis_id: ID del diagnóstico guardado
+        consulta: clase, banda de confianza y síntomas normalizados
+        en_curso: generación que registró ``programar_recomendacion`` para este
+            diagnóstico; se termina al final aunque la respuesta venga de una
+            llamada compartida que escribió en otra
+    """
+    try:
+        recomendacion_ia = await obtener_recomendacion_ia(consulta)
+    except Exception as e:
+        logging.error(f"Error obteniendo recomendación para diagnóstico {diagnosis_id}: {e}")
+        recomendacion_ia = None
+
+    try:
+        # Fuera del event loop: con SQLite la escritura puede esperar el bloqueo (busy_timeout)
+        await run_in_threadpool(_actualizar_diagnostico, diagnosis_id, recomendacion_ia)
+    finally:
+        if en_curso is not None:
+            _terminar_en_curso(consulta.clave, en_curso)
+        _claves_pendientes.pop(diagnosis_id, None)
+        _notificar(diagnosis_id)
+
+
+def _actualizar_diagnostico(diagnosis_id: int, recomendacion_ia: Optional[str]) -> None:
+    """Guarda la recomendación de la IA (o marca las locales como finales) en el diagnóstico."""
+    db = SessionLocal()
+    try:
+        fila = db.get(Diagnosis, diagnosis_id)
+        if fila is None:
+            return
+        metadata = json.loads(fila.diagnosis_metadata or "{}")
+        if recomendacion_ia:
+            fila.recomendacion = recomendacion_ia
+            metadata["estado_recomendacion"] = RECOMENDACION_COMPLETA
+        else:
+            metadata["estado_recomendacion"] = RECOMENDACION_LOCAL
+        fila.diagnosis_metadata = json.dumps(metadata)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def fragmentos_recomendacion(diagnosis_id: int) -> AsyncIterator[str]:
+    """
+    Fragmentos de la recomendación que se está generando para el diagnóstico.
+
+    Empieza por lo ya recibido y sigue hasta que OpenRouter termina. No entrega
+    nada si la recomendación no se está generando en este proceso; cerrar el
+    generador no afecta a la llamada, que sigue y guarda el resultado.
+    """
+    clave = _claves_pendientes.get(diagnosis_id)
+    en_curso = _en_curso.get(clave) if clave is not None else None
+    if en_curso is None:
+        return
+    enviados = 0
+    while True:
+        cambio = en_curso.cambio
+        while enviados < len(en_curso.partes):
+            yield en_curso.partes[enviados]
+            enviados += 1
+        # La tarea pudo cancelarse antes de empezar: no esperar más que el diagnóstico
+        if en_curso.terminada or diagnosis_id not in _claves_pendientes:
+            return
+        try:
+            await asyncio.wait_for(cambio.wait(), settings.RECOMMENDATION_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+def programar_recomendacion(diagnosis_id: int, consulta: ConsultaRecomendacion) -> None:
+    """Lanza ``completar_recomendacion`` en segundo plano sin esperar su resultado."""
+    _claves_pendientes[diagnosis_id] = consulta.clave
+    # Se registra ya para que un stream abierto antes de que arranque la tarea la encuentre.
+    # Si la crea este diagnóstico, su tarea la termina: puede sumarse a una llamada en vuelo
+    # que ya quitó la suya y nunca escribirá en esta
+    creada = None
+    if consulta.clave not in _en_curso:
+        creada = _en_curso[consulta.clave] = RecomendacionEnCurso()
+    tarea = asyncio.create_task(completar_recomendacion(diagnosis_id, consulta, creada))
+    _tareas_recomendacion.add(tarea)
+    tarea.add_done_callback(_tareas_recomendacion.discard)
+
+
+def estadisticas_recomendaciones() -> Dict[str, Any]:
+    return {
+        "tareas_pendientes": len(_tareas_recomendacion),
+        "single_flight": _vuelos_openrouter.estadisticas(),
+    }
+
+
+async def detener_recomendaciones() -> None:
+    """Cancela las recomendaciones en curso; esos diagnósticos conservan las locales."""
+    tareas = list(_tareas_recomendacion)
+    for tarea in tareas:
+        tarea.cancel()
+    await asyncio.gather(*tareas, return_exceptions=True)
+
+
+async def guardar_diagnostico(
+    *,
+    db,
+    user,
+    resultado: Dict[str, Any],
+    archivo: str,
+    sintomas: List[str],
+    recomendacion: Optional[str] = None,
+):
+    """
+    Guarda un diagnóstico en la base de datos con información detallada.
+
+    Si la caché de recomendaciones ya tiene la respuesta de OpenRouter para una
+    consulta equivalente, se guarda directamente. Si no, el diagnóstico se guarda
+    de inmediato con las recomendaciones locales y una tarea en segundo plano las
+    reemplaza por la de la IA cuando llega (estado "pendiente" hasta entonces).
+    La tarea hereda el plazo de la solicitud en curso (``app.core.deadline``).
+
+    Args:
+        db: sesión de la base de datos (``Session`` o ``AsyncSession``)
+        user: usuario autenticado
+        resultado: diagnóstico detallado
+        archivo: nombre del archivo procesado
+        sintomas: lista de síntomas
+        recomendacion: recomendación personalizada (no se consulta OpenRouter)
+
+    Returns:
+        instancia de Diagnosis guardada
+    """
+    estado = RECOMENDACION_LOCAL
+    # Consultas equivalentes (clase, banda de confianza, síntomas) reutilizan la respuesta;
+    # las combinaciones comunes ya vienen resueltas en la tabla precalculada
+    consulta = normalizar_consulta(resultado["clase"], resultado["nivel_confianza"], sintomas)
+    if not recomendacion:
+        recomendacion = recomendacion_precalculada(consulta)
+        if recomendacion:
+            estado = RECOMENDACION_COMPLETA
+
+    def insertar(sesion: Session) -> Diagnosis:
+        nonlocal recomendacion, estado
+        # Con el circuito de OpenRouter abierto se responde con las locales sin esperar
+        if not recomendacion and os.getenv("OPENROUTER_API_KEY") and openrouter_disponible():
+            recomendacion = recomendacion_cacheada(sesion, consulta)
+            estado = RECOMENDACION_COMPLETA if recomendacion else RECOMENDACION_PENDIENTE
+
+        diagnostico = construir_diagnostico(
+            user_id=user.id,
+            resultado=resultado,
+            archivo=archivo,
+            sintomas=sintomas,
+            recomendacion=recomendacion or "\n".join(resultado["recomendaciones"]),
+            estado_recomendacion=estado,
+        )
+        sesion.add(diagnostico)
+        sesion.commit()
+        return diagnostico
+
+    # Con una AsyncSession el mismo código corre sobre el driver asíncrono sin bloquear el loop
+    if isinstance(db, AsyncSession):
+        diagnostico = await db.run_sync(insertar)
+    else:
+        diagnostico = insertar(db)
+    if estado == RECOMENDACION_PENDIENTE:
+        programar_recomendacion(diagnostico.id, consulta)
     return diagnostico
 
 
@@ -0,0 +1,105 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from app.config import settings
+from app.services.backends import fijar_afinidad
+
+T = TypeVar("T")
+
+
+class BoundedExecutor(ThreadPoolExecutor):
+    """
+    Pool de hilos con un límite de trabajos pendientes.
+
+    ``run`` espera (sin bloquear el event loop) cuando ya hay ``max_pending``
+    trabajos encolados o en ejecución, de modo que una ráfaga de subidas no
+    acumula imágenes decodificadas en memoria sin control.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        max_pending: int,
+        nombre: str,
+        initializer: Optional[Callable[[], Any]] = None,
+    ):
+        super().__init__(
+            max_workers=max(1, max_workers), thread_name_prefix=nombre, initializer=initializer
+        )
+        self.nombre = nombre
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(self.max_workers, max_pending)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaforo: Optional[asyncio.Semaphore] = None
+
+        self.en_curso = 0
+        self.total_trabajos = 0
+        self.total_esperas = 0
+
+    def _get_semaforo(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaforo is None or self._loop is not loop:
+            self._loop = loop
+            self._semaforo = asyncio.Semaphore(self.max_pending)
+        return self._semaforo
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Ejecuta ``fn`` en el pool respetando el límite de trabajos pendientes."""
+        semaforo = self._get_semaforo()
+        if semaforo.locked():
+            self.total_esperas += 1
+        async with semaforo:
+            self.en_curso += 1
+            self.total_trabajos += 1
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self, functools.partial(fn, *args, **kwargs))
+            finally:
+                self.en_curso -= 1
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {
+            "workers": self.max_workers,
+            "max_pendientes": self.max_pending,
+            "en_curso": self.en_curso,
+            "total_trabajos": self.total_trabajos,
+            "total_esperas": self.total_esperas,
+        }
+
+
+image_executor: Optional[BoundedExecutor] = None
+inference_executor: Optional[BoundedExecutor] = None
+
+
+def get_image_executor() -> BoundedExecutor:
+    """Pool para decodificación y redimensionado de imágenes."""
+    global image_executor
+    if image_executor is None:
+        image_executor = BoundedExecutor(
+            settings.IMAGE_EXECUTOR_WORKERS, settings.IMAGE_EXECUTOR_MAX_PENDING, "imagen"
+        )
+    return image_executor
+
+
+def get_inference_executor() -> BoundedExecutor:
+    """Pool para las pasadas del modelo; sus hilos respetan ``INFERENCE_CPU_AFFINITY``."""
+    global inference_executor
+    if inference_executor is None:
+        inference_executor = BoundedExecutor(
+            settings.INFERENCE_EXECUTOR_WORKERS,
+            settings.INFERENCE_EXECUTOR_MAX_PENDING,
+            "inferencia",
+            initializer=fijar_afinidad,
+        )
+    return inference_executor
+
+
+def cerrar_ejecutores() -> None:
+    global image_executor, inference_executor
+    for executor in (image_executor, inference_executor):
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    image_executor = None
+    inference_executor = None
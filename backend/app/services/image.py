@@ -1,33 +1,143 @@
 import io
 import logging
+import threading
+from typing import Any, List, Optional
 
 import numpy as np
 from fastapi import UploadFile
-from keras.models import load_model
 from PIL import Image, ImageOps
 
-from app.config import CLASS_NAMES, MODEL_PATH
+from app.config import CLASS_NAMES, settings
+from app.services.backends import InferenceBackend, crear_backend, ruta_modelo
+from app.services.batching import InferenceBatcher
+from app.services.cascade import CascadeBackend
+from app.services.executor import get_image_executor, get_inference_executor
+from app.services.phash import PerceptualIndex, dhash
+from app.services.prediction_cache import PredictionCache
 
 # Cargar el modelo una sola vez
 model = None
+batcher = None
+prediction_cache = None
+perceptual_index = None
+# Los pools de imagen e inferencia pueden pedir el modelo a la vez
+_model_lock = threading.Lock()
 
 
-def get_model():
+def get_model() -> InferenceBackend:
     global model
     if model is None:
-        try:
-            model = load_model(MODEL_PATH, compile=False)
-            logging.info("Modelo cargado exitosamente")
-        except Exception as e:
-            logging.error(f"Error al cargar el modelo: {str(e)}")
-            raise
+        with _model_lock:
+            if model is None:
+                try:
+                    model = crear_backend()
+                    if settings.CASCADE_ENABLED:
+                        rapido = crear_backend(
+                            settings.CASCADE_BACKEND, settings.CASCADE_MODEL_PATH
+                        )
+                        model = CascadeBackend(rapido, model, settings.CASCADE_THRESHOLD)
+                    logging.info("Modelo cargado exitosamente")
+                except Exception as e:
+                    logging.error(f"Error al cargar el modelo: {str(e)}")
+                    raise
     return model
 
 
+def modelo_cargado() -> Optional[InferenceBackend]:
+    """El backend ya cargado, sin cargarlo (para métricas)."""
+    return model
+
+
+def liberar_modelo() -> None:
+    """Cierra el backend cargado (p. ej. las conexiones al servidor de inferencia)."""
+    global model
+    with _model_lock:
+        if model is not None:
+            model.close()
+            model = None
+
+
+FILTROS_REMUESTREO = {
+    "nearest": Image.Resampling.NEAREST,
+    "box": Image.Resampling.BOX,
+    "bilinear": Image.Resampling.BILINEAR,
+    "bicubic": Image.Resampling.BICUBIC,
+    "lanczos": Image.Resampling.LANCZOS,
+}
+
+
+def decodificar_imagen(
+    image_bytes: bytes, rapido: Optional[bool] = None, filtro: Optional[str] = None
+) -> Image.Image:
+    """
+    Decodifica y recorta la imagen a 224x224. Es bloqueante: llamar desde el executor.
+
+    En modo rápido, los JPEG se decodifican directamente a escala 1/2, 1/4 u 1/8
+    (reducción en el dominio DCT vía ``draft``), eligiendo la menor resolución
+    que sigue cubriendo 224x224; el resto de formatos se reduce con ``reduce``
+    antes del remuestreo final.
+
+    Args:
+        image_bytes: Contenido del archivo subido
+        rapido: Usar la decodificación reducida; por defecto ``IMAGE_FAST_DECODE``
+        filtro: Filtro de remuestreo final; por defecto ``IMAGE_RESAMPLE_FILTER``
+    """
+    rapido = settings.IMAGE_FAST_DECODE if rapido is None else rapido
+    filtro = filtro or (settings.IMAGE_RESAMPLE_FILTER if rapido else "lanczos")
+
+    image = Image.open(io.BytesIO(image_bytes))
+    if rapido and image.format == "JPEG":
+        image.draft("RGB", (224, 224))
+    image = image.convert("RGB")
+    if rapido:
+        factor = min(image.size) // (224 * 2)
+        if factor >= 2:
+            image = image.reduce(factor)
+    return ImageOps.fit(image, (224, 224), FILTROS_REMUESTREO[filtro.lower()])
+
+
+def imagen_a_tensor(image: Image.Image, dtype: Any = np.float32) -> np.ndarray:
+    """
+    Convierte la imagen de 224x224 en el tensor de entrada (1, 224, 224, 3).
+
+    Con ``dtype=np.uint8`` (modelos exportados con normalización en el grafo)
+    se entrega el buffer decodificado tal cual, con la dimensión de lote
+    agregada como vista, sin las copias en float32.
+    """
+    if np.dtype(dtype) == np.uint8:
+        return np.asarray(image)[np.newaxis]
+    image_array = np.asarray(image).astype(np.float32) / 255.0
+    return np.expand_dims(image_array, axis=0)
+
+
+def preprocesar_bytes(image_bytes: bytes, dtype: Any = None) -> np.ndarray:
+    """
+    Decodifica y redimensiona una imagen. Es bloqueante: llamar desde el executor.
+
+    Args:
+        image_bytes: Contenido del archivo subido
+        dtype: Tipo del tensor; por defecto el que espera el modelo cargado
+
+    Returns:
+        np.ndarray: Imagen procesada con forma (1, 224, 224, 3)
+    """
+    dtype = get_model().input_dtype if dtype is None else dtype
+    return imagen_a_tensor(decodificar_imagen(image_bytes), dtype)
+
+
+def preprocesar_con_hash(image_bytes: bytes) -> tuple[np.ndarray, int]:
+    """Igual que ``preprocesar_bytes`` pero además calcula el dHash de la imagen."""
+    image = decodificar_imagen(image_bytes)
+    return imagen_a_tensor(image, get_model().input_dtype), dhash(image)
+
+
 async def process_image(file: UploadFile) -> np.ndarray:
     """
     Procesa una imagen para el modelo.
 
+    La lectura es asíncrona; la decodificación y el redimensionado se ejecutan
+    en el pool de imágenes para no bloquear el event loop.
+
     Args:
         file: Archivo de imagen subido
 
@@ -37,22 +147,62 @@ async def process_image(file: UploadFile) -> np.ndarray:
     try:
         # Leer y preprocesar imagen
         image_bytes = await file.read()
-        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-        image = ImageOps.fit(image, (224, 224), Image.Resampling.LANCZOS)
-        image_array = np.asarray(image).astype(np.float32) / 255.0
-        image_array = np.expand_dims(image_array, axis=0)
-
-        return image_array
+        return await get_image_executor().run(preprocesar_bytes, image_bytes)
 
     except Exception as e:
         logging.error(f"Error procesando imagen: {str(e)}")
         raise
 
 
-def get_prediction_confidence(processed_image: np.ndarray) -> tuple[str, float]:
+def predecir_lote(batch: np.ndarray) -> np.ndarray:
+    """
+    Ejecuta una única pasada del modelo sobre un lote de imágenes.
+
+    Args:
+        batch: Tensor con forma (N, 224, 224, 3) en el dtype de entrada del modelo
+
+    Returns:
+        np.ndarray: Probabilidades con forma (N, num_clases)
+    """
+    return get_model().predict(batch)
+
+
+def get_batcher() -> InferenceBatcher:
+    global batcher
+    if batcher is None:
+        batcher = InferenceBatcher(
+            predecir_lote,
+            max_batch_size=settings.INFERENCE_MAX_BATCH_SIZE,
+            max_wait_ms=settings.INFERENCE_MAX_WAIT_MS,
+            executor=get_inference_executor(),
+        )
+    return batcher
+
+
+async def detener_batcher() -> None:
+    global batcher
+    if batcher is not None:
+        await batcher.detener()
+        batcher = None
+
+
+async def predecir_probabilidades(processed_image: np.ndarray) -> np.ndarray:
+    """
+    Vector de probabilidades de una imagen ``(1, 224, 224, 3)``, agrupada con otras
+    solicitudes concurrentes si el micro-batching está activo.
+    """
+    if settings.INFERENCE_BATCHING_ENABLED:
+        return await get_batcher().predict(processed_image)
+    return (await get_inference_executor().run(predecir_lote, processed_image))[0]
+
+
+async def get_prediction_confidence(processed_image: np.ndarray) -> tuple[str, float]:
     """
     Obtiene la predicción y nivel de confianza del modelo.
 
+    Si el micro-batching está activo, la imagen se agrupa con otras solicitudes
+    concurrentes y se resuelve en una sola pasada del modelo.
+
     Args:
         processed_image: Imagen procesada
 
@@ -61,13 +211,10 @@ def get_prediction_confidence(processed_image: np.ndarray) -> tuple[str, float]:
     """
     try:
         # Obtener predicción
-        model = get_model()
-        prediction = model.predict(
-            processed_image, verbose=0
-        )  # Añadido verbose=0 para reducir logs
-        index = np.argmax(prediction)
+        prediction = await predecir_probabilidades(processed_image)
+        index = int(np.argmax(prediction))
         clase = CLASS_NAMES[index]
-        confianza = float(prediction[0][index])
+        confianza = float(prediction[index])
 
         logging.info(f"Predicción: {clase} ({round(confianza*100,2)}%)")
 
@@ -76,3 +223,88 @@ def get_prediction_confidence(processed_image: np.ndarray) -> tuple[str, float]:
     except Exception as e:
         logging.error(f"Error en predicción: {str(e)}")
         raise
+
+
+def get_prediction_cache() -> Optional[PredictionCache]:
+    global prediction_cache
+    if not settings.PREDICTION_CACHE_ENABLED:
+        return None
+    if prediction_cache is None:
+        # Con la cascada, la predicción también depende del modelo rápido y del umbral
+        rutas_extra: List[str] = []
+        parametros = ""
+        if settings.CASCADE_ENABLED:
+            rutas_extra = [settings.CASCADE_MODEL_PATH]
+            parametros = f"cascada:{settings.CASCADE_BACKEND}:{settings.CASCADE_THRESHOLD}"
+        prediction_cache = PredictionCache(
+            ruta_modelo(),
+            max_entries=settings.PREDICTION_CACHE_MAX_ENTRIES,
+            disk_dir=settings.PREDICTION_CACHE_DIR or None,
+            rutas_extra=rutas_extra,
+            parametros=parametros,
+        )
+    return prediction_cache
+
+
+def get_perceptual_index() -> Optional[PerceptualIndex]:
+    global perceptual_index
+    if not settings.PHASH_ENABLED:
+        return None
+    if perceptual_index is None:
+        perceptual_index = PerceptualIndex(
+            max_distance=settings.PHASH_MAX_DISTANCE,
+            window_seconds=settings.PHASH_WINDOW_SECONDS,
+            max_entries=settings.PHASH_MAX_ENTRIES_PER_USER,
+        )
+    return perceptual_index
+
+
+async def predecir_bytes(image_bytes: bytes, user_id: Any = None) -> tuple[str, float]:
+    """
+    Obtiene la predicción para el contenido de un archivo subido.
+
+    Consulta primero la caché por hash del contenido: si el mismo archivo ya
+    se analizó con el modelo actual, se evitan la decodificación y la inferencia.
+    Si no, tras decodificar se busca una foto casi idéntica reciente del mismo
+    usuario (hash perceptual) antes de llamar al modelo.
+
+    Args:
+        image_bytes: Contenido del archivo subido
+        user_id: Usuario que sube la imagen (habilita la búsqueda de casi-duplicados)
+
+    Returns:
+        tuple: (clase_predicha, nivel_confianza)
+    """
+    cache = get_prediction_cache()
+    clave = None
+    if cache is not None:
+        # La consulta hace os.stat del modelo y, con el nivel en disco, lee JSON: fuera del loop
+        clave, resultado = await get_image_executor().run(_buscar_en_cache, cache, image_bytes)
+        if resultado is not None:
+            logging.info(f"Predicción desde caché: {resultado[0]} ({round(resultado[1]*100,2)}%)")
+            return resultado
+
+    indice = get_perceptual_index() if user_id is not None else None
+    processed_image, hash_perceptual = await get_image_executor().run(
+        preprocesar_con_hash, image_bytes
+    )
+
+    similar = indice.buscar(user_id, hash_perceptual) if indice is not None else None
+    if similar is not None:
+        resultado, distancia = similar
+        logging.info(f"Predicción reutilizada de una foto casi idéntica (distancia {distancia})")
+    else:
+        resultado = await get_prediction_confidence(processed_image)
+        if indice is not None:
+            indice.agregar(user_id, hash_perceptual, resultado)
+
+    if cache is not None and clave is not None:
+        await get_image_executor().run(cache.set, clave, resultado)
+    return resultado
+
+
+def _buscar_en_cache(
+    cache: PredictionCache, image_bytes: bytes
+) -> tuple[str, Optional[tuple[str, float]]]:
+    clave = cache.clave(image_bytes)
+    return clave, cache.get(clave)
@@ -0,0 +1,336 @@
+"""
+Servidor de inferencia dedicado con traspaso de tensores por memoria compartida.
+
+Un proceso servidor es dueño del modelo; los workers de la API (uvicorn
+``--workers N``) usan ``RemoteBackend``. Cada worker crea un anillo de slots
+en memoria compartida, copia el lote preprocesado en un slot libre y envía
+por un socket local solo el índice, la forma y el dtype. El servidor lee el
+tensor directamente de la memoria compartida y responde las probabilidades.
+
+``multiprocessing.connection`` deserializa con pickle lo que recibe: quien
+puede conectarse y autenticarse ejecuta código en el otro extremo. Por eso la
+clave compartida es obligatoria, el socket Unix vive en un directorio privado
+del usuario con permisos 0600 y las direcciones TCP solo pueden ser de loopback.
+
+Uso:
+    export INFERENCE_SERVER_AUTHKEY=...  # la misma en el servidor y en los workers
+    python -m app.services.inference_server --address /tmp/farmeye-inferencia/inferencia.sock
+    # en los workers: INFERENCE_BACKEND=remoto
+"""
+import argparse
+import itertools
+import logging
+import ipaddress
+import os
+import queue
+import stat
+import threading
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client, Connection, Listener
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from app.config import settings
+from app.services.backends import InferenceBackend, crear_backend
+
+Address = Union[str, Tuple[str, int]]
+
+# Forma de una imagen de entrada; el slot se dimensiona para el lote máximo
+FORMA_IMAGEN = (224, 224, 3)
+
+# Valor por defecto de versiones anteriores (publicado en el repositorio): se rechaza
+AUTHKEY_INSEGURA = "cambiar_en_produccion"
+AUTHKEY_LARGO_MINIMO = 16
+
+
+def parse_address(address: str) -> Address:
+    """``host:puerto`` para TCP local; cualquier otra cadena es la ruta de un socket Unix."""
+    if not address.startswith("/") and ":" in address:
+        host, puerto = address.rsplit(":", 1)
+        return host, int(puerto)
+    return address
+
+
+def validar_authkey(authkey: Union[str, bytes]) -> bytes:
+    """
+    Clave compartida del canal, en bytes.
+
+    Raises:
+        RuntimeError: si falta, es la clave publicada en el repositorio o es demasiado corta
+    """
+    clave = authkey.encode() if isinstance(authkey, str) else authkey
+    if not clave or clave == AUTHKEY_INSEGURA.encode():
+        raise RuntimeError(
+            "Definir INFERENCE_SERVER_AUTHKEY en el entorno: el servidor de inferencia "
+            "no arranca sin una clave propia"
+        )
+    if len(clave) < AUTHKEY_LARGO_MINIMO:
+        raise RuntimeError(
+            f"INFERENCE_SERVER_AUTHKEY debe tener al menos {AUTHKEY_LARGO_MINIMO} caracteres"
+        )
+    return clave
+
+
+def validar_direccion(address: Address, crear: bool = False) -> None:
+    """
+    Rechaza direcciones a las que podrían conectarse otros usuarios u otras máquinas.
+
+    Un socket Unix tiene que estar en un directorio del usuario actual sin permisos
+    para el grupo ni para el resto (con ``crear`` se crea con 0700 si no existe).
+    Una dirección TCP tiene que ser de loopback.
+
+    Raises:
+        RuntimeError: si la dirección no es privada
+    """
+    if isinstance(address, tuple):
+        host = address[0]
+        try:
+            loopback = host == "localhost" or ipaddress.ip_address(host).is_loopback
+        except ValueError:
+            loopback = False
+        if not loopback:
+            raise RuntimeError(f"El servidor de inferencia solo escucha en loopback, no en {host}")
+        return
+    directorio = os.path.dirname(os.path.abspath(address))
+    if crear:
+        os.makedirs(directorio, mode=0o700, exist_ok=True)
+    info = os.lstat(directorio)
+    if (
+        not stat.S_ISDIR(info.st_mode)
+        or info.st_uid != os.getuid()
+        or stat.S_IMODE(info.st_mode) & 0o077
+    ):
+        raise RuntimeError(
+            f"El socket de inferencia tiene que estar en un directorio privado (0700) del "
+            f"usuario actual: {directorio}"
+        )
+
+
+def _abrir_memoria(nombre: str) -> SharedMemory:
+    shm = SharedMemory(name=nombre)
+    # El segmento pertenece al worker de la API: evitar que el resource tracker
+    # de este proceso lo elimine al cerrar. En POSIX se registra con la barra inicial
+    registrado = nombre if os.name != "posix" or nombre.startswith("/") else f"/{nombre}"
+    try:
+        resource_tracker.unregister(registrado, "shared_memory")
+    except Exception:
+        pass
+    return shm
+
+
+class InferenceServer:
+    """
+    Atiende a los workers de la API con un único backend cargado.
+
+    Cada conexión corre en su propio hilo; las pasadas del modelo se
+    serializan con un lock para no competir por los hilos de cómputo.
+    """
+
+    def __init__(self, address: Address, authkey: bytes, backend: InferenceBackend):
+        self.address = address
+        self.authkey = validar_authkey(authkey)
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._listener: Optional[Listener] = None
+        self._cerrado = False
+        self.total_lotes = 0
+        self.total_imagenes = 0
+
+    def serve_forever(self) -> None:
+        validar_direccion(self.address, crear=True)
+        self._listener = Listener(self.address, authkey=self.authkey)
+        if not isinstance(self.address, tuple):
+            os.chmod(self.address, 0o600)
+        logging.info(f"Servidor de inferencia escuchando en {self.address}")
+        while True:
+            try:
+                conn = self._listener.accept()
+            except OSError as e:
+                if self._cerrado:
+                    break  # listener cerrado
+                # Un cliente que corta durante la autenticación no detiene el servidor
+                logging.warning(f"Conexión rechazada: {str(e)}")
+                continue
+            except Exception as e:
+                logging.warning(f"Conexión rechazada: {str(e)}")
+                continue
+            threading.Thread(target=self._atender, args=(conn,), daemon=True).start()
+
+    def close(self) -> None:
+        self._cerrado = True
+        if self._listener is not None:
+            self._listener.close()
+
+    def _atender(self, conn: Connection) -> None:
+        shm: Optional[SharedMemory] = None
+        try:
+            while True:
+                try:
+                    mensaje = conn.recv()
+                except EOFError:
+                    break
+                tipo = mensaje[0]
+                if tipo == "hola":
+                    conn.send(("ok", self.backend.info()))
+                elif tipo == "registrar":
+                    shm = _abrir_memoria(mensaje[1])
+                    conn.send(("ok", None))
+                elif tipo == "predecir":
+                    conn.send(self._predecir(shm, *mensaje[1:]))
+                else:
+                    conn.send(("error", f"Mensaje desconocido: {tipo}"))
+        finally:
+            conn.close()
+            if shm is not None:
+                shm.close()
+
+    def _predecir(
+        self, shm: Optional[SharedMemory], offset: int, forma: Tuple[int, ...], dtype: str
+    ) -> Tuple[str, Any]:
+        if shm is None:
+            return "error", "La conexión no registró memoria compartida"
+        batch = np.ndarray(forma, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+        try:
+            with self._lock:
+                resultado = self.backend.predict(batch)
+                self.total_lotes += 1
+                self.total_imagenes += forma[0]
+            return "ok", np.asarray(resultado, dtype=np.float32)
+        except Exception as e:
+            logging.error(f"Error en inferencia remota: {str(e)}")
+            return "error", str(e)
+        finally:
+            del batch  # liberar la vista antes de que se cierre el segmento
+
+
+class RemoteBackend(InferenceBackend):
+    """
+    Backend que delega la inferencia en uno o más servidores dedicados.
+
+    Abre un canal por slot del anillo de memoria compartida, repartidos
+    entre los servidores en round-robin. Cada ``predict`` toma un canal libre,
+    copia el lote a su slot y espera la respuesta. Si la conexión se cortó
+    (p. ej. el servidor se reinició), el canal se reabre y se reintenta una vez.
+    """
+
+    nombre = "remoto"
+
+    def __init__(
+        self,
+        addresses: List[str],
+        authkey: bytes,
+        slots: int = 4,
+        max_batch_size: int = 8,
+    ):
+        super().__init__(model_path=",".join(addresses))
+        self.authkey = validar_authkey(authkey)
+        self._direcciones = [
+            parse_address(a) for a, _ in zip(itertools.cycle(addresses), range(max(1, slots)))
+        ]
+        # Lo que responde el servidor también se deserializa: no hablar con sockets ajenos
+        for direccion in set(self._direcciones):
+            validar_direccion(direccion)
+        conexiones = [Client(direccion, authkey=self.authkey) for direccion in self._direcciones]
+        conexiones[0].send(("hola",))
+        _, self.info_servidor = conexiones[0].recv()
+        self.input_dtype = np.dtype(self.info_servidor["input_dtype"])
+
+        self.max_batch_size = max(1, max_batch_size)
+        self.slot_bytes = (
+            self.max_batch_size * int(np.prod(FORMA_IMAGEN)) * self.input_dtype.itemsize
+        )
+        self._shm = SharedMemory(create=True, size=self.slot_bytes * len(conexiones))
+        self._canales: "queue.Queue[Tuple[Connection, int]]" = queue.Queue()
+        for i, conn in enumerate(conexiones):
+            conn.send(("registrar", self._shm.name))
+            conn.recv()
+            self._canales.put((conn, i * self.slot_bytes))
+        self._conexiones = conexiones
+        self.reconexiones = 0
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        if batch.shape[0] > self.max_batch_size:
+            partes = [
+                self.predict(batch[i : i + self.max_batch_size])
+                for i in range(0, batch.shape[0], self.max_batch_size)
+            ]
+            return np.concatenate(partes, axis=0)
+
+        batch = np.ascontiguousarray(batch, dtype=self.input_dtype)
+        conn, offset = self._canales.get()
+        try:
+            destino = np.ndarray(
+                batch.shape, dtype=batch.dtype, buffer=self._shm.buf, offset=offset
+            )
+            destino[...] = batch
+            del destino
+            mensaje = ("predecir", offset, batch.shape, batch.dtype.str)
+            try:
+                conn.send(mensaje)
+                estado, resultado = conn.recv()
+            except (EOFError, OSError) as e:
+                logging.warning(f"Canal de inferencia cortado ({str(e)}); se reconecta")
+                # Si no se puede reconectar, el canal muerto vuelve a la cola y el
+                # próximo predict lo intenta de nuevo
+                conn = self._reconectar(conn, offset)
+                conn.send(mensaje)
+                estado, resultado = conn.recv()
+        finally:
+            self._canales.put((conn, offset))
+        if estado != "ok":
+            raise RuntimeError(f"Error en el servidor de inferencia: {resultado}")
+        return resultado
+
+    def _reconectar(self, conn: Connection, offset: int) -> Connection:
+        """Reemplaza el canal del slot por una conexión nueva registrada en la memoria."""
+        conn.close()
+        indice = offset // self.slot_bytes
+        nueva = Client(self._direcciones[indice], authkey=self.authkey)
+        try:
+            nueva.send(("registrar", self._shm.name))
+            nueva.recv()
+        except Exception:
+            nueva.close()
+            raise
+        self._conexiones[indice] = nueva
+        self.reconexiones += 1
+        return nueva
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            **super().info(),
+            "servidor": self.info_servidor,
+            "slots": len(self._conexiones),
+            "reconexiones": self.reconexiones,
+        }
+
+    def close(self) -> None:
+        for conn in self._conexiones:
+            conn.close()
+        self._shm.close()
+        self._shm.unlink()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Servidor de inferencia dedicado de FarmEye")
+    parser.add_argument("--address", default=settings.INFERENCE_SERVER_ADDRESSES[0])
+    parser.add_argument("--backend", default=settings.INFERENCE_SERVER_BACKEND)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    # Clave y dirección se validan antes de cargar el modelo, que tarda
+    authkey = validar_authkey(settings.INFERENCE_SERVER_AUTHKEY)
+    address = parse_address(args.address)
+    validar_direccion(address, crear=True)
+    backend = crear_backend(args.backend)
+    servidor = InferenceServer(address, authkey, backend)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        servidor.close()
+
+
+if __name__ == "__main__":
+    main()
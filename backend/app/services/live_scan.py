@@ -0,0 +1,126 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import numpy as np
+
+from app.config import CLASS_NAMES, settings
+from app.services.executor import get_image_executor
+from app.services.image import predecir_probabilidades, preprocesar_con_hash
+from app.services.phash import distancia_hamming
+
+
+class SesionEnVivo:
+    """
+    Estado de una conexión de escaneo con cámara en vivo.
+
+    Los frames entran a un único slot: si llega uno nuevo mientras el anterior
+    espera, el anterior se descarta (gana el más reciente). Así la memoria por
+    conexión queda acotada a un frame en espera y uno en proceso. El modelo solo
+    corre cuando el dHash del frame difiere lo suficiente del último procesado,
+    y la predicción enviada es un promedio exponencial de las recientes.
+    """
+
+    def __init__(self, min_cambio_bits: int, alpha: float, max_bytes_frame: int):
+        self.min_cambio_bits = min_cambio_bits
+        self.alpha = alpha
+        self.max_bytes_frame = max_bytes_frame
+        self._slot: Optional[bytes] = None
+        self._hay_frame = asyncio.Event()
+        self._cerrada = False
+        self._ultimo_hash: Optional[int] = None
+        self.promedio: Optional[np.ndarray] = None
+
+        self.inicio = time.monotonic()
+        self.recibidos = 0
+        self.descartados = 0
+        self.rechazados = 0
+        self.sin_cambio = 0
+        self.inferidos = 0
+
+    def recibir(self, frame: bytes) -> None:
+        """Deja el frame en el slot; no bloquea."""
+        self.recibidos += 1
+        if len(frame) > self.max_bytes_frame:
+            self.rechazados += 1
+            return
+        if self._slot is not None:
+            self.descartados += 1
+        self._slot = frame
+        self._hay_frame.set()
+
+    def cerrar(self) -> None:
+        self._cerrada = True
+        self._hay_frame.set()
+
+    async def _siguiente(self) -> Optional[bytes]:
+        while self._slot is None and not self._cerrada:
+            self._hay_frame.clear()
+            await self._hay_frame.wait()
+        frame, self._slot = self._slot, None
+        return frame
+
+    async def procesar_frame(self, frame: bytes) -> Optional[Dict[str, Any]]:
+        """
+        Procesa un frame y devuelve la predicción acumulada, o None si el frame
+        no cambió lo suficiente respecto del último que pasó por el modelo.
+        """
+        tensor, valor = await get_image_executor().run(preprocesar_con_hash, frame)
+        if self._ultimo_hash is not None:
+            distancia = int(distancia_hamming(np.array([self._ultimo_hash], np.uint64), valor)[0])
+            if distancia < self.min_cambio_bits:
+                self.sin_cambio += 1
+                return None
+        self._ultimo_hash = valor
+
+        probabilidades = np.asarray(await predecir_probabilidades(tensor), dtype=np.float32)
+        self.inferidos += 1
+        if self.promedio is None:
+            self.promedio = probabilidades
+        else:
+            self.promedio = self.alpha * probabilidades + (1 - self.alpha) * self.promedio
+
+        indice = int(np.argmax(self.promedio))
+        indice_frame = int(np.argmax(probabilidades))
+        return {
+            "resultado": CLASS_NAMES[indice],
+            "confianza": float(self.promedio[indice]),
+            "resultado_frame": CLASS_NAMES[indice_frame],
+            "confianza_frame": float(probabilidades[indice_frame]),
+            "estadisticas": self.estadisticas(),
+        }
+
+    async def ejecutar(self, enviar: Callable[[Dict[str, Any]], Awaitable[None]]) -> None:
+        """Consume el slot hasta que se cierre la sesión, enviando cada actualización."""
+        while True:
+            frame = await self._siguiente()
+            if frame is None:
+                return
+            try:
+                mensaje = await self.procesar_frame(frame)
+            except Exception:
+                self.rechazados += 1
+                await enviar({"error": "Frame inválido o ilegible"})
+                continue
+            if mensaje is not None:
+                await enviar(mensaje)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        duracion = max(time.monotonic() - self.inicio, 1e-6)
+        return {
+            "recibidos": self.recibidos,
+            "descartados": self.descartados,
+            "rechazados": self.rechazados,
+            "sin_cambio": self.sin_cambio,
+            "inferidos": self.inferidos,
+            "fps_recibidos": round(self.recibidos / duracion, 2),
+            "fps_inferidos": round(self.inferidos / duracion, 2),
+        }
+
+
+def nueva_sesion() -> SesionEnVivo:
+    return SesionEnVivo(
+        settings.LIVE_SCAN_MIN_CHANGE_BITS,
+        settings.LIVE_SCAN_EMA_ALPHA,
+        settings.LIVE_SCAN_MAX_FRAME_BYTES,
+    )
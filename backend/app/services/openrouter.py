@@ -0,0 +1,295 @@
+import importlib.util
+import json
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+
+from app.config import settings
+from app.core.deadline import PlazoVencido, acotar_timeout, con_plazo
+from app.services.circuit_breaker import CircuitBreaker, CircuitoAbierto
+
+# Un único cliente por proceso: reutiliza conexiones (keep-alive, TLS) entre llamadas
+_cliente: Optional[httpx.AsyncClient] = None
+# Disyuntor compartido por todas las llamadas del proceso
+_breaker: Optional[CircuitBreaker] = None
+
+
+def _http2_disponible() -> bool:
+    """HTTP/2 solo si está habilitado y el paquete ``h2`` (``httpx[http2]``) está instalado."""
+    return settings.OPENROUTER_HTTP2 and importlib.util.find_spec("h2") is not None
+
+
+def crear_cliente(**opciones: Any) -> httpx.AsyncClient:
+    """
+    Crea el cliente HTTP con pool de conexiones para OpenRouter.
+
+    Args:
+        opciones: argumentos extra de ``httpx.AsyncClient`` (p. ej. ``verify=False``
+            para el servidor falso local con certificado autofirmado)
+
+    Returns:
+        httpx.AsyncClient configurado con los límites y timeouts de settings
+    """
+    limites = httpx.Limits(
+        max_connections=settings.OPENROUTER_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.OPENROUTER_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.OPENROUTER_KEEPALIVE_EXPIRY_SECONDS,
+    )
+    timeout = httpx.Timeout(
+        settings.OPENROUTER_TIMEOUT_SECONDS,
+        connect=settings.OPENROUTER_CONNECT_TIMEOUT_SECONDS,
+        pool=settings.OPENROUTER_POOL_TIMEOUT_SECONDS,
+    )
+    return httpx.AsyncClient(
+        base_url=settings.OPENROUTER_BASE_URL,
+        limits=limites,
+        timeout=timeout,
+        http2=_http2_disponible(),
+        headers={"HTTP-Referer": "http://localhost:8000", "X-Title": "farmeye"},
+        **opciones,
+    )
+
+
+def iniciar_cliente() -> httpx.AsyncClient:
+    """Crea el cliente compartido si todavía no existe (lo llama el lifespan)."""
+    global _cliente
+    if _cliente is None or _cliente.is_closed:
+        _cliente = crear_cliente()
+        logging.info(
+            f"Cliente OpenRouter listo: {settings.OPENROUTER_BASE_URL} "
+            f"(HTTP/2: {_http2_disponible()}, conexiones: {settings.OPENROUTER_MAX_CONNECTIONS})"
+        )
+    return _cliente
+
+
+def get_cliente() -> httpx.AsyncClient:
+    """Cliente compartido; se crea al primer uso fuera del lifespan (scripts, tests)."""
+    return iniciar_cliente()
+
+
+async def cerrar_cliente() -> None:
+    global _cliente
+    if _cliente is not None:
+        await _cliente.aclose()
+        _cliente = None
+
+
+def get_breaker() -> Optional[CircuitBreaker]:
+    global _breaker
+    if not settings.OPENROUTER_BREAKER_ENABLED:
+        return None
+    if _breaker is None:
+        _breaker = CircuitBreaker(
+            "openrouter",
+            ventana=settings.OPENROUTER_BREAKER_WINDOW,
+            min_llamadas=settings.OPENROUTER_BREAKER_MIN_CALLS,
+            umbral_error=settings.OPENROUTER_BREAKER_ERROR_RATE,
+            latencia_lenta_s=settings.OPENROUTER_BREAKER_SLOW_CALL_SECONDS,
+            tiempo_abierto_s=settings.OPENROUTER_BREAKER_OPEN_SECONDS,
+            sondas=settings.OPENROUTER_BREAKER_HALF_OPEN_PROBES,
+        )
+    return _breaker
+
+
+def disponible() -> bool:
+    """False mientras el circuito está abierto: conviene usar el respaldo local sin esperar."""
+    breaker = get_breaker()
+    return breaker is None or breaker.disponible()
+
+
+def _timeout_solicitud() -> Tuple[httpx.Timeout, bool]:
+    """Timeout de la llamada recortado al plazo de la solicitud (y si hubo recorte)."""
+    total = acotar_timeout(settings.OPENROUTER_TIMEOUT_SECONDS)
+    timeout = httpx.Timeout(
+        total,
+        connect=min(settings.OPENROUTER_CONNECT_TIMEOUT_SECONDS, total),
+        pool=min(settings.OPENROUTER_POOL_TIMEOUT_SECONDS, total),
+    )
+    return timeout, total < settings.OPENROUTER_TIMEOUT_SECONDS
+
+
+async def completar_chat(
+    mensajes: List[Dict[str, Any]], modelo: Optional[str] = None
+) -> Optional[str]:
+    """
+    Envía una conversación a ``/chat/completions`` con el cliente compartido.
+
+    La llamada pasa por el circuit breaker y su timeout se recorta a lo que
+    queda del plazo de la solicitud (``app.core.deadline``). httpx aplica ese
+    timeout a cada operación (conectar, cada lectura), así que además la
+    llamada entera se corta al vencer el plazo.
+
+    Args:
+        mensajes: mensajes en formato OpenAI (``role``/``content``)
+        modelo: modelo a usar (por defecto ``OPENROUTER_MODEL``)
+
+    Returns:
+        El contenido de la respuesta, o None si no hay API key
+
+    Raises:
+        CircuitoAbierto: si OpenRouter está marcado como caído
+        PlazoVencido: si el plazo de la solicitud se agota antes de la respuesta
+        httpx.HTTPError: si la llamada falla o vence el timeout
+    """
+    api_key = os.getenv("OPENROUTER_API_KEY")
+    if not api_key:
+        return None
+
+    timeout, recortado = _timeout_solicitud()
+    breaker = get_breaker()
+    if breaker is not None and not breaker.permitir():
+        raise CircuitoAbierto("OpenRouter no disponible (circuito abierto)")
+
+    inicio = time.monotonic()
+    try:
+        response = await con_plazo(
+            get_cliente().post(
+                "/chat/completions",
+                headers={"Authorization": f"Bearer {api_key}"},
+                json={"model": modelo or settings.OPENROUTER_MODEL, "messages": mensajes},
+                timeout=timeout,
+            )
+        )
+        response.raise_for_status()
+        contenido = response.json()["choices"][0]["message"]["content"]
+    except PlazoVencido:
+        # Venció nuestro plazo, no el de OpenRouter: no cuenta como fallo
+        if breaker is not None:
+            breaker.liberar()
+        raise
+    except httpx.TimeoutException:
+        if breaker is not None:
+            if recortado:
+                # Venció nuestro plazo, no el de OpenRouter: no cuenta como fallo
+                breaker.liberar()
+            else:
+                breaker.registrar(False, time.monotonic() - inicio)
+        raise
+    except Exception:
+        if breaker is not None:
+            breaker.registrar(False, time.monotonic() - inicio)
+        raise
+    except BaseException:
+        if breaker is not None:
+            breaker.liberar()
+        raise
+    if breaker is not None:
+        breaker.registrar(True, time.monotonic() - inicio)
+    return contenido
+
+
+async def stream_chat(
+    mensajes: List[Dict[str, Any]], modelo: Optional[str] = None
+) -> AsyncIterator[str]:
+    """
+    Como ``completar_chat`` pero con ``stream: true``: entrega cada fragmento
+    del texto apenas llega de OpenRouter.
+
+    La respuesta se cierra al salir del generador, así que si quien consume lo
+    cierra o lo cancela la conexión vuelve al pool (o se descarta) en el acto.
+    Para el circuit breaker cuenta el tiempo hasta el primer fragmento, y el
+    resultado se registra al terminar: un corte a mitad del stream es un fallo.
+    Cada espera de OpenRouter se acota a lo que queda del plazo: la respuesta
+    no puede seguir llegando de a poco una vez vencido.
+
+    Args:
+        mensajes: mensajes en formato OpenAI (``role``/``content``)
+        modelo: modelo a usar (por defecto ``OPENROUTER_MODEL``)
+
+    Yields:
+        Fragmentos del contenido (nada si no hay API key)
+
+    Raises:
+        CircuitoAbierto: si OpenRouter está marcado como caído
+        PlazoVencido: si el plazo de la solicitud se agota antes del final
+        httpx.HTTPError: si la llamada falla o vence el timeout
+    """
+    api_key = os.getenv("OPENROUTER_API_KEY")
+    if not api_key:
+        return
+
+    timeout, recortado = _timeout_solicitud()
+    breaker = get_breaker()
+    if breaker is not None and not breaker.permitir():
+        raise CircuitoAbierto("OpenRouter no disponible (circuito abierto)")
+
+    inicio = time.monotonic()
+    # Latencia hasta el primer fragmento: la duración total depende del largo del texto
+    latencia: Optional[float] = None
+
+    def registrar(exito: bool) -> None:
+        if breaker is not None:
+            breaker.registrar(exito, time.monotonic() - inicio if latencia is None else latencia)
+
+    def liberar_o_registrar_exito() -> None:
+        # Sin fragmentos la llamada no dice nada de OpenRouter; con alguno, respondió bien
+        if latencia is not None:
+            registrar(True)
+        elif breaker is not None:
+            breaker.liberar()
+
+    cliente = get_cliente()
+    solicitud = cliente.build_request(
+        "POST",
+        "/chat/completions",
+        headers={"Authorization": f"Bearer {api_key}"},
+        json={"model": modelo or settings.OPENROUTER_MODEL, "messages": mensajes, "stream": True},
+        timeout=timeout,
+    )
+    try:
+        response = await con_plazo(cliente.send(solicitud, stream=True))
+        lineas = response.aiter_lines()
+        try:
+            response.raise_for_status()
+            while True:
+                try:
+                    linea = await con_plazo(lineas.__anext__())
+                except StopAsyncIteration:
+                    break
+                # Las líneas que no son "data:" son comentarios de keep-alive de OpenRouter
+                if not linea.startswith("data:"):
+                    continue
+                datos = linea[len("data:") :].strip()
+                if datos == "[DONE]":
+                    break
+                fragmento = json.loads(datos)["choices"][0].get("delta", {}).get("content")
+                if fragmento:
+                    if latencia is None:
+                        latencia = time.monotonic() - inicio
+                    yield fragmento
+        finally:
+            await lineas.aclose()
+            await response.aclose()
+    except PlazoVencido:
+        # Venció nuestro plazo, no el de OpenRouter: no cuenta como fallo
+        liberar_o_registrar_exito()
+        raise
+    except httpx.TimeoutException:
+        if recortado:
+            # Venció nuestro plazo, no el de OpenRouter: no cuenta como fallo
+            liberar_o_registrar_exito()
+        else:
+            registrar(False)
+        raise
+    except Exception:
+        # También a mitad del stream: la respuesta quedó cortada
+        registrar(False)
+        raise
+    except BaseException:
+        # Cancelado o cerrado por quien consume
+        liberar_o_registrar_exito()
+        raise
+    registrar(True)
+
+
+def estadisticas() -> Dict[str, Any]:
+    breaker = get_breaker()
+    return {
+        "base_url": settings.OPENROUTER_BASE_URL,
+        "http2": _http2_disponible(),
+        "cliente_abierto": _cliente is not None and not _cliente.is_closed,
+        "circuit_breaker": breaker.estadisticas() if breaker is not None else None,
+    }
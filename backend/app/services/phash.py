@@ -0,0 +1,133 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+Prediccion = Tuple[str, float]
+
+# Bits encendidos de cada byte, para contar diferencias sin bucles en Python
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def dhash(image: Image.Image, size: int = 8) -> int:
+    """
+    Hash perceptual por diferencias (dHash) de ``size * size`` bits.
+
+    La imagen se reduce a escala de grises de ``(size + 1) x size`` y cada bit
+    indica si un píxel es más brillante que su vecino de la derecha.
+
+    Args:
+        image: Imagen ya decodificada (idealmente la versión reducida)
+        size: Lado de la grilla de comparación
+
+    Returns:
+        int: Hash de 64 bits para ``size=8``
+    """
+    gris = image.convert("L").resize((size + 1, size), Image.Resampling.BILINEAR)
+    pixeles = np.asarray(gris, dtype=np.int16)
+    bits = (pixeles[:, 1:] > pixeles[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def distancia_hamming(hashes: np.ndarray, valor: int) -> np.ndarray:
+    """Distancia de Hamming entre un arreglo de hashes uint64 y un hash."""
+    diferencias = np.bitwise_xor(hashes, np.uint64(valor))
+    return _POPCOUNT[diferencias.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+class _EntradasUsuario:
+    """Anillo de tamaño fijo con los hashes recientes de un usuario."""
+
+    __slots__ = ("hashes", "tiempos", "predicciones", "pos")
+
+    def __init__(self, capacidad: int):
+        self.hashes = np.zeros(capacidad, dtype=np.uint64)
+        self.tiempos = np.full(capacidad, -np.inf, dtype=np.float64)
+        self.predicciones: List[Optional[Prediccion]] = [None] * capacidad
+        self.pos = 0
+
+
+class PerceptualIndex:
+    """
+    Índice por usuario de hashes perceptuales recientes.
+
+    Cada usuario ocupa un anillo de ``max_entries`` hashes de 64 bits con su
+    instante y predicción. Las entradas fuera de ``window_seconds`` se ignoran
+    y los usuarios sin entradas recientes se liberan en ``purgar``.
+    """
+
+    def __init__(self, max_distance: int = 4, window_seconds: float = 120.0, max_entries: int = 32):
+        self.max_distance = max_distance
+        self.window_seconds = window_seconds
+        self.max_entries = max(1, max_entries)
+        self._usuarios: Dict[Any, _EntradasUsuario] = {}
+        self._lock = threading.Lock()
+        self._ultima_purga = time.monotonic()
+
+        self.consultas = 0
+        self.reutilizadas = 0
+
+    def buscar(
+        self, user_id: Any, valor: int, ahora: Optional[float] = None
+    ) -> Optional[Tuple[Prediccion, int]]:
+        """
+        Busca la predicción más cercana dentro de la ventana y la distancia máxima.
+
+        Returns:
+            (prediccion, distancia) o None si no hay casi-duplicado reciente
+        """
+        ahora = time.monotonic() if ahora is None else ahora
+        with self._lock:
+            self.consultas += 1
+            entradas = self._usuarios.get(user_id)
+            if entradas is None:
+                return None
+            distancias = distancia_hamming(entradas.hashes, valor).astype(np.int64)
+            vigentes = entradas.tiempos >= ahora - self.window_seconds
+            distancias[~vigentes] = np.iinfo(np.int64).max
+            indice = int(np.argmin(distancias))
+            prediccion = entradas.predicciones[indice]
+            if distancias[indice] > self.max_distance or prediccion is None:
+                return None
+            self.reutilizadas += 1
+            return prediccion, int(distancias[indice])
+
+    def agregar(
+        self, user_id: Any, valor: int, prediccion: Prediccion, ahora: Optional[float] = None
+    ) -> None:
+        ahora = time.monotonic() if ahora is None else ahora
+        with self._lock:
+            entradas = self._usuarios.get(user_id)
+            if entradas is None:
+                entradas = self._usuarios[user_id] = _EntradasUsuario(self.max_entries)
+            entradas.hashes[entradas.pos] = np.uint64(valor)
+            entradas.tiempos[entradas.pos] = ahora
+            entradas.predicciones[entradas.pos] = prediccion
+            entradas.pos = (entradas.pos + 1) % self.max_entries
+            if ahora - self._ultima_purga > self.window_seconds:
+                self._purgar(ahora)
+
+    def _purgar(self, ahora: float) -> None:
+        self._ultima_purga = ahora
+        limite = ahora - self.window_seconds
+        vencidos = [u for u, e in self._usuarios.items() if e.tiempos.max() < limite]
+        for user_id in vencidos:
+            del self._usuarios[user_id]
+
+    def purgar(self, ahora: Optional[float] = None) -> None:
+        """Libera los usuarios sin entradas dentro de la ventana."""
+        with self._lock:
+            self._purgar(time.monotonic() if ahora is None else ahora)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {
+            "usuarios": len(self._usuarios),
+            "entradas_por_usuario": self.max_entries,
+            "max_distancia": self.max_distance,
+            "ventana_s": self.window_seconds,
+            "consultas": self.consultas,
+            "reutilizadas": self.reutilizadas,
+            "tasa_reutilizacion": self.reutilizadas / self.consultas if self.consultas else 0.0,
+        }
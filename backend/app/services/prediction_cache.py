@@ -0,0 +1,153 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+Prediccion = Tuple[str, float]
+
+
+def huella_modelo(model_path: str, *rutas_extra: str, parametros: str = "") -> str:
+    """
+    Identifica la versión de los modelos que producen la predicción.
+
+    Args:
+        model_path: modelo principal
+        *rutas_extra: otros archivos que intervienen (p. ej. el modelo rápido de la cascada)
+        parametros: configuración que cambia el resultado (p. ej. el umbral de la cascada)
+
+    Returns:
+        Hash de la ruta, tamaño y fecha de modificación de cada archivo y de los parámetros
+    """
+    partes = [parametros]
+    for ruta in (model_path, *rutas_extra):
+        try:
+            stat = os.stat(ruta)
+        except OSError:
+            partes.append(f"{ruta}:sin-modelo")
+            continue
+        partes.append(f"{os.path.abspath(ruta)}:{stat.st_size}:{stat.st_mtime_ns}")
+    return hashlib.blake2b("|".join(partes).encode("utf-8"), digest_size=8).hexdigest()
+
+
+class PredictionCache:
+    """
+    Caché de predicciones indexada por el hash del contenido subido.
+
+    Mantiene un nivel en memoria con expulsión LRU y, opcionalmente, un nivel
+    en disco (un JSON por entrada). Ambos se invalidan cuando cambia el
+    archivo del modelo: las entradas en disco viven en un subdirectorio por
+    huella del modelo y las de memoria se vacían al detectar el cambio.
+    La huella incluye ``rutas_extra`` y ``parametros`` (ver ``huella_modelo``).
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        max_entries: int = 1024,
+        disk_dir: Optional[str] = None,
+        rutas_extra: Sequence[str] = (),
+        parametros: str = "",
+    ):
+        self.model_path = model_path
+        self.rutas_extra = tuple(rutas_extra)
+        self.parametros = parametros
+        self.max_entries = max(1, max_entries)
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self._memoria: "OrderedDict[str, Prediccion]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._huella = self._huella_actual()
+
+        self.hits_memoria = 0
+        self.hits_disco = 0
+        self.misses = 0
+        self.expulsiones = 0
+        self.invalidaciones = 0
+
+    @staticmethod
+    def clave(image_bytes: bytes) -> str:
+        """Hash del contenido; para archivos grandes conviene calcularlo en el executor."""
+        return hashlib.blake2b(image_bytes, digest_size=20).hexdigest()
+
+    def _huella_actual(self) -> str:
+        return huella_modelo(self.model_path, *self.rutas_extra, parametros=self.parametros)
+
+    def _verificar_modelo(self) -> None:
+        huella = self._huella_actual()
+        if huella == self._huella:
+            return
+        logging.info("Modelo modificado: se invalida la caché de predicciones")
+        self._memoria.clear()
+        self.invalidaciones += 1
+        if self.disk_dir is not None:
+            shutil.rmtree(self.disk_dir / self._huella, ignore_errors=True)
+        self._huella = huella
+
+    def _ruta_disco(self, clave: str) -> Optional[Path]:
+        if self.disk_dir is None:
+            return None
+        return self.disk_dir / self._huella / clave[:2] / f"{clave}.json"
+
+    def _guardar_memoria(self, clave: str, valor: Prediccion) -> None:
+        self._memoria[clave] = valor
+        self._memoria.move_to_end(clave)
+        while len(self._memoria) > self.max_entries:
+            self._memoria.popitem(last=False)
+            self.expulsiones += 1
+
+    def get(self, clave: str) -> Optional[Prediccion]:
+        with self._lock:
+            self._verificar_modelo()
+            valor = self._memoria.get(clave)
+            if valor is not None:
+                self._memoria.move_to_end(clave)
+                self.hits_memoria += 1
+                return valor
+
+            ruta = self._ruta_disco(clave)
+            if ruta is not None and ruta.exists():
+                try:
+                    datos = json.loads(ruta.read_text())
+                    valor = (datos["clase"], float(datos["confianza"]))
+                except (OSError, ValueError, KeyError):
+                    valor = None
+                if valor is not None:
+                    self._guardar_memoria(clave, valor)
+                    self.hits_disco += 1
+                    return valor
+
+            self.misses += 1
+            return None
+
+    def set(self, clave: str, valor: Prediccion) -> None:
+        with self._lock:
+            self._verificar_modelo()
+            self._guardar_memoria(clave, valor)
+            ruta = self._ruta_disco(clave)
+        if ruta is None:
+            return
+        try:
+            ruta.parent.mkdir(parents=True, exist_ok=True)
+            temporal = ruta.with_suffix(".tmp")
+            temporal.write_text(json.dumps({"clase": valor[0], "confianza": valor[1]}))
+            os.replace(temporal, ruta)
+        except OSError as e:
+            logging.warning(f"No se pudo escribir la caché en disco: {str(e)}")
+
+    def estadisticas(self) -> Dict[str, Any]:
+        consultas = self.hits_memoria + self.hits_disco + self.misses
+        return {
+            "entradas_memoria": len(self._memoria),
+            "max_entradas": self.max_entries,
+            "disco": str(self.disk_dir) if self.disk_dir else None,
+            "hits_memoria": self.hits_memoria,
+            "hits_disco": self.hits_disco,
+            "misses": self.misses,
+            "tasa_acierto": (self.hits_memoria + self.hits_disco) / consultas if consultas else 0.0,
+            "expulsiones": self.expulsiones,
+            "invalidaciones": self.invalidaciones,
+        }
@@ -0,0 +1,244 @@
+import hashlib
+import json
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.recommendation_cache import RecommendationCacheEntry
+
+
+class ConsultaRecomendacion:
+    """
+    Forma normalizada de lo que determina el prompt de OpenRouter.
+
+    La confianza se redondea hacia abajo a bandas de ``granularidad`` y los
+    síntomas se pasan a minúsculas, sin duplicados y ordenados, de modo que
+    consultas equivalentes comparten la misma clave.
+    """
+
+    __slots__ = ("clase", "banda", "granularidad", "sintomas", "modelo")
+
+    def __init__(
+        self,
+        clase: str,
+        confianza: float,
+        sintomas: Iterable[str],
+        granularidad: float,
+        modelo: str,
+    ):
+        self.clase = clase.strip()
+        self.granularidad = granularidad
+        pasos = math.floor(min(max(confianza, 0.0), 1.0) / granularidad + 1e-9)
+        self.banda = round(min(pasos * granularidad, 1.0), 4)
+        self.sintomas: Tuple[str, ...] = tuple(
+            sorted({s.strip().lower() for s in sintomas if s and s.strip()})
+        )
+        self.modelo = modelo
+
+    @property
+    def clave(self) -> str:
+        datos = json.dumps([self.clase, self.banda, self.sintomas, self.modelo], ensure_ascii=False)
+        return hashlib.blake2b(datos.encode("utf-8"), digest_size=16).hexdigest()
+
+    @property
+    def diagnostico(self) -> str:
+        """Texto del diagnóstico para el prompt, construido solo con la forma normalizada."""
+        tope = min(self.banda + self.granularidad, 1.0)
+        texto = f"{self.clase} - Nivel de confianza: {self.banda:.0%}-{tope:.0%}"
+        if self.sintomas:
+            texto += f" - Síntomas reportados: {', '.join(self.sintomas)}"
+        return texto
+
+
+class RecommendationCache:
+    """
+    Caché de recomendaciones de OpenRouter persistida en la tabla ``recommendation_cache``.
+
+    Un nivel en memoria (LRU) responde sin tocar la base; la tabla sobrevive a
+    reinicios y se comparte entre procesos. Las entradas vencen a los
+    ``ttl_segundos`` y, al superar ``max_entradas`` filas, se expulsan las
+    usadas hace más tiempo. Los aciertos se acumulan en memoria y se vuelcan a
+    la tabla (``hits``, ``usado_en``) como mucho cada ``volcado_segundos`` y antes
+    de expulsar filas, en lugar de un UPDATE y un commit por lectura.
+    """
+
+    def __init__(
+        self,
+        ttl_segundos: float,
+        max_entradas: int,
+        max_entradas_memoria: int = 256,
+        volcado_segundos: float = 60.0,
+    ):
+        self.ttl = timedelta(seconds=ttl_segundos)
+        self.max_entradas = max(1, max_entradas)
+        self.max_entradas_memoria = max(1, max_entradas_memoria)
+        self.volcado_segundos = volcado_segundos
+        self._memoria: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # clave -> (aciertos sin volcar, último uso)
+        self._hits_pendientes: Dict[str, Tuple[int, datetime]] = {}
+        self._ultimo_volcado = time.monotonic()
+
+        self.hits_memoria = 0
+        self.hits_db = 0
+        self.misses = 0
+        self.expulsiones = 0
+
+    def _anotar_hit(self, clave: str) -> None:
+        # Llamar con ``_lock`` tomado
+        ahora = datetime.utcnow()
+        hits = self._hits_pendientes.get(clave, (0, ahora))[0]
+        self._hits_pendientes[clave] = (hits + 1, ahora)
+
+    def volcar_hits(self, db: Session) -> None:
+        """Escribe en la tabla los aciertos acumulados en memoria (sin hacer commit)."""
+        with self._lock:
+            pendientes, self._hits_pendientes = self._hits_pendientes, {}
+            self._ultimo_volcado = time.monotonic()
+        for clave, (hits, usado_en) in pendientes.items():
+            db.execute(
+                update(RecommendationCacheEntry)
+                .where(RecommendationCacheEntry.clave == clave)
+                .values(hits=RecommendationCacheEntry.hits + hits, usado_en=usado_en)
+            )
+
+    def _guardar_memoria(self, clave: str, texto: str, vence: float) -> None:
+        with self._lock:
+            self._memoria[clave] = (texto, vence)
+            self._memoria.move_to_end(clave)
+            while len(self._memoria) > self.max_entradas_memoria:
+                self._memoria.popitem(last=False)
+
+    def get(self, db: Session, consulta: ConsultaRecomendacion) -> Optional[str]:
+        """
+        Busca la recomendación de la consulta.
+
+        Args:
+            db: sesión de la base de datos
+            consulta: consulta normalizada
+
+        Returns:
+            El texto guardado, o None si no existe o venció
+        """
+        clave = consulta.clave
+        with self._lock:
+            valor = self._memoria.get(clave)
+            if valor is not None and valor[1] > time.time():
+                self._memoria.move_to_end(clave)
+                self._anotar_hit(clave)
+                self.hits_memoria += 1
+                return valor[0]
+
+        ahora = datetime.utcnow()
+        entrada = db.get(RecommendationCacheEntry, clave)
+        if entrada is None or entrada.creado_en <= ahora - self.ttl:
+            self.misses += 1
+            return None
+
+        vence = time.time() + (entrada.creado_en + self.ttl - ahora).total_seconds()
+        self._guardar_memoria(clave, entrada.recomendacion, vence)
+        with self._lock:
+            self._anotar_hit(clave)
+            volcar = time.monotonic() - self._ultimo_volcado >= self.volcado_segundos
+        self.hits_db += 1
+        if volcar:
+            self.volcar_hits(db)
+            db.commit()
+        return entrada.recomendacion
+
+    def set(self, db: Session, consulta: ConsultaRecomendacion, texto: str) -> None:
+        """Guarda (o reemplaza) la recomendación y aplica el TTL y el tope de filas."""
+        ahora = datetime.utcnow()
+        clave = consulta.clave
+        db.merge(
+            RecommendationCacheEntry(
+                clave=clave,
+                clase=consulta.clase,
+                banda_confianza=consulta.banda,
+                sintomas=json.dumps(list(consulta.sintomas), ensure_ascii=False),
+                modelo=consulta.modelo,
+                recomendacion=texto,
+                hits=0,
+                creado_en=ahora,
+                usado_en=ahora,
+            )
+        )
+        with self._lock:
+            self._hits_pendientes.pop(clave, None)
+        self.volcar_hits(db)
+        db.flush()
+        self._guardar_memoria(clave, texto, time.time() + self.ttl.total_seconds())
+
+        # Expulsión: primero lo vencido, después lo menos usado por encima del tope
+        vencidas = db.execute(
+            delete(RecommendationCacheEntry).where(
+                RecommendationCacheEntry.creado_en <= ahora - self.ttl
+            )
+        ).rowcount
+        total = db.scalar(select(func.count()).select_from(RecommendationCacheEntry))
+        sobrantes = max(0, total - self.max_entradas)
+        if sobrantes:
+            viejas = (
+                select(RecommendationCacheEntry.clave)
+                .order_by(RecommendationCacheEntry.usado_en)
+                .limit(sobrantes)
+            )
+            db.execute(
+                delete(RecommendationCacheEntry).where(
+                    RecommendationCacheEntry.clave.in_(viejas.scalar_subquery())
+                )
+            )
+        db.commit()
+        if vencidas or sobrantes:
+            self.expulsiones += vencidas + sobrantes
+            logging.info(f"Caché de recomendaciones: {vencidas} vencidas, {sobrantes} expulsadas")
+
+    def estadisticas(self) -> Dict[str, Any]:
+        consultas = self.hits_memoria + self.hits_db + self.misses
+        return {
+            "entradas_memoria": len(self._memoria),
+            "max_entradas": self.max_entradas,
+            "ttl_segundos": self.ttl.total_seconds(),
+            "hits_memoria": self.hits_memoria,
+            "hits_db": self.hits_db,
+            "misses": self.misses,
+            "tasa_acierto": (self.hits_memoria + self.hits_db) / consultas if consultas else 0.0,
+            "expulsiones": self.expulsiones,
+        }
+
+
+_cache: Optional[RecommendationCache] = None
+
+
+def get_recommendation_cache() -> Optional[RecommendationCache]:
+    global _cache
+    if not settings.RECOMMENDATION_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = RecommendationCache(
+            settings.RECOMMENDATION_CACHE_TTL_SECONDS,
+            settings.RECOMMENDATION_CACHE_MAX_ENTRIES,
+            settings.RECOMMENDATION_CACHE_MEMORY_ENTRIES,
+            settings.RECOMMENDATION_CACHE_HITS_FLUSH_SECONDS,
+        )
+    return _cache
+
+
+def normalizar_consulta(
+    clase: str, confianza: float, sintomas: Iterable[str]
+) -> ConsultaRecomendacion:
+    return ConsultaRecomendacion(
+        clase,
+        confianza,
+        sintomas,
+        settings.RECOMMENDATION_CACHE_CONFIDENCE_STEP,
+        settings.OPENROUTER_MODEL,
+    )
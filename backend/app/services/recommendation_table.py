@@ -0,0 +1,176 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.services.recommendation_cache import ConsultaRecomendacion
+
+# Formato del archivo (little-endian):
+#   MAGIA (8 bytes) | largo de los metadatos (uint32) | metadatos JSON | relleno a 8 bytes
+#   índice: N registros (clave 16 bytes, desplazamiento uint64, largo uint32) ordenados por clave
+#   datos: recomendaciones comprimidas con zlib (los textos repetidos se guardan una vez)
+MAGIA = b"FERECT01"
+# La clave es "V16" (bytes crudos): "S16" descarta los NUL finales y las claves que terminan
+# en 0x00 no coincidirían consigo mismas
+INDICE_DTYPE = np.dtype([("clave", "V16"), ("desplazamiento", "<u8"), ("largo", "<u4")])
+
+
+def escribir_tabla(ruta: str, entradas: Dict[str, str], metadatos: Dict[str, Any]) -> int:
+    """
+    Escribe la tabla precalculada de recomendaciones.
+
+    Args:
+        ruta: archivo de salida (se reemplaza de forma atómica)
+        entradas: clave hexadecimal de ``ConsultaRecomendacion`` -> recomendación
+        metadatos: granularidad, modelo y vocabulario con que se generó
+
+    Returns:
+        Tamaño del archivo en bytes
+    """
+    indice = np.zeros(len(entradas), dtype=INDICE_DTYPE)
+    datos = bytearray()
+    desplazamientos: Dict[str, tuple] = {}
+    for i, (clave, texto) in enumerate(entradas.items()):
+        if texto not in desplazamientos:
+            comprimido = zlib.compress(texto.encode("utf-8"), 9)
+            desplazamientos[texto] = (len(datos), len(comprimido))
+            datos += comprimido
+        indice[i] = (np.void(bytes.fromhex(clave)), *desplazamientos[texto])
+    indice.sort(order="clave")
+
+    meta = json.dumps({**metadatos, "entradas": len(entradas)}, ensure_ascii=False).encode()
+    cabecera = MAGIA + struct.pack("<I", len(meta)) + meta
+    cabecera += b"\0" * (-len(cabecera) % 8)
+
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "wb") as f:
+        f.write(cabecera)
+        f.write(indice.tobytes())
+        f.write(datos)
+    os.replace(temporal, ruta)
+    return os.path.getsize(ruta)
+
+
+class TablaRecomendaciones:
+    """
+    Tabla de recomendaciones generada offline (scripts/build_recommendation_table.py).
+
+    El archivo se mapea en memoria: el índice se consulta con búsqueda binaria
+    sobre las páginas mapeadas y solo se descomprime el texto encontrado, así
+    que responder no requiere red ni base de datos.
+    """
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        with open(ruta, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:8] != MAGIA:
+            self._mmap.close()
+            raise ValueError(f"{ruta} no es una tabla de recomendaciones")
+        (largo_meta,) = struct.unpack_from("<I", self._mmap, 8)
+        self.metadatos: Dict[str, Any] = json.loads(self._mmap[12 : 12 + largo_meta])
+        inicio_indice = 12 + largo_meta + (-(12 + largo_meta) % 8)
+        total = self.metadatos["entradas"]
+        self._indice = np.frombuffer(
+            self._mmap, dtype=INDICE_DTYPE, count=total, offset=inicio_indice
+        )
+        self._inicio_datos = inicio_indice + total * INDICE_DTYPE.itemsize
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def compatible(self, granularidad: float, modelo: str) -> bool:
+        """La tabla solo sirve si se generó con las mismas bandas y el mismo modelo."""
+        return (
+            abs(self.metadatos.get("granularidad", -1) - granularidad) < 1e-9
+            and self.metadatos.get("modelo") == modelo
+        )
+
+    def buscar(self, consulta: ConsultaRecomendacion) -> Optional[str]:
+        clave = np.void(bytes.fromhex(consulta.clave))
+        claves = self._indice["clave"]
+        posicion = int(np.searchsorted(claves, clave))
+        if posicion >= len(claves) or claves[posicion] != clave:
+            with self._lock:
+                self.misses += 1
+            return None
+        registro = self._indice[posicion]
+        inicio = self._inicio_datos + int(registro["desplazamiento"])
+        texto = zlib.decompress(self._mmap[inicio : inicio + int(registro["largo"])])
+        with self._lock:
+            self.hits += 1
+        return texto.decode("utf-8")
+
+    def cerrar(self) -> None:
+        # El índice es una vista sobre el mmap: soltarla antes de cerrarlo
+        self._indice = np.zeros(0, dtype=INDICE_DTYPE)
+        self._mmap.close()
+
+    def estadisticas(self) -> Dict[str, Any]:
+        consultas = self.hits + self.misses
+        return {
+            "ruta": self.ruta,
+            "entradas": self.metadatos.get("entradas", 0),
+            "generada_en": self.metadatos.get("generado_en"),
+            "max_sintomas": self.metadatos.get("max_sintomas"),
+            "bytes": os.path.getsize(self.ruta),
+            "hits": self.hits,
+            "misses": self.misses,
+            "cobertura": self.hits / consultas if consultas else 0.0,
+        }
+
+
+_tabla: Optional[TablaRecomendaciones] = None
+_cargada = False
+
+
+def cargar_tabla(ruta: Optional[str] = None) -> Optional[TablaRecomendaciones]:
+    """
+    Abre la tabla configurada en ``RECOMMENDATION_TABLE_PATH`` (lo llama el lifespan).
+
+    Returns:
+        La tabla, o None si no hay archivo o no coincide con la configuración actual
+    """
+    global _tabla, _cargada
+    liberar_tabla()
+    _cargada = True
+    ruta = ruta or settings.RECOMMENDATION_TABLE_PATH
+    if not ruta or not Path(ruta).exists():
+        return None
+    try:
+        tabla = TablaRecomendaciones(ruta)
+    except (OSError, ValueError) as e:
+        logging.warning(f"No se pudo abrir la tabla de recomendaciones {ruta}: {e}")
+        return None
+    if not tabla.compatible(
+        settings.RECOMMENDATION_CACHE_CONFIDENCE_STEP, settings.OPENROUTER_MODEL
+    ):
+        logging.warning(f"La tabla {ruta} se generó con otra granularidad o modelo; se ignora")
+        tabla.cerrar()
+        return None
+    _tabla = tabla
+    logging.info(f"Tabla de recomendaciones cargada: {tabla.metadatos['entradas']} entradas")
+    return _tabla
+
+
+def get_recommendation_table() -> Optional[TablaRecomendaciones]:
+    if not _cargada:
+        cargar_tabla()
+    return _tabla
+
+
+def liberar_tabla() -> None:
+    global _tabla, _cargada
+    if _tabla is not None:
+        _tabla.cerrar()
+    _tabla = None
+    _cargada = False
@@ -0,0 +1,253 @@
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, TypeVar, Union
+
+from sqlalchemy import or_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core import deadline
+from app.core.database import AsyncSessionLocal
+from app.models.scan_job import ScanJob
+from app.models.user import User
+from app.services.diagnosis import ajustar_diagnostico, guardar_diagnostico
+from app.services.image import predecir_bytes
+
+ESTADOS_FINALES = ("completado", "fallido")
+
+T = TypeVar("T")
+
+_tareas: List["asyncio.Task[None]"] = []
+_hay_trabajo: Optional[asyncio.Event] = None
+# Esperas de /events por trabajo; se despiertan al cambiar su estado en este proceso
+_suscriptores: Dict[int, asyncio.Event] = {}
+_contadores = {"completados": 0, "fallidos": 0, "reintentos": 0}
+
+
+async def _en_sesion(db: Union[Session, AsyncSession], fn: Callable[..., T], *args: Any) -> T:
+    """
+    Ejecuta ``fn(sesion, *args)`` con una sesión síncrona.
+
+    Con una ``AsyncSession`` (la de los workers) corre sobre el driver asíncrono
+    con ``run_sync``: las consultas y los commits no bloquean el event loop.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args)
+    return fn(db, *args)
+
+
+def _notificar(job_id: int) -> None:
+    evento = _suscriptores.pop(job_id, None)
+    if evento is not None:
+        evento.set()
+
+
+async def esperar_cambio(job_id: int, timeout: float) -> None:
+    """Espera a que el trabajo cambie de estado en este proceso o a que venza ``timeout``."""
+    evento = _suscriptores.setdefault(job_id, asyncio.Event())
+    try:
+        await asyncio.wait_for(evento.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+
+
+def encolar_escaneo(
+    db: Session, user_id: int, archivo: str, image_bytes: bytes, sintomas: List[str]
+) -> ScanJob:
+    """
+    Guarda el escaneo en la cola persistente y despierta a los workers.
+
+    Args:
+        db: sesión de la base de datos
+        user_id: ID del usuario
+        archivo: nombre del archivo subido
+        image_bytes: contenido de la imagen
+        sintomas: lista de síntomas
+
+    Returns:
+        ScanJob: trabajo en estado "pendiente"
+    """
+    ahora = datetime.utcnow()
+    job = ScanJob(
+        user_id=user_id,
+        archivo=archivo,
+        imagen=image_bytes,
+        sintomas=json.dumps(sintomas),
+        estado="pendiente",
+        intentos=0,
+        disponible_en=ahora,
+        creado_en=ahora,
+        actualizado_en=ahora,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    if _hay_trabajo is not None:
+        _hay_trabajo.set()
+    return job
+
+
+def reclamar_trabajo(db: Session) -> Optional[ScanJob]:
+    """
+    Toma el próximo trabajo disponible.
+
+    El reclamo es un UPDATE condicionado al estado leído, así que dos workers
+    (o dos procesos) nunca toman el mismo trabajo. Un trabajo "procesando" cuyo
+    plazo venció (worker caído) vuelve a estar disponible.
+    """
+    ahora = datetime.utcnow()
+    candidatos = (
+        db.query(ScanJob.id, ScanJob.estado, ScanJob.intentos)
+        .filter(ScanJob.estado.in_(("pendiente", "procesando")), ScanJob.disponible_en <= ahora)
+        .order_by(ScanJob.disponible_en, ScanJob.id)
+        .limit(5)
+        .all()
+    )
+    for job_id, estado, intentos in candidatos:
+        vencido = estado == "procesando" and intentos >= settings.SCAN_JOB_MAX_ATTEMPTS
+        valores: Dict[str, Any] = {"actualizado_en": ahora}
+        if vencido:
+            valores.update(estado="fallido", error="Se agotaron los reintentos", imagen=None)
+        else:
+            plazo = ahora + timedelta(seconds=settings.SCAN_JOB_LEASE_SECONDS)
+            valores.update(estado="procesando", intentos=intentos + 1, disponible_en=plazo)
+        resultado = db.execute(
+            update(ScanJob)
+            .where(ScanJob.id == job_id, ScanJob.estado == estado, ScanJob.intentos == intentos)
+            .values(**valores)
+        )
+        db.commit()
+        if resultado.rowcount != 1:
+            continue  # otro worker lo tomó primero
+        if vencido:
+            _contadores["fallidos"] += 1
+            _notificar(job_id)
+            continue
+        return db.get(ScanJob, job_id)
+    return None
+
+
+async def procesar_trabajo(db: Union[Session, AsyncSession], job: ScanJob) -> None:
+    """
+    Ejecuta el escaneo completo del trabajo y registra el resultado o el reintento.
+
+    Args:
+        db: sesión con la que se reclamó el trabajo (``Session`` o ``AsyncSession``)
+        job: trabajo en estado "procesando"
+    """
+    # Leídos antes de cualquier commit o rollback, que expiran los atributos de ``job``
+    job_id, user_id, intentos = job.id, job.user_id, job.intentos
+    try:
+        user = await _en_sesion(db, Session.get, User, user_id)
+        if user is None:
+            raise ValueError("El usuario del trabajo ya no existe")
+        sintomas = json.loads(job.sintomas or "[]")
+        with deadline.plazo(settings.SCAN_DEADLINE_SECONDS):
+            prediccion = predecir_bytes(job.imagen, user_id=user_id)
+            clase, confianza = await deadline.con_plazo(prediccion)
+            diagnostico = ajustar_diagnostico(clase, sintomas, confianza)
+            guardado = await guardar_diagnostico(
+                db=db, user=user, resultado=diagnostico, archivo=job.archivo, sintomas=sintomas
+            )
+        valores: Dict[str, Any] = {
+            "estado": "completado",
+            "diagnosis_id": guardado.id,
+            "imagen": None,
+            "error": None,
+        }
+        _contadores["completados"] += 1
+    except Exception as e:
+        await _en_sesion(db, Session.rollback)
+        logging.error(f"Error en el trabajo de escaneo {job_id}: {str(e)}")
+        valores = {"error": str(e)}
+        if intentos >= settings.SCAN_JOB_MAX_ATTEMPTS:
+            valores.update(estado="fallido", imagen=None)
+            _contadores["fallidos"] += 1
+        else:
+            espera = settings.SCAN_JOB_RETRY_BACKOFF_SECONDS * 2 ** (intentos - 1)
+            valores.update(
+                estado="pendiente", disponible_en=datetime.utcnow() + timedelta(seconds=espera)
+            )
+            _contadores["reintentos"] += 1
+    valores["actualizado_en"] = datetime.utcnow()
+    await _en_sesion(db, _guardar_resultado, job, valores)
+    _notificar(job_id)
+
+
+def _guardar_resultado(db: Session, job: ScanJob, valores: Dict[str, Any]) -> None:
+    for campo, valor in valores.items():
+        setattr(job, campo, valor)
+    db.commit()
+
+
+async def _worker(numero: int) -> None:
+    logging.info(f"Worker de escaneos {numero} iniciado")
+    while True:
+        # Sesión asíncrona: el sondeo y los commits de la cola no bloquean el event loop
+        async with AsyncSessionLocal() as db:
+            try:
+                job = await db.run_sync(reclamar_trabajo)
+                if job is not None:
+                    await procesar_trabajo(db, job)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Error en el worker de escaneos {numero}: {str(e)}")
+
+        # Sin trabajo: esperar un aviso de este proceso o el próximo sondeo
+        assert _hay_trabajo is not None
+        _hay_trabajo.clear()
+        try:
+            await asyncio.wait_for(_hay_trabajo.wait(), settings.SCAN_JOB_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+def iniciar_workers() -> None:
+    """
+    Lanza ``SCAN_JOB_WORKERS`` tareas que consumen la cola en este proceso.
+
+    La tabla ``scan_jobs`` la crean las migraciones (``alembic upgrade head``).
+    """
+    global _hay_trabajo
+    _hay_trabajo = asyncio.Event()
+    for numero in range(max(1, settings.SCAN_JOB_WORKERS)):
+        _tareas.append(asyncio.create_task(_worker(numero)))
+
+
+async def detener_workers() -> None:
+    global _hay_trabajo
+    for tarea in _tareas:
+        tarea.cancel()
+    await asyncio.gather(*_tareas, return_exceptions=True)
+    _tareas.clear()
+    _hay_trabajo = None
+
+
+def estadisticas(db: Session) -> Dict[str, Any]:
+    ahora = datetime.utcnow()
+    pendientes = db.query(ScanJob).filter(ScanJob.estado == "pendiente").count()
+    en_proceso = (
+        db.query(ScanJob)
+        .filter(ScanJob.estado == "procesando", ScanJob.disponible_en > ahora)
+        .count()
+    )
+    atrasados = (
+        db.query(ScanJob)
+        .filter(
+            or_(ScanJob.estado == "pendiente", ScanJob.estado == "procesando"),
+            ScanJob.disponible_en <= ahora,
+        )
+        .count()
+    )
+    return {
+        "workers": len(_tareas),
+        "pendientes": pendientes,
+        "procesando": en_proceso,
+        "listos_para_tomar": atrasados,
+        **_contadores,
+    }
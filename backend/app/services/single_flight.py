@@ -0,0 +1,94 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class _Vuelo(Generic[T]):
+    __slots__ = ("tarea", "esperando")
+
+    def __init__(self, tarea: "asyncio.Future[T]"):
+        self.tarea = tarea
+        self.esperando = 0
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes con la misma clave en una sola ejecución.
+
+    El primer llamador lanza la corrutina como tarea propia y los que llegan
+    mientras sigue en vuelo esperan esa misma tarea. Todos reciben el mismo
+    resultado o la misma excepción. Cancelar a un llamador no cancela la
+    llamada compartida mientras otro la siga esperando; si se van todos, se
+    cancela. Al terminar la clave se libera: no guarda resultados.
+    """
+
+    def __init__(self, nombre: str = "single-flight"):
+        self.nombre = nombre
+        self._en_vuelo: Dict[str, _Vuelo[Any]] = {}
+
+        self.llamadas = 0
+        self.ejecuciones = 0
+        self.compartidas = 0
+        self.errores = 0
+        self.cancelaciones = 0
+
+    def _liberar(self, clave: str, vuelo: _Vuelo[Any]) -> None:
+        if self._en_vuelo.get(clave) is vuelo:
+            del self._en_vuelo[clave]
+
+    def _terminada(self, clave: str, vuelo: _Vuelo[Any]) -> None:
+        self._liberar(clave, vuelo)
+        if vuelo.tarea.cancelled():
+            return
+        # Marcar la excepción como recuperada aunque ya no quede nadie esperando
+        error = vuelo.tarea.exception()
+        if error is not None:
+            self.errores += 1
+            logging.warning(f"{self.nombre}: la llamada compartida falló: {error}")
+
+    async def ejecutar(self, clave: str, fabrica: Callable[[], Awaitable[T]]) -> T:
+        """
+        Ejecuta ``fabrica()`` o se suma a la ejecución en vuelo con la misma clave.
+
+        Args:
+            clave: identifica las llamadas equivalentes
+            fabrica: crea la corrutina; solo se invoca si no hay una en vuelo
+
+        Returns:
+            El resultado de la ejecución compartida
+        """
+        self.llamadas += 1
+        vuelo = self._en_vuelo.get(clave)
+        if vuelo is None:
+            vuelo = _Vuelo(asyncio.ensure_future(fabrica()))
+            self._en_vuelo[clave] = vuelo
+            vuelo.tarea.add_done_callback(lambda _: self._terminada(clave, vuelo))
+            self.ejecuciones += 1
+        else:
+            self.compartidas += 1
+
+        vuelo.esperando += 1
+        try:
+            return await asyncio.shield(vuelo.tarea)
+        except asyncio.CancelledError:
+            if not vuelo.tarea.done():
+                self.cancelaciones += 1
+            raise
+        finally:
+            vuelo.esperando -= 1
+            if vuelo.esperando == 0 and not vuelo.tarea.done():
+                # Nadie más la espera: liberar la clave ya y cancelar la llamada
+                self._liberar(clave, vuelo)
+                vuelo.tarea.cancel()
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {
+            "en_vuelo": len(self._en_vuelo),
+            "llamadas": self.llamadas,
+            "llamadas_upstream": self.ejecuciones,
+            "ahorradas": self.compartidas,
+            "errores": self.errores,
+            "cancelaciones": self.cancelaciones,
+        }
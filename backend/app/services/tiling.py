@@ -0,0 +1,218 @@
+import io
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.config import CLASS_NAMES, settings
+from app.services.executor import get_image_executor, get_inference_executor
+from app.services.image import get_model, predecir_lote
+
+TAM_TESELA = 224
+
+
+def dimensiones_rebano(ancho: int, alto: int, max_lado: int) -> Tuple[int, int]:
+    """
+    Tamaño ``(ancho, alto)`` al que se lleva la foto: lado mayor limitado a ``max_lado``.
+
+    El lado menor nunca queda por debajo de una tesela (una foto chica se agranda).
+    """
+    escala = min(1.0, max_lado / max(ancho, alto))
+    escala = max(escala, TAM_TESELA / min(ancho, alto))
+    if escala == 1.0:
+        return ancho, alto
+    return max(TAM_TESELA, round(ancho * escala)), max(TAM_TESELA, round(alto * escala))
+
+
+def validar_rebano(
+    ancho: int, alto: int, max_lado: int, solape: float, max_teselas: int, max_proporcion: float
+) -> Tuple[int, int]:
+    """
+    Controla una foto por las dimensiones de su cabecera, antes de decodificarla.
+
+    Args:
+        ancho: Ancho original en píxeles
+        alto: Alto original en píxeles
+        max_lado: Lado mayor después de reducir (``TILING_MAX_SIDE``)
+        solape: Solapamiento entre teselas (``TILING_OVERLAP``)
+        max_teselas: Tope de teselas de la grilla (0 = sin límite)
+        max_proporcion: Tope de lado mayor / lado menor (0 = sin límite)
+
+    Returns:
+        Tamaño final ``(ancho, alto)`` de ``dimensiones_rebano``
+
+    Raises:
+        ValueError: si la proporción o la cantidad de teselas superan los topes
+    """
+    proporcion = max(ancho, alto) / max(1, min(ancho, alto))
+    if max_proporcion > 0 and proporcion > max_proporcion:
+        # Una panorámica angosta se agrandaría hasta que el lado menor mida una tesela
+        raise ValueError(
+            f"La foto ({ancho}x{alto}) es demasiado alargada ({proporcion:.1f}:1); "
+            f"el máximo es {max_proporcion:g}:1"
+        )
+    final = dimensiones_rebano(ancho, alto, max_lado)
+    cantidad = _paso(final[1], TAM_TESELA, solape)[0] * _paso(final[0], TAM_TESELA, solape)[0]
+    if max_teselas > 0 and cantidad > max_teselas:
+        raise ValueError(
+            f"La foto ({ancho}x{alto}) genera {cantidad} teselas; el máximo es {max_teselas}"
+        )
+    return final
+
+
+def decodificar_completa(image_bytes: bytes, max_lado: int) -> np.ndarray:
+    """
+    Decodifica la foto entera (sin recorte) al tamaño de ``dimensiones_rebano``.
+
+    Los topes de ``TILING_MAX_TILES`` y ``TILING_MAX_ASPECT_RATIO`` se controlan
+    con las dimensiones de la cabecera, antes de decodificar y de remuestrear.
+    Los JPEG se reducen en el propio decodificador (draft) antes de remuestrear.
+
+    Raises:
+        ValueError: si la foto supera alguno de los topes
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    nuevo = validar_rebano(
+        *image.size,
+        max_lado,
+        settings.TILING_OVERLAP,
+        settings.TILING_MAX_TILES,
+        settings.TILING_MAX_ASPECT_RATIO,
+    )
+    if image.format == "JPEG":
+        image.draft("RGB", (max_lado, max_lado))
+    image = image.convert("RGB")
+    if image.size != nuevo:
+        image = image.resize(nuevo, Image.Resampling.LANCZOS)
+    return np.asarray(image)
+
+
+def _paso(longitud: int, tam: int, solape: float) -> Tuple[int, int]:
+    """Cantidad de teselas y paso entero para cubrir ``longitud`` con al menos ``solape``."""
+    if longitud <= tam:
+        return 1, 1
+    paso_max = max(1, int(tam * (1 - solape)))
+    cantidad = int(np.ceil((longitud - tam) / paso_max)) + 1
+    return cantidad, (longitud - tam) // (cantidad - 1)
+
+
+def teselas(arreglo: np.ndarray, tam: int = TAM_TESELA, solape: float = 0.25) -> np.ndarray:
+    """
+    Grilla de teselas superpuestas como vista sobre el arreglo decodificado.
+
+    El paso se reparte de forma pareja para que la grilla llegue hasta el borde
+    (salvo unos pocos píxeles por el redondeo), sin copiar datos.
+
+    Args:
+        arreglo: Imagen ``(H, W, 3)``
+        tam: Lado de cada tesela
+        solape: Fracción mínima de solapamiento entre teselas vecinas
+
+    Returns:
+        np.ndarray: Vista de forma ``(filas, columnas, tam, tam, 3)``
+    """
+    filas, paso_y = _paso(arreglo.shape[0], tam, solape)
+    columnas, paso_x = _paso(arreglo.shape[1], tam, solape)
+    ventanas = np.lib.stride_tricks.sliding_window_view(arreglo, (tam, tam, 3))[:, :, 0]
+    return ventanas[::paso_y, ::paso_x][:filas, :columnas]
+
+
+def lote_de_teselas(grilla: np.ndarray, dtype: Any) -> np.ndarray:
+    """Copia la grilla una sola vez al lote contiguo ``(N, tam, tam, 3)`` que recibe el modelo."""
+    filas, columnas = grilla.shape[:2]
+    lote = np.empty((filas * columnas,) + grilla.shape[2:], dtype=dtype)
+    destino = lote.reshape(grilla.shape)
+    if np.dtype(dtype) == np.uint8:
+        destino[...] = grilla
+    else:
+        np.multiply(grilla, 1 / 255.0, out=destino, casting="same_kind")
+    return lote
+
+
+def preparar_rebano(image_bytes: bytes) -> Tuple[np.ndarray, Tuple[int, int], Tuple[int, int]]:
+    """
+    Decodifica y arma el lote de teselas. Es bloqueante: llamar desde el executor.
+
+    Returns:
+        (lote, (filas, columnas), (paso_y, paso_x))
+
+    Raises:
+        ValueError: si la foto es demasiado alargada o genera más de ``TILING_MAX_TILES``
+            teselas (se controla antes de decodificarla)
+    """
+    arreglo = decodificar_completa(image_bytes, settings.TILING_MAX_SIDE)
+    grilla = teselas(arreglo, TAM_TESELA, settings.TILING_OVERLAP)
+    pasos = tuple(s // arreglo.strides[i] for i, s in enumerate(grilla.strides[:2]))
+    return lote_de_teselas(grilla, get_model().input_dtype), grilla.shape[:2], pasos
+
+
+def agregar_rebano(
+    probabilidades: np.ndarray, columnas: int, umbral: float, min_enfermas: int
+) -> Dict[str, Any]:
+    """
+    Combina las predicciones por tesela en un veredicto para el gallinero.
+
+    Se consideran solo las teselas con confianza >= ``umbral``. Si alguna clase
+    distinta de la primera ("Sanas") aparece en ``min_enfermas`` teselas o más,
+    el veredicto es la enfermedad más frecuente; si no, "Sanas". Sin teselas
+    concluyentes, se usa la clase de mayor probabilidad media.
+    """
+    indices = probabilidades.argmax(axis=1)
+    confianzas = probabilidades.max(axis=1)
+    confiables = confianzas >= umbral
+    conteo = np.bincount(indices[confiables], minlength=probabilidades.shape[1])
+
+    enfermas = conteo.copy()
+    enfermas[0] = 0
+    if enfermas.max() >= max(1, min_enfermas):
+        veredicto = int(enfermas.argmax())
+    elif conteo[0]:
+        veredicto = 0
+    else:
+        veredicto = int(probabilidades.mean(axis=0).argmax())
+
+    seleccion = confiables & (indices == veredicto)
+    if seleccion.any():
+        confianza = float(confianzas[seleccion].mean())
+    else:
+        confianza = float(probabilidades[:, veredicto].mean())
+
+    teselas_out: List[Dict[str, Any]] = [
+        {
+            "fila": i // columnas,
+            "columna": i % columnas,
+            "resultado": CLASS_NAMES[int(indices[i])],
+            "confianza": float(confianzas[i]),
+        }
+        for i in range(len(indices))
+    ]
+    return {
+        "veredicto": CLASS_NAMES[veredicto],
+        "confianza": confianza,
+        "teselas_concluyentes": int(confiables.sum()),
+        "distribucion": {CLASS_NAMES[i]: int(c) for i, c in enumerate(conteo) if c},
+        "teselas": teselas_out,
+    }
+
+
+async def escanear_rebano(image_bytes: bytes) -> Dict[str, Any]:
+    """
+    Clasifica una foto amplia del gallinero por teselas en una sola pasada del modelo.
+
+    Args:
+        image_bytes: Contenido del archivo subido
+
+    Returns:
+        Dict con la grilla por tesela y el veredicto agregado
+    """
+    lote, (filas, columnas), (paso_y, paso_x) = await get_image_executor().run(
+        preparar_rebano, image_bytes
+    )
+    probabilidades = await get_inference_executor().run(predecir_lote, lote)
+    resultado = agregar_rebano(
+        probabilidades, columnas, settings.TILING_MIN_CONFIDENCE, settings.TILING_MIN_DISEASED_TILES
+    )
+    for tesela in resultado["teselas"]:
+        tesela["x"] = tesela["columna"] * paso_x
+        tesela["y"] = tesela["fila"] * paso_y
+    return {"filas": filas, "columnas": columnas, "tamano_tesela": TAM_TESELA, **resultado}
@@ -0,0 +1,73 @@
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.services.executor import get_inference_executor
+from app.services.image import get_model
+
+# Estado de calentamiento consultado por /health/ready
+estado: Dict[str, Any] = {"listo": not settings.MODEL_WARMUP_ENABLED, "fases": {}, "error": None}
+
+
+def tamanos_de_lote() -> List[int]:
+    """
+    Tamaños de lote a precalentar: los configurados o, por defecto, las
+    potencias de dos hasta el tamaño máximo del micro-batching.
+    """
+    if settings.MODEL_WARMUP_BATCH_SIZES:
+        return sorted(set(settings.MODEL_WARMUP_BATCH_SIZES))
+    maximo = settings.INFERENCE_MAX_BATCH_SIZE if settings.INFERENCE_BATCHING_ENABLED else 1
+    maximo = max(1, maximo)
+    tamanos = {maximo}
+    n = 1
+    while n < maximo:
+        tamanos.add(n)
+        n *= 2
+    return sorted(tamanos)
+
+
+def calentar_modelo(batch_sizes: Optional[List[int]] = None) -> Dict[str, float]:
+    """
+    Carga el modelo y ejecuta pasadas de prueba. Es bloqueante.
+
+    Args:
+        batch_sizes: Tamaños de lote a ejecutar; por defecto ``tamanos_de_lote()``
+
+    Returns:
+        Dict con la duración en segundos de cada fase
+    """
+    fases: Dict[str, float] = {}
+
+    inicio = time.perf_counter()
+    backend = get_model()
+    fases["carga_modelo"] = time.perf_counter() - inicio
+    logging.info(f"Calentamiento: modelo cargado en {fases['carga_modelo']:.2f}s")
+
+    for batch_size in batch_sizes or tamanos_de_lote():
+        dummy = np.zeros((batch_size, 224, 224, 3), dtype=backend.input_dtype)
+        inicio = time.perf_counter()
+        for _ in range(max(1, settings.MODEL_WARMUP_ITERATIONS)):
+            backend.predict(dummy)
+        fase = f"lote_{batch_size}"
+        fases[fase] = time.perf_counter() - inicio
+        logging.info(f"Calentamiento: lote de {batch_size} en {fases[fase]:.2f}s")
+
+    return fases
+
+
+async def iniciar_calentamiento() -> None:
+    """Calienta el modelo en el pool de inferencia y marca el worker como listo."""
+    estado["listo"] = False
+    estado["error"] = None
+    inicio = time.perf_counter()
+    try:
+        estado["fases"] = await get_inference_executor().run(calentar_modelo)
+    except Exception as e:
+        estado["error"] = str(e)
+        logging.error(f"Error en el calentamiento del modelo: {str(e)}")
+        return
+    estado["listo"] = True
+    logging.info(f"Calentamiento completo en {time.perf_counter() - inicio:.2f}s")
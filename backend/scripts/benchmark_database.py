@@ -0,0 +1,154 @@
+"""
+Mide inserciones de escaneos concurrentes con lecturas del historial en SQLite.
+
+"antes" reproduce la configuración anterior (``create_engine`` con
+``check_same_thread`` y sin pragmas: journal DELETE, synchronous FULL); "despues"
+usa ``crear_motor`` de ``app.core.database`` con los pragmas y el pool de
+``settings``. Cada modo corre sobre una base nueva en ``--directorio`` (conviene
+el mismo disco que la base real: en tmpfs el fsync no cuesta). Los escritores
+insertan diagnósticos como ``guardar_diagnostico`` y los lectores piden la
+primera página del historial con su total, como ``GET /api/history``; cada uno
+en su hilo, igual que las conexiones de aiosqlite.
+
+Uso:
+    python scripts/benchmark_database.py --escritores 4 --lectores 8 --segundos 5
+"""
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import app.main  # noqa: E402,F401  (registra todos los modelos)
+from app.core.database import Base, crear_motor  # noqa: E402
+from app.models.diagnosis import Diagnosis  # noqa: E402
+from app.models.user import User  # noqa: E402
+
+
+def preparar(motor: Engine, filas: int) -> int:
+    """Crea las tablas, un usuario y ``filas`` diagnósticos previos; devuelve el id del usuario."""
+    Base.metadata.create_all(bind=motor)
+    with Session(motor) as db:
+        usuario = User(username="bench", email="bench@example.com", hashed_password="x")
+        db.add(usuario)
+        db.flush()
+        db.add_all(diagnostico(usuario.id, i) for i in range(filas))
+        db.commit()
+        return usuario.id
+
+
+def diagnostico(user_id: int, i: int) -> Diagnosis:
+    return Diagnosis(
+        resultado="Coriza - Nivel de confianza: 88.00%",
+        recomendacion="Aislar las aves afectadas y consultar al veterinario. " * 4,
+        archivo=f"foto_{i}.jpg",
+        sintomas=json.dumps(["Tos", "Estornudos"]),
+        diagnosis_metadata=json.dumps({"nivel_confianza": 0.88}),
+        user_id=user_id,
+    )
+
+
+def historial(db: Session, user_id: int) -> None:
+    consulta = (
+        select(Diagnosis).where(Diagnosis.user_id == user_id).order_by(Diagnosis.timestamp.desc())
+    )
+    db.scalar(select(func.count()).select_from(consulta.order_by(None).subquery()))
+    db.scalars(consulta.limit(10)).all()
+
+
+def medir(motor: Engine, user_id: int, escritores: int, lectores: int, segundos: float) -> Dict:
+    latencias: Dict[str, List[float]] = {"insercion": [], "lectura": []}
+    errores = {"insercion": 0, "lectura": 0}
+    fin = time.perf_counter() + segundos
+
+    def trabajar(tipo: str) -> None:
+        i = 0
+        while time.perf_counter() < fin:
+            inicio = time.perf_counter()
+            try:
+                with Session(motor) as db:
+                    if tipo == "insercion":
+                        db.add(diagnostico(user_id, i))
+                        db.commit()
+                    else:
+                        historial(db, user_id)
+            except OperationalError:
+                # "database is locked": la solicitud habría fallado con un 500
+                errores[tipo] += 1
+                continue
+            latencias[tipo].append(time.perf_counter() - inicio)
+            i += 1
+
+    hilos = [threading.Thread(target=trabajar, args=("insercion",)) for _ in range(escritores)]
+    hilos += [threading.Thread(target=trabajar, args=("lectura",)) for _ in range(lectores)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    resultado = {}
+    for tipo, valores in latencias.items():
+        ms = np.array(valores or [0.0]) * 1000
+        resultado[tipo] = {
+            "por_segundo": len(valores) / segundos,
+            "p50_ms": float(np.percentile(ms, 50)),
+            "p99_ms": float(np.percentile(ms, 99)),
+            "errores": errores[tipo],
+        }
+    return resultado
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--escritores", type=int, default=4)
+    parser.add_argument("--lectores", type=int, default=8)
+    parser.add_argument("--segundos", type=float, default=5.0)
+    parser.add_argument("--filas-iniciales", type=int, default=5000)
+    parser.add_argument("--directorio", default=".", help="Dónde crear las bases temporales")
+    args = parser.parse_args()
+
+    print(
+        f"🔧 {args.escritores} escritores y {args.lectores} lectores durante {args.segundos} s "
+        f"sobre {args.filas_iniciales} diagnósticos"
+    )
+    print(f"{'modo':>8} {'operación':>10} {'ops/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errores':>8}")
+    resultados = {}
+    for modo in ("antes", "despues"):
+        directorio = tempfile.mkdtemp(prefix="bench_db_", dir=args.directorio)
+        url = f"sqlite:///{Path(directorio) / 'bench.db'}"
+        if modo == "antes":
+            motor = create_engine(url, connect_args={"check_same_thread": False})
+        else:
+            motor = crear_motor(url)
+        try:
+            user_id = preparar(motor, args.filas_iniciales)
+            resultados[modo] = medir(motor, user_id, args.escritores, args.lectores, args.segundos)
+        finally:
+            motor.dispose()
+            shutil.rmtree(directorio, ignore_errors=True)
+        for tipo, r in resultados[modo].items():
+            print(
+                f"{modo:>8} {tipo:>10} {r['por_segundo']:>8.1f} {r['p50_ms']:>8.2f} "
+                f"{r['p99_ms']:>8.2f} {r['errores']:>8}"
+            )
+
+    for tipo in ("insercion", "lectura"):
+        antes, despues = resultados["antes"][tipo], resultados["despues"][tipo]
+        if antes["por_segundo"]:
+            print(f"✅ {tipo}: x{despues['por_segundo'] / antes['por_segundo']:.1f} ops/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Barre perfiles de hilos/afinidad de CPU y tamaños de lote para la inferencia.
+
+Cada combinación corre en un subproceso nuevo (TensorFlow solo acepta la
+configuración de hilos antes de inicializarse) y mide ``get_prediction_confidence``
+con tantas solicitudes concurrentes como el tamaño de lote, de modo que el
+micro-batching forme lotes llenos. Reporta throughput y latencias p50/p99.
+
+Uso:
+    python scripts/benchmark_inference.py --intra 1 2 4 --inter 1 2 --lotes 1 4 8 \\
+        --afinidad 0-3
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+PREFIJO = "RESULTADO "
+
+
+def parsear_cpus(texto: str) -> List[int]:
+    """Convierte ``"0-3,6"`` en ``[0, 1, 2, 3, 6]``."""
+    cpus: List[int] = []
+    for parte in filter(None, texto.split(",")):
+        inicio, _, fin = parte.partition("-")
+        cpus.extend(range(int(inicio), int(fin or inicio) + 1))
+    return cpus
+
+
+async def medir(solicitudes: int, concurrencia: int) -> Dict[str, float]:
+    from app.services.image import detener_batcher, get_model, get_prediction_confidence
+
+    backend = get_model()
+    tensor = np.random.default_rng(0).random((1, 224, 224, 3)).astype(np.float32)
+    if backend.input_dtype == np.uint8:
+        tensor = (tensor * 255).astype(np.uint8)
+
+    # Calentamiento: trazar el grafo para el tamaño de lote que se va a medir
+    await asyncio.gather(*(get_prediction_confidence(tensor) for _ in range(concurrencia * 2)))
+
+    latencias: List[float] = []
+    semaforo = asyncio.Semaphore(concurrencia)
+
+    async def una():
+        async with semaforo:
+            inicio = time.perf_counter()
+            await get_prediction_confidence(tensor)
+            latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(una() for _ in range(solicitudes)))
+    total = time.perf_counter() - inicio
+    await detener_batcher()
+
+    return {
+        "throughput": solicitudes / total,
+        "p50_ms": float(np.percentile(latencias, 50) * 1000),
+        "p99_ms": float(np.percentile(latencias, 99) * 1000),
+    }
+
+
+def ejecutar_perfil(
+    intra: int, inter: int, lote: int, afinidad: str, solicitudes: int
+) -> Optional[Dict[str, float]]:
+    env = {
+        **os.environ,
+        "INFERENCE_INTRA_OP_THREADS": str(intra),
+        "INFERENCE_INTER_OP_THREADS": str(inter),
+        "INFERENCE_CPU_AFFINITY": json.dumps(parsear_cpus(afinidad)),
+        "INFERENCE_BATCHING_ENABLED": "true",
+        "INFERENCE_MAX_BATCH_SIZE": str(lote),
+        "MODEL_WARMUP_ENABLED": "false",
+        "PREDICTION_CACHE_ENABLED": "false",
+    }
+    comando = [sys.executable, __file__, "--hijo", "--lote", str(lote)]
+    comando += ["--solicitudes", str(solicitudes)]
+    proceso = subprocess.run(comando, env=env, capture_output=True, text=True)
+    for linea in proceso.stdout.splitlines():
+        if linea.startswith(PREFIJO):
+            return json.loads(linea[len(PREFIJO) :])
+    print(f"❌ intra={intra} inter={inter} lote={lote}: {proceso.stderr.strip()[-300:]}")
+    return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--intra", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--inter", type=int, nargs="+", default=[0, 1])
+    parser.add_argument("--lotes", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--afinidad", default="", help="CPUs a fijar, p. ej. 0-3 (vacío = todas)")
+    parser.add_argument("--solicitudes", type=int, default=200)
+    parser.add_argument("--hijo", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--lote", type=int, default=1, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.hijo:
+        resultado = asyncio.run(medir(args.solicitudes, args.lote))
+        print(PREFIJO + json.dumps(resultado), flush=True)
+        return
+
+    print(f"CPUs disponibles: {os.cpu_count()}  afinidad: {args.afinidad or 'todas'}")
+    print(f"{'intra':>5} {'inter':>5} {'lote':>4} {'img/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    mejores: Dict[int, tuple] = {}
+    for lote in args.lotes:
+        for intra in args.intra:
+            for inter in args.inter:
+                r = ejecutar_perfil(intra, inter, lote, args.afinidad, args.solicitudes)
+                if r is None:
+                    continue
+                print(
+                    f"{intra:>5} {inter:>5} {lote:>4} {r['throughput']:>8.1f} "
+                    f"{r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f}"
+                )
+                if lote not in mejores or r["throughput"] > mejores[lote][2]["throughput"]:
+                    mejores[lote] = (intra, inter, r)
+
+    print("\nMejor perfil por tamaño de lote (0 = valor por defecto del runtime):")
+    for lote, (intra, inter, r) in sorted(mejores.items()):
+        print(
+            f"✅ lote {lote}: INFERENCE_INTRA_OP_THREADS={intra} "
+            f"INFERENCE_INTER_OP_THREADS={inter} "
+            f"({r['throughput']:.1f} img/s, p99 {r['p99_ms']:.1f} ms)"
+        )
+
+
+if __name__ == "__main__":
+    main()
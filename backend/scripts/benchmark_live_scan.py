@@ -0,0 +1,103 @@
+"""
+Mide el throughput del escaneo en vivo (frames por segundo y por núcleo).
+
+Alimenta una sesión de escaneo en vivo con frames JPEG sintéticos (una escena
+con un objeto que se mueve y tramos quietos) al ritmo indicado y reporta
+cuántos frames se descartaron por atraso, cuántos se omitieron por no cambiar y
+cuántos pasaron por el modelo. "fps por núcleo" divide los frames inferidos por
+los segundos de CPU consumidos por el proceso.
+
+Uso:
+    python scripts/benchmark_live_scan.py --segundos 10 --fps-entrada 30
+"""
+import argparse
+import asyncio
+import io
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.image import detener_batcher, get_model  # noqa: E402
+from app.services.live_scan import nueva_sesion  # noqa: E402
+
+
+def frames_sinteticos(cantidad: int, ancho: int, alto: int, quietos: float) -> List[bytes]:
+    """Fondo fijo con un cuadrado que avanza; una fracción de los frames repite el anterior."""
+    rng = np.random.default_rng(0)
+    fondo = rng.integers(60, 200, (alto, ancho, 3), dtype=np.uint8)
+    frames, x = [], 0
+    for _ in range(cantidad):
+        if not frames or rng.random() >= quietos:
+            x = (x + ancho // 12) % (ancho - ancho // 4)
+        escena = fondo.copy()
+        escena[alto // 3 : alto // 3 + ancho // 4, x : x + ancho // 4] = (230, 40, 40)
+        buffer = io.BytesIO()
+        Image.fromarray(escena).save(buffer, "JPEG", quality=80)
+        frames.append(buffer.getvalue())
+    return frames
+
+
+async def ejecutar(frames: List[bytes], segundos: float, fps_entrada: float) -> dict:
+    sesion = nueva_sesion()
+    enviados = []
+
+    async def enviar(mensaje):
+        enviados.append(mensaje)
+
+    procesador = asyncio.create_task(sesion.ejecutar(enviar))
+    intervalo = 1 / fps_entrada if fps_entrada > 0 else 0
+    cpu_inicio, inicio = time.process_time(), time.perf_counter()
+    i = 0
+    while time.perf_counter() - inicio < segundos:
+        sesion.recibir(frames[i % len(frames)])
+        i += 1
+        await asyncio.sleep(intervalo)
+    sesion.cerrar()
+    await procesador
+    cpu = time.process_time() - cpu_inicio
+    duracion = time.perf_counter() - inicio
+    await detener_batcher()
+    return {
+        **sesion.estadisticas(),
+        "cpu_s": cpu,
+        "duracion_s": duracion,
+        "mensajes": len(enviados),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--segundos", type=float, default=10.0)
+    parser.add_argument(
+        "--fps-entrada", type=float, default=30.0, help="0 = tan rápido como se pueda"
+    )
+    parser.add_argument("--ancho", type=int, default=1280)
+    parser.add_argument("--alto", type=int, default=720)
+    parser.add_argument("--quietos", type=float, default=0.3, help="Fracción de frames sin cambios")
+    args = parser.parse_args()
+
+    get_model()
+    frames = frames_sinteticos(120, args.ancho, args.alto, args.quietos)
+    r = asyncio.run(ejecutar(frames, args.segundos, args.fps_entrada))
+
+    nucleos = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    print(
+        f"Duración: {r['duracion_s']:.1f} s  CPU: {r['cpu_s']:.1f} s  "
+        f"núcleos disponibles: {nucleos}"
+    )
+    print(f"Frames recibidos: {r['recibidos']} ({r['fps_recibidos']} fps)")
+    print(f"Descartados por atraso: {r['descartados']}  sin cambio: {r['sin_cambio']}")
+    print(f"Inferidos: {r['inferidos']} ({r['inferidos'] / r['duracion_s']:.1f} fps)")
+    if r["cpu_s"] > 0:
+        print(f"✅ {r['inferidos'] / r['cpu_s']:.1f} fps inferidos por núcleo (segundo de CPU)")
+
+
+if __name__ == "__main__":
+    main()
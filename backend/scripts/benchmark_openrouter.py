@@ -0,0 +1,131 @@
+"""
+Compara la latencia de OpenRouter con un cliente HTTP por llamada y con el compartido.
+
+"por_llamada" reproduce el comportamiento anterior (un ``httpx.AsyncClient`` nuevo
+en cada recomendación: conexión TCP y handshake TLS cada vez); "compartido" usa el
+cliente con pool de ``app.services.openrouter``. Sin ``--url`` levanta
+scripts/fake_openrouter.py en un subproceso, así la medición no depende de la red.
+
+Uso:
+    python scripts/benchmark_openrouter.py --solicitudes 200 --concurrencia 10 --tls
+    python scripts/benchmark_openrouter.py --url https://openrouter.ai/api/v1 --solicitudes 20
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.config import settings  # noqa: E402
+from app.services.openrouter import crear_cliente  # noqa: E402
+
+MENSAJES = [{"role": "user", "content": "Diagnóstico: Coriza - Nivel de confianza: 88.00%"}]
+
+
+def puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def levantar_servidor(latencia_ms: float, tls: bool) -> Tuple[subprocess.Popen, str]:
+    puerto = puerto_libre()
+    comando = [sys.executable, str(Path(__file__).with_name("fake_openrouter.py"))]
+    comando += ["--puerto", str(puerto), "--latencia-ms", str(latencia_ms)]
+    if tls:
+        comando.append("--tls")
+    proceso = subprocess.Popen(comando, stdout=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", puerto), timeout=0.1).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+    esquema = "https" if tls else "http"
+    return proceso, f"{esquema}://127.0.0.1:{puerto}/api/v1"
+
+
+async def llamar(cliente: httpx.AsyncClient, url: str, api_key: str) -> None:
+    response = await cliente.post(
+        f"{url}/chat/completions",
+        headers={"Authorization": f"Bearer {api_key}"},
+        json={"model": settings.OPENROUTER_MODEL, "messages": MENSAJES},
+    )
+    response.raise_for_status()
+
+
+async def medir(
+    modo: str, url: str, api_key: str, solicitudes: int, concurrencia: int, verify: bool
+) -> Dict[str, float]:
+    compartido: Optional[httpx.AsyncClient] = None
+    if modo == "compartido":
+        compartido = crear_cliente(verify=verify)
+    latencias: List[float] = []
+    semaforo = asyncio.Semaphore(concurrencia)
+
+    async def una():
+        async with semaforo:
+            inicio = time.perf_counter()
+            if compartido is not None:
+                await llamar(compartido, url, api_key)
+            else:
+                async with httpx.AsyncClient(timeout=15.0, verify=verify) as cliente:
+                    await llamar(cliente, url, api_key)
+            latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(una() for _ in range(solicitudes)))
+    total = time.perf_counter() - inicio
+    if compartido is not None:
+        await compartido.aclose()
+    return {
+        "throughput": solicitudes / total,
+        "p50_ms": float(np.percentile(latencias, 50) * 1000),
+        "p99_ms": float(np.percentile(latencias, 99) * 1000),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--url", default="", help="Base de la API (vacío = servidor falso local)")
+    parser.add_argument("--solicitudes", type=int, default=200)
+    parser.add_argument("--concurrencia", type=int, default=10)
+    parser.add_argument("--latencia-ms", type=float, default=50.0, help="Del servidor falso")
+    parser.add_argument("--tls", action="store_true", help="Servidor falso por HTTPS")
+    args = parser.parse_args()
+
+    proceso = None
+    url, verify = args.url, True
+    api_key = os.getenv("OPENROUTER_API_KEY") or settings.OPENROUTER_API_KEY
+    if not url:
+        proceso, url = levantar_servidor(args.latencia_ms, args.tls)
+        verify, api_key = False, "local"
+
+    try:
+        print(f"Destino: {url}  solicitudes: {args.solicitudes}  concurrencia: {args.concurrencia}")
+        print(f"{'modo':>12} {'sol/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        resultados = {}
+        for modo in ("por_llamada", "compartido"):
+            r = asyncio.run(medir(modo, url, api_key, args.solicitudes, args.concurrencia, verify))
+            resultados[modo] = r
+            print(f"{modo:>12} {r['throughput']:>8.1f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f}")
+    finally:
+        if proceso is not None:
+            proceso.terminate()
+            proceso.wait()
+
+    ahorro = resultados["por_llamada"]["p50_ms"] - resultados["compartido"]["p50_ms"]
+    print(f"✅ El cliente compartido ahorra {ahorro:.1f} ms por llamada (p50)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Compara el preprocesamiento original (decodificación completa + LANCZOS) con
+la decodificación rápida (draft JPEG + filtro configurable).
+
+Reporta tiempo por imagen, tamaño del buffer decodificado y, salvo con
+--sin-modelo, el impacto en la predicción (acuerdo de clase y delta de confianza).
+Sin --imagenes se generan fotos sintéticas de 12 MP.
+
+Uso:
+    python scripts/benchmark_preprocessing.py --imagenes ruta/a/fotos --filtro bilinear
+"""
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.image import FILTROS_REMUESTREO, decodificar_imagen, imagen_a_tensor  # noqa: E402
+from convert_model import listar_imagenes  # noqa: E402
+
+
+def fotos_sinteticas(cantidad: int) -> List[Tuple[str, bytes]]:
+    rng = np.random.default_rng(0)
+    fotos = []
+    for i in range(cantidad):
+        # Gradiente con ruido para que el JPEG no sea trivialmente compresible
+        base = np.linspace(0, 255, 4000, dtype=np.float32)[None, :, None]
+        pixeles = base + rng.normal(0, 20, (3000, 1, 3))
+        buffer = io.BytesIO()
+        Image.fromarray(np.clip(pixeles, 0, 255).astype(np.uint8)).save(buffer, "JPEG", quality=90)
+        fotos.append((f"sintetica_{i}.jpg", buffer.getvalue()))
+    return fotos
+
+
+def tamano_decodificado(image_bytes: bytes, rapido: bool) -> int:
+    """Bytes del buffer RGB que produce el decodificador (domina el pico de memoria)."""
+    image = Image.open(io.BytesIO(image_bytes))
+    if rapido and image.format == "JPEG":
+        image.draft("RGB", (224, 224))
+    return image.size[0] * image.size[1] * 3
+
+
+def medir(fotos: List[Tuple[str, bytes]], rapido: bool, filtro: str) -> Tuple[List[float], list]:
+    tiempos, tensores = [], []
+    for _, contenido in fotos:
+        inicio = time.perf_counter()
+        tensor = imagen_a_tensor(decodificar_imagen(contenido, rapido=rapido, filtro=filtro))
+        tiempos.append(time.perf_counter() - inicio)
+        tensores.append(tensor)
+    return tiempos, tensores
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--imagenes", help="Carpeta de fotos (por defecto, sintéticas)")
+    parser.add_argument("--cantidad", type=int, default=5, help="Fotos sintéticas a generar")
+    parser.add_argument("--filtro", default="lanczos", choices=sorted(FILTROS_REMUESTREO))
+    parser.add_argument("--sin-modelo", action="store_true", help="No medir impacto en predicción")
+    args = parser.parse_args()
+
+    if args.imagenes:
+        fotos = [(p.name, p.read_bytes()) for p in listar_imagenes(Path(args.imagenes))]
+    else:
+        fotos = fotos_sinteticas(args.cantidad)
+    if not fotos:
+        raise SystemExit("No hay imágenes para medir")
+
+    t_original, x_original = medir(fotos, rapido=False, filtro="lanczos")
+    t_rapido, x_rapido = medir(fotos, rapido=True, filtro=args.filtro)
+    mem_original = np.mean([tamano_decodificado(c, False) for _, c in fotos]) / 2**20
+    mem_rapido = np.mean([tamano_decodificado(c, True) for _, c in fotos]) / 2**20
+    mae = np.mean([np.abs(a - b).mean() for a, b in zip(x_original, x_rapido)])
+
+    print(f"Imágenes: {len(fotos)}")
+    print(
+        f"Tiempo medio: original {np.mean(t_original) * 1000:.1f} ms, "
+        f"rápido ({args.filtro}) {np.mean(t_rapido) * 1000:.1f} ms "
+        f"(x{np.mean(t_original) / np.mean(t_rapido):.1f})"
+    )
+    print(f"Buffer decodificado medio: original {mem_original:.1f} MB, rápido {mem_rapido:.1f} MB")
+    print(f"Diferencia media por píxel del tensor: {mae:.4f}")
+
+    if args.sin_modelo:
+        return
+
+    from app.services.image import predecir_lote
+
+    p_original = predecir_lote(np.concatenate(x_original))
+    p_rapido = predecir_lote(np.concatenate(x_rapido))
+    clases_original = p_original.argmax(axis=1)
+    acuerdo = np.mean(clases_original == p_rapido.argmax(axis=1))
+    filas = np.arange(len(fotos))
+    delta = np.abs(p_original[filas, clases_original] - p_rapido[filas, clases_original])
+    print(f"Acuerdo de clase: {acuerdo:.2%}")
+    print(f"Delta de confianza: media {delta.mean():.4f}, máx {delta.max():.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Genera offline la tabla precalculada de recomendaciones de OpenRouter.
+
+Recorre todas las combinaciones clase × banda de confianza × subconjunto de
+síntomas comunes (hasta ``--max-sintomas`` síntomas a la vez, tomados del
+selector del frontend), pide cada recomendación con el mismo prompt que usa
+el backend y escribe el archivo que el servidor mapea en memoria al arrancar
+(``RECOMMENDATION_TABLE_PATH``). Con ``--url`` se puede generar contra
+scripts/fake_openrouter.py u otro servicio compatible.
+
+Uso:
+    python scripts/build_recommendation_table.py --max-sintomas 2 --concurrencia 8
+    python scripts/fake_openrouter.py --latencia-ms 0 &
+    python scripts/build_recommendation_table.py --url http://127.0.0.1:8090/api/v1
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from itertools import combinations
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.config import CLASS_NAMES, settings  # noqa: E402
+from app.services import openrouter  # noqa: E402
+from app.services.diagnosis import recomendacion_openrouter  # noqa: E402
+from app.services.recommendation_cache import ConsultaRecomendacion  # noqa: E402
+from app.services.recommendation_table import escribir_tabla  # noqa: E402
+
+SELECTOR_SINTOMAS = (
+    Path(__file__).resolve().parents[2]
+    / "frontend"
+    / "farmeye-client"
+    / "src"
+    / "components"
+    / "dashboard"
+    / "SymptomSelector.jsx"
+)
+
+
+def sintomas_del_frontend(ruta: Path = SELECTOR_SINTOMAS) -> List[str]:
+    """Lee la lista ``SYMPTOMS`` del selector de síntomas del frontend."""
+    contenido = ruta.read_text(encoding="utf-8")
+    bloque = re.search(r"const SYMPTOMS\s*=\s*\[(.*?)\]", contenido, re.S)
+    if bloque is None:
+        raise ValueError(f"No se encontró SYMPTOMS en {ruta}")
+    return re.findall(r"['\"]([^'\"]+)['\"]", bloque.group(1))
+
+
+def combinaciones(
+    clases: List[str], sintomas: List[str], max_sintomas: int, granularidad: float
+) -> List[ConsultaRecomendacion]:
+    """Consultas normalizadas para cada clase, banda y subconjunto de síntomas."""
+    bandas = int(round(1.0 / granularidad))
+    subconjuntos = [
+        grupo for n in range(max_sintomas + 1) for grupo in combinations(sorted(sintomas), n)
+    ]
+    consultas: Dict[str, ConsultaRecomendacion] = {}
+    for clase in clases:
+        for paso in range(bandas + 1):
+            for grupo in subconjuntos:
+                consulta = ConsultaRecomendacion(
+                    clase, paso * granularidad, grupo, granularidad, settings.OPENROUTER_MODEL
+                )
+                consultas.setdefault(consulta.clave, consulta)
+    return list(consultas.values())
+
+
+async def generar(consultas: List[ConsultaRecomendacion], concurrencia: int) -> Dict[str, str]:
+    semaforo = asyncio.Semaphore(concurrencia)
+    entradas: Dict[str, str] = {}
+    hechas = 0
+
+    async def pedir(consulta: ConsultaRecomendacion) -> None:
+        nonlocal hechas
+        async with semaforo:
+            try:
+                texto = await recomendacion_openrouter(
+                    consulta.diagnostico, list(consulta.sintomas)
+                )
+            except Exception as e:
+                # La consulta queda fuera de la tabla: en producción la resuelve OpenRouter
+                print(f"⚠️ {consulta.clave}: {e}")
+                texto = None
+        if texto:
+            entradas[consulta.clave] = texto
+        hechas += 1
+        if hechas % 100 == 0 or hechas == len(consultas):
+            print(f"  {hechas}/{len(consultas)} ({len(entradas)} con respuesta)")
+
+    try:
+        await asyncio.gather(*(pedir(c) for c in consultas))
+    finally:
+        await openrouter.cerrar_cliente()
+    return entradas
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--salida", default=settings.RECOMMENDATION_TABLE_PATH)
+    parser.add_argument("--clases", nargs="+", default=CLASS_NAMES)
+    parser.add_argument(
+        "--sintomas", nargs="+", help="Vocabulario de síntomas (por defecto, el del frontend)"
+    )
+    parser.add_argument("--max-sintomas", type=int, default=2)
+    parser.add_argument("--concurrencia", type=int, default=8)
+    parser.add_argument(
+        "--url", help="URL base compatible con OpenRouter (p. ej. el servidor falso)"
+    )
+    args = parser.parse_args()
+
+    if args.url:
+        settings.OPENROUTER_BASE_URL = args.url
+        os.environ.setdefault("OPENROUTER_API_KEY", "local")
+    if not os.getenv("OPENROUTER_API_KEY"):
+        sys.exit("❌ Falta OPENROUTER_API_KEY (o --url para un servicio local)")
+
+    sintomas = args.sintomas or sintomas_del_frontend()
+    granularidad = settings.RECOMMENDATION_CACHE_CONFIDENCE_STEP
+    consultas = combinaciones(args.clases, sintomas, args.max_sintomas, granularidad)
+    print(
+        f"🔧 {len(consultas)} combinaciones: {len(args.clases)} clases, "
+        f"{len(sintomas)} síntomas (hasta {args.max_sintomas} a la vez), bandas de {granularidad}"
+    )
+
+    inicio = time.perf_counter()
+    entradas = asyncio.run(generar(consultas, max(1, args.concurrencia)))
+    faltantes = len(consultas) - len(entradas)
+
+    metadatos = {
+        "granularidad": granularidad,
+        "modelo": settings.OPENROUTER_MODEL,
+        "clases": args.clases,
+        "sintomas": sintomas,
+        "max_sintomas": args.max_sintomas,
+        "generado_en": datetime.utcnow().isoformat(timespec="seconds"),
+    }
+    tamano = escribir_tabla(args.salida, entradas, metadatos)
+    print(
+        f"✅ {args.salida}: {len(entradas)} entradas, {tamano / 1024:.1f} KiB, "
+        f"{time.perf_counter() - inicio:.1f} s"
+    )
+    if faltantes:
+        print(f"⚠️ {faltantes} combinaciones sin respuesta; se resolverán en línea al escanear")
+    print(json.dumps(metadatos, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Compara un backend de inferencia contra el modelo Keras de referencia.
+
+Para cada imagen de la carpeta se compara la clase predicha y la confianza.
+Sale con código 1 si la coincidencia de clase queda bajo --min-acuerdo o la
+diferencia máxima de confianza supera --max-delta.
+
+Uso:
+    python scripts/check_parity.py --backend tflite \\
+        --modelo app/models/keras_model_int8.tflite --imagenes temp_images/
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.config import CLASS_NAMES  # noqa: E402
+from app.services.backends import crear_backend  # noqa: E402
+from app.services.image import preprocesar_bytes  # noqa: E402
+from convert_model import listar_imagenes  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--backend", required=True, choices=["keras", "tflite", "onnx"])
+    parser.add_argument("--modelo", help="Ruta del modelo candidato (por defecto la configurada)")
+    parser.add_argument("--imagenes", required=True, help="Carpeta de imágenes de prueba")
+    parser.add_argument("--min-acuerdo", type=float, default=0.98)
+    parser.add_argument("--max-delta", type=float, default=0.05)
+    args = parser.parse_args()
+
+    imagenes = listar_imagenes(Path(args.imagenes))
+    if not imagenes:
+        raise SystemExit(f"No hay imágenes en {args.imagenes}")
+
+    referencia = crear_backend("keras")
+    candidato = crear_backend(args.backend, args.modelo)
+
+    acuerdos = 0
+    deltas = []
+    tiempos_ref, tiempos_cand = [], []
+    for path in imagenes:
+        contenido = path.read_bytes()
+        x_ref = preprocesar_bytes(contenido, referencia.input_dtype)
+        x_cand = preprocesar_bytes(contenido, candidato.input_dtype)
+
+        inicio = time.perf_counter()
+        p_ref = referencia.predict(x_ref)[0]
+        tiempos_ref.append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        p_cand = candidato.predict(x_cand)[0]
+        tiempos_cand.append(time.perf_counter() - inicio)
+
+        i_ref, i_cand = int(np.argmax(p_ref)), int(np.argmax(p_cand))
+        acuerdos += int(i_ref == i_cand)
+        deltas.append(abs(float(p_ref[i_ref]) - float(p_cand[i_ref])))
+        if i_ref != i_cand:
+            print(
+                f"❌ {path.name}: keras={CLASS_NAMES[i_ref]} ({p_ref[i_ref]:.3f}) "
+                f"{args.backend}={CLASS_NAMES[i_cand]} ({p_cand[i_cand]:.3f})"
+            )
+
+    acuerdo = acuerdos / len(imagenes)
+    print(f"\nImágenes evaluadas: {len(imagenes)}")
+    print(f"Acuerdo de clase: {acuerdo:.2%}")
+    print(f"Delta de confianza: media {np.mean(deltas):.4f}, máx {np.max(deltas):.4f}")
+    print(
+        f"Latencia media por imagen: keras {np.mean(tiempos_ref) * 1000:.1f} ms, "
+        f"{args.backend} {np.mean(tiempos_cand) * 1000:.1f} ms"
+    )
+
+    if acuerdo < args.min_acuerdo or np.max(deltas) > args.max_delta:
+        print("⚠️ El backend no alcanza la paridad requerida")
+        sys.exit(1)
+    print("✅ Paridad dentro de los umbrales")
+
+
+if __name__ == "__main__":
+    main()
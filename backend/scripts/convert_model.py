@@ -0,0 +1,108 @@
+"""
+Convierte el modelo Keras (.h5) a formatos más livianos para inferencia en CPU.
+
+Genera, según se pida:
+- TFLite float16 (pesos en media precisión)
+- TFLite int8 (cuantización completa con un conjunto de calibración)
+- ONNX (para ONNX Runtime; requiere tf2onnx)
+
+También acepta el modelo uint8 de ``export_uint8_model.py`` como origen.
+
+Uso:
+    python scripts/convert_model.py --formatos tflite-fp16 tflite-int8 onnx \\
+        --calibracion temp_images/
+"""
+import argparse
+import logging
+import sys
+from pathlib import Path
+from typing import Iterator, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.config import settings  # noqa: E402
+from app.services.image import preprocesar_bytes  # noqa: E402
+
+EXTENSIONES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+FORMATOS = ["tflite-fp16", "tflite-int8", "onnx"]
+
+
+def listar_imagenes(carpeta: Path) -> List[Path]:
+    return sorted(p for p in carpeta.rglob("*") if p.suffix.lower() in EXTENSIONES)
+
+
+def dataset_representativo(
+    imagenes: List[Path], limite: int, dtype: np.dtype
+) -> Iterator[List[np.ndarray]]:
+    """Entrega imágenes preprocesadas igual que en producción para calibrar int8."""
+    for path in imagenes[:limite]:
+        yield [preprocesar_bytes(path.read_bytes(), dtype)]
+
+
+def convertir_tflite(model, destino: Path, int8: bool, imagenes: List[Path], limite: int) -> None:
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if int8:
+        if not imagenes:
+            raise SystemExit(
+                "La cuantización int8 necesita imágenes de calibración (--calibracion)"
+            )
+        dtype = np.dtype(model.inputs[0].dtype.name)
+        converter.representative_dataset = lambda: dataset_representativo(imagenes, limite, dtype)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    else:
+        converter.target_spec.supported_types = [tf.float16]
+
+    destino.write_bytes(converter.convert())
+    print(f"✅ {destino} ({destino.stat().st_size / 1024:.0f} KB)")
+
+
+def convertir_onnx(model, destino: Path, opset: int) -> None:
+    try:
+        import tensorflow as tf
+        import tf2onnx
+    except ImportError:
+        raise SystemExit("La conversión a ONNX requiere 'tf2onnx' instalado")
+
+    forma = (None,) + tuple(model.input_shape[1:])
+    firma = (tf.TensorSpec(forma, model.inputs[0].dtype, name="input"),)
+    tf2onnx.convert.from_keras(model, input_signature=firma, opset=opset, output_path=str(destino))
+    print(f"✅ {destino} ({destino.stat().st_size / 1024:.0f} KB)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--modelo", default=settings.MODEL_PATH, help="Modelo Keras de origen")
+    parser.add_argument(
+        "--salida", default=str(Path(settings.MODEL_PATH).parent), help="Directorio destino"
+    )
+    parser.add_argument("--formatos", nargs="+", choices=FORMATOS, default=FORMATOS)
+    parser.add_argument("--calibracion", help="Carpeta de imágenes para calibrar int8")
+    parser.add_argument("--max-calibracion", type=int, default=200)
+    parser.add_argument("--opset", type=int, default=13)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from keras.models import load_model
+
+    model = load_model(args.modelo, compile=False)
+    salida = Path(args.salida)
+    salida.mkdir(parents=True, exist_ok=True)
+    base = Path(args.modelo).stem
+    imagenes = listar_imagenes(Path(args.calibracion)) if args.calibracion else []
+
+    if "tflite-fp16" in args.formatos:
+        convertir_tflite(model, salida / f"{base}_fp16.tflite", False, imagenes, 0)
+    if "tflite-int8" in args.formatos:
+        destino = salida / f"{base}_int8.tflite"
+        convertir_tflite(model, destino, True, imagenes, args.max_calibracion)
+    if "onnx" in args.formatos:
+        convertir_onnx(model, salida / f"{base}.onnx", args.opset)
+
+
+if __name__ == "__main__":
+    main()
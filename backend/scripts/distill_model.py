@@ -0,0 +1,116 @@
+"""
+Destila el modelo completo en un modelo pequeño para la primera etapa de la cascada.
+
+El alumno (MobileNetV2 con alpha reducido sobre una entrada de menor resolución)
+aprende las probabilidades suavizadas del modelo completo sobre una carpeta de
+fotos sin etiquetar, con volteos y recortes aleatorios como aumento de datos.
+La entrada sigue siendo 224x224 con el mismo preprocesamiento, así que el
+resultado se usa directamente con ``CASCADE_MODEL_PATH``.
+
+Uso:
+    python scripts/distill_model.py --imagenes ruta/a/fotos/ --epocas 20
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.config import settings  # noqa: E402
+from app.services.image import preprocesar_bytes  # noqa: E402
+from convert_model import listar_imagenes  # noqa: E402
+
+
+def crear_alumno(num_clases: int, resolucion: int, alpha: float, imagenet: bool):
+    import tensorflow as tf
+
+    entrada = tf.keras.Input((224, 224, 3), dtype="float32")
+    x = tf.keras.layers.Resizing(resolucion, resolucion)(entrada)
+    # MobileNetV2 espera [-1, 1]; el servidor entrega [0, 1]
+    x = tf.keras.layers.Rescaling(2.0, offset=-1.0)(x)
+    base = tf.keras.applications.MobileNetV2(
+        input_shape=(resolucion, resolucion, 3),
+        alpha=alpha,
+        include_top=False,
+        weights="imagenet" if imagenet else None,
+        pooling="avg",
+    )
+    x = base(x)
+    x = tf.keras.layers.Dropout(0.2)(x)
+    logits = tf.keras.layers.Dense(num_clases, name="logits")(x)
+    return tf.keras.Model(entrada, logits, name="alumno")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--imagenes", required=True, help="Carpeta de fotos (sin etiquetar)")
+    parser.add_argument("--maestro", default=settings.MODEL_PATH)
+    parser.add_argument("--salida", default=settings.CASCADE_MODEL_PATH)
+    parser.add_argument("--resolucion", type=int, default=128)
+    parser.add_argument("--alpha", type=float, default=0.35)
+    parser.add_argument("--temperatura", type=float, default=2.0)
+    parser.add_argument("--epocas", type=int, default=20)
+    parser.add_argument("--lote", type=int, default=32)
+    parser.add_argument("--imagenet", action="store_true", help="Partir de pesos de ImageNet")
+    args = parser.parse_args()
+
+    import tensorflow as tf
+    from keras.models import load_model
+
+    imagenes = listar_imagenes(Path(args.imagenes))
+    if not imagenes:
+        raise SystemExit(f"No hay imágenes en {args.imagenes}")
+
+    maestro = load_model(args.maestro, compile=False)
+    dtype = np.dtype(maestro.inputs[0].dtype.name)
+    if dtype != np.float32:
+        raise SystemExit("Destilar desde el modelo float32 original (no el exportado uint8)")
+
+    x = np.concatenate([preprocesar_bytes(p.read_bytes(), np.float32) for p in imagenes])
+    print(f"Imágenes: {len(x)}")
+
+    temperatura = args.temperatura
+    alumno = crear_alumno(maestro.output_shape[-1], args.resolucion, args.alpha, args.imagenet)
+
+    def aumentar(lote):
+        lote = tf.image.random_flip_left_right(lote)
+        recorte = tf.image.random_crop(lote, (tf.shape(lote)[0], 200, 200, 3))
+        return tf.image.resize(recorte, (224, 224))
+
+    optimizador = tf.keras.optimizers.Adam(1e-3)
+
+    @tf.function
+    def paso(lote):
+        lote = aumentar(lote)
+        # Las salidas del maestro ya son probabilidades: suavizar en espacio logarítmico
+        objetivo = tf.nn.softmax(tf.math.log(maestro(lote, training=False) + 1e-7) / temperatura)
+        with tf.GradientTape() as cinta:
+            logits = alumno(lote, training=True) / temperatura
+            perdida = tf.reduce_mean(
+                tf.keras.losses.kl_divergence(objetivo, tf.nn.softmax(logits))
+            ) * (temperatura**2)
+        gradientes = cinta.gradient(perdida, alumno.trainable_variables)
+        optimizador.apply_gradients(zip(gradientes, alumno.trainable_variables))
+        return perdida
+
+    datos = tf.data.Dataset.from_tensor_slices(x).shuffle(len(x)).batch(args.lote)
+    for epoca in range(args.epocas):
+        perdidas = [float(paso(lote)) for lote in datos]
+        print(f"Época {epoca + 1}/{args.epocas}: pérdida {np.mean(perdidas):.4f}")
+
+    # Modelo final: probabilidades, igual que el completo
+    salida = tf.keras.layers.Softmax()(alumno.output)
+    final = tf.keras.Model(alumno.input, salida)
+    acuerdo = np.mean(
+        final.predict(x, verbose=0).argmax(axis=1) == maestro.predict(x, verbose=0).argmax(axis=1)
+    )
+    final.save(args.salida)
+    print(f"Acuerdo con el maestro (entrenamiento): {acuerdo:.2%}")
+    print(f"✅ {args.salida} ({Path(args.salida).stat().st_size / 1024:.0f} KB)")
+    print("Validar con: python scripts/evaluate_cascade.py --imagenes <carpeta etiquetada>")
+
+
+if __name__ == "__main__":
+    main()
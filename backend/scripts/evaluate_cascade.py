@@ -0,0 +1,97 @@
+"""
+Evalúa la cascada (modelo rápido + completo) contra el modelo completo solo.
+
+La carpeta debe tener una subcarpeta por clase con el nombre de ``CLASS_NAMES``
+(p. ej. ``Sanas/``, ``Coriza/``). Para cada umbral se informa la precisión
+combinada, la tasa de escalado y el costo estimado relativo al modelo completo.
+Sale con código 1 si, en el umbral configurado, la cascada pierde más de
+--max-perdida de precisión respecto del modelo completo.
+
+Uso:
+    python scripts/evaluate_cascade.py --imagenes ruta/a/etiquetadas/ --umbrales 0.8 0.9 0.95
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.config import CLASS_NAMES, settings  # noqa: E402
+from app.services.backends import crear_backend  # noqa: E402
+from app.services.image import preprocesar_bytes  # noqa: E402
+from convert_model import listar_imagenes  # noqa: E402
+
+
+def imagenes_etiquetadas(carpeta: Path) -> List[Tuple[Path, int]]:
+    indices = {nombre.lower(): i for i, nombre in enumerate(CLASS_NAMES)}
+    etiquetadas = []
+    for subcarpeta in sorted(p for p in carpeta.iterdir() if p.is_dir()):
+        indice = indices.get(subcarpeta.name.lower())
+        if indice is None:
+            print(f"⚠️ Carpeta ignorada (no es una clase conocida): {subcarpeta.name}")
+            continue
+        etiquetadas += [(p, indice) for p in listar_imagenes(subcarpeta)]
+    return etiquetadas
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--imagenes", required=True, help="Carpeta con una subcarpeta por clase")
+    parser.add_argument("--rapido", default=settings.CASCADE_MODEL_PATH)
+    parser.add_argument("--backend-rapido", default=settings.CASCADE_BACKEND)
+    parser.add_argument("--umbral", type=float, default=settings.CASCADE_THRESHOLD)
+    parser.add_argument("--umbrales", type=float, nargs="*", default=[0.7, 0.8, 0.9, 0.95])
+    parser.add_argument("--max-perdida", type=float, default=0.01)
+    args = parser.parse_args()
+
+    etiquetadas = imagenes_etiquetadas(Path(args.imagenes))
+    if not etiquetadas:
+        raise SystemExit(f"No hay imágenes etiquetadas en {args.imagenes}")
+
+    completo = crear_backend()
+    rapido = crear_backend(args.backend_rapido, args.rapido)
+    x = np.concatenate(
+        [preprocesar_bytes(p.read_bytes(), completo.input_dtype) for p, _ in etiquetadas]
+    )
+    etiquetas = np.array([e for _, e in etiquetadas])
+
+    # Una pasada de cada modelo por imagen; los umbrales se simulan sobre las salidas
+    completo.predict(x[:1])
+    rapido.predict(x[:1])
+    inicio = time.perf_counter()
+    p_completo = np.concatenate([completo.predict(x[i : i + 1]) for i in range(len(x))])
+    t_completo = (time.perf_counter() - inicio) / len(x)
+    inicio = time.perf_counter()
+    p_rapido = np.concatenate([rapido.predict(x[i : i + 1]) for i in range(len(x))])
+    t_rapido = (time.perf_counter() - inicio) / len(x)
+
+    precision_completo = np.mean(p_completo.argmax(axis=1) == etiquetas)
+    precision_rapido = np.mean(p_rapido.argmax(axis=1) == etiquetas)
+    print(f"Imágenes: {len(x)}")
+    print(f"Modelo completo: precisión {precision_completo:.2%}, {t_completo * 1000:.1f} ms/img")
+    print(f"Modelo rápido:   precisión {precision_rapido:.2%}, {t_rapido * 1000:.1f} ms/img")
+    print(f"\n{'umbral':>6} {'escalado':>9} {'precisión':>10} {'costo':>7}")
+
+    resultados = {}
+    for umbral in sorted(set(args.umbrales + [args.umbral])):
+        escaladas = p_rapido.max(axis=1) < umbral
+        clases = np.where(escaladas, p_completo.argmax(axis=1), p_rapido.argmax(axis=1))
+        precision = np.mean(clases == etiquetas)
+        costo = (t_rapido + escaladas.mean() * t_completo) / t_completo
+        resultados[umbral] = precision
+        marca = " ←" if umbral == args.umbral else ""
+        print(f"{umbral:>6.2f} {escaladas.mean():>9.1%} {precision:>10.2%} {costo:>6.2f}x{marca}")
+
+    perdida = precision_completo - resultados[args.umbral]
+    if perdida > args.max_perdida:
+        print(f"⚠️ La cascada pierde {perdida:.2%} de precisión con umbral {args.umbral}")
+        sys.exit(1)
+    print(f"✅ Con umbral {args.umbral} la cascada mantiene la precisión del modelo completo")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Exporta el modelo envuelto para recibir imágenes uint8 sin normalizar.
+
+El modelo resultante acepta lotes (N, H, W, 3) en uint8 y hace dentro del
+grafo la conversión a float32, el escalado a [0, 1] y, con --redimensionar,
+el resize a 224x224. Así el servidor entrega el buffer decodificado sin
+copias en float32 y el micro-batching trabaja sobre memoria uint8.
+
+Uso:
+    python scripts/export_uint8_model.py
+    # luego en .env: MODEL_PATH=app/models/keras_model_uint8.h5
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.config import settings  # noqa: E402
+
+
+def envolver_modelo(base, redimensionar: bool):
+    from keras import Input, Model, layers
+
+    alto, ancho, canales = base.input_shape[1:]
+    forma = (None, None, canales) if redimensionar else (alto, ancho, canales)
+    entrada = Input(shape=forma, dtype="uint8", name="imagen_uint8")
+    x = layers.Resizing(alto, ancho, name="redimensionar")(entrada) if redimensionar else entrada
+    # Rescaling castea a float32 y escala igual que el preprocesamiento en Python (/ 255)
+    x = layers.Rescaling(1.0 / 255, name="normalizar")(x)
+    return Model(entrada, base(x), name=f"{base.name}_uint8")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--modelo", default=settings.MODEL_PATH, help="Modelo Keras de origen")
+    parser.add_argument("--salida", help="Archivo destino (por defecto <modelo>_uint8.h5)")
+    parser.add_argument(
+        "--redimensionar",
+        action="store_true",
+        help="Aceptar cualquier tamaño y redimensionar a 224x224 dentro del grafo",
+    )
+    args = parser.parse_args()
+
+    from keras.models import load_model
+
+    base = load_model(args.modelo, compile=False)
+    modelo = envolver_modelo(base, args.redimensionar)
+    origen = Path(args.modelo)
+    salida = Path(args.salida) if args.salida else origen.with_name(f"{origen.stem}_uint8.h5")
+    modelo.save(salida)
+
+    # Verificar que el modelo envuelto reproduce el preprocesamiento en Python
+    rng = np.random.default_rng(0)
+    pixeles = rng.integers(0, 256, (4, 224, 224, 3), dtype=np.uint8)
+    esperado = base.predict_on_batch(pixeles.astype(np.float32) / 255.0)
+    obtenido = load_model(salida, compile=False).predict_on_batch(pixeles)
+    delta = float(np.max(np.abs(esperado - obtenido)))
+    print(f"✅ {salida} (diferencia máxima contra el modelo original: {delta:.2e})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Servidor local que imita /chat/completions de OpenRouter para medir sin red.
+
+Responde cada solicitud con una recomendación fija tras una latencia simulada
+del modelo. Con ``"stream": true`` envía la misma respuesta palabra por palabra
+como eventos SSE, repartiendo esa latencia entre los fragmentos (como un modelo
+que genera tokens). Con ``--tls`` genera un certificado autofirmado temporal, de modo
+que el costo del handshake TLS también entra en la medición.
+
+Uso:
+    python scripts/fake_openrouter.py --puerto 8090 --latencia-ms 300 --tls
+    # .env de la API: OPENROUTER_BASE_URL=http://127.0.0.1:8090/api/v1
+"""
+import argparse
+import asyncio
+import datetime
+import ipaddress
+import json
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing import Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+RESPUESTA = (
+    "1. EVALUACIÓN DEL ESTADO: respuesta simulada por el servidor local.\n"
+    "2. RECOMENDACIONES INMEDIATAS: aislar el ave y observar durante 48 horas."
+)
+
+
+def crear_app(latencia_ms: float) -> FastAPI:
+    app = FastAPI(title="OpenRouter falso")
+    app.state.solicitudes = 0
+
+    @app.post("/api/v1/chat/completions")
+    async def chat_completions(request: Request):
+        cuerpo = await request.json()
+        app.state.solicitudes += 1
+        if cuerpo.get("stream"):
+            return StreamingResponse(
+                fragmentos(app.state.solicitudes, cuerpo.get("model", "")),
+                media_type="text/event-stream",
+            )
+        await asyncio.sleep(latencia_ms / 1000)
+        return {
+            "id": f"fake-{app.state.solicitudes}",
+            "created": int(time.time()),
+            "model": cuerpo.get("model", ""),
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": RESPUESTA},
+                }
+            ],
+        }
+
+    async def fragmentos(numero: int, modelo: str):
+        palabras = re.findall(r"\S+\s*", RESPUESTA)
+        yield ": OPENROUTER PROCESSING\n\n"
+        for palabra in palabras:
+            await asyncio.sleep(latencia_ms / 1000 / len(palabras))
+            datos = {
+                "id": f"fake-{numero}",
+                "model": modelo,
+                "choices": [{"index": 0, "delta": {"content": palabra}}],
+            }
+            yield f"data: {json.dumps(datos, ensure_ascii=False)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return app
+
+
+def certificado_autofirmado(directorio: Path) -> Tuple[str, str]:
+    """Genera un par certificado/clave para 127.0.0.1 y localhost."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    clave = ec.generate_private_key(ec.SECP256R1())
+    nombre = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    ahora = datetime.datetime.utcnow()
+    certificado = (
+        x509.CertificateBuilder()
+        .subject_name(nombre)
+        .issuer_name(nombre)
+        .public_key(clave.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(ahora)
+        .not_valid_after(ahora + datetime.timedelta(days=1))
+        .add_extension(
+            x509.SubjectAlternativeName(
+                [x509.DNSName("localhost"), x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]
+            ),
+            critical=False,
+        )
+        .sign(clave, hashes.SHA256())
+    )
+    ruta_cert, ruta_clave = directorio / "cert.pem", directorio / "clave.pem"
+    ruta_cert.write_bytes(certificado.public_bytes(serialization.Encoding.PEM))
+    ruta_clave.write_bytes(
+        clave.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+    return str(ruta_cert), str(ruta_clave)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8090)
+    parser.add_argument("--latencia-ms", type=float, default=300.0)
+    parser.add_argument("--tls", action="store_true", help="Servir HTTPS con certificado temporal")
+    args = parser.parse_args()
+
+    opciones = {}
+    with tempfile.TemporaryDirectory() as directorio:
+        if args.tls:
+            cert, clave = certificado_autofirmado(Path(directorio))
+            opciones = {"ssl_certfile": cert, "ssl_keyfile": clave}
+        esquema = "https" if args.tls else "http"
+        print(f"✅ OpenRouter falso en {esquema}://{args.host}:{args.puerto}/api/v1")
+        uvicorn.run(
+            crear_app(args.latencia_ms),
+            host=args.host,
+            port=args.puerto,
+            log_level="warning",
+            **opciones,
+        )
+
+
+if __name__ == "__main__":
+    main()
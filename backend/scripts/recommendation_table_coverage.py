@@ -0,0 +1,116 @@
+"""
+Informe de cobertura de la tabla precalculada de recomendaciones.
+
+Reproduce los diagnósticos guardados contra la tabla (sin red) y muestra qué
+fracción se habría respondido desde ella, desglosada por clase y por cantidad
+de síntomas, junto con los conjuntos de síntomas que más faltan. Sirve para
+decidir si conviene regenerarla con más síntomas (``--max-sintomas``).
+
+Uso:
+    python scripts/recommendation_table_coverage.py
+    python scripts/recommendation_table_coverage.py --tabla /tmp/tabla.bin --ultimos 5000
+"""
+import argparse
+import json
+import re
+import sys
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import app.main  # noqa: E402,F401  (registra todos los modelos)
+from app.config import settings  # noqa: E402
+from app.core.database import SessionLocal  # noqa: E402
+from app.models.diagnosis import Diagnosis  # noqa: E402
+from app.services.recommendation_cache import normalizar_consulta  # noqa: E402
+from app.services.recommendation_table import TablaRecomendaciones  # noqa: E402
+
+CONFIANZA = re.compile(r"Nivel de confianza: ([\d.]+)%")
+
+
+def consulta_de(diagnostico: Diagnosis) -> Optional[Tuple[str, float, List[str]]]:
+    """Clase, confianza y síntomas de un diagnóstico guardado (None si no se pueden leer)."""
+    clase = (diagnostico.resultado or "").split(" - ")[0].strip()
+    try:
+        metadata = json.loads(diagnostico.diagnosis_metadata or "{}")
+        sintomas = json.loads(diagnostico.sintomas or "[]")
+    except ValueError:
+        return None
+    confianza = metadata.get("nivel_confianza")
+    if confianza is None:
+        # Diagnósticos anteriores a los metadatos: la confianza solo está en el texto
+        encontrada = CONFIANZA.search(diagnostico.resultado or "")
+        confianza = float(encontrada.group(1)) / 100 if encontrada else None
+    if not clase or confianza is None:
+        return None
+    return clase, float(confianza), sintomas
+
+
+def porcentaje(aciertos: int, total: int) -> str:
+    return f"{aciertos / total:.1%} ({aciertos}/{total})" if total else "-"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--tabla", default=settings.RECOMMENDATION_TABLE_PATH)
+    parser.add_argument("--ultimos", type=int, help="Solo los N diagnósticos más recientes")
+    parser.add_argument("--faltantes", type=int, default=10, help="Conjuntos faltantes a listar")
+    args = parser.parse_args()
+
+    tabla = TablaRecomendaciones(args.tabla)
+    if not tabla.compatible(
+        settings.RECOMMENDATION_CACHE_CONFIDENCE_STEP, settings.OPENROUTER_MODEL
+    ):
+        print("⚠️ La tabla se generó con otra granularidad o modelo: el servidor no la cargará")
+
+    db = SessionLocal()
+    try:
+        consulta_db = db.query(Diagnosis).order_by(Diagnosis.id.desc())
+        if args.ultimos:
+            consulta_db = consulta_db.limit(args.ultimos)
+        diagnosticos = consulta_db.all()
+    finally:
+        db.close()
+
+    por_clase: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+    por_cantidad: Dict[int, List[int]] = defaultdict(lambda: [0, 0])
+    faltantes: Counter = Counter()
+    ilegibles = 0
+    for diagnostico in diagnosticos:
+        datos = consulta_de(diagnostico)
+        if datos is None:
+            ilegibles += 1
+            continue
+        consulta = normalizar_consulta(*datos)
+        acierto = tabla.buscar(consulta) is not None
+        for grupo in (por_clase[consulta.clase], por_cantidad[len(consulta.sintomas)]):
+            grupo[0] += int(acierto)
+            grupo[1] += 1
+        if not acierto:
+            faltantes[(consulta.clase, consulta.sintomas)] += 1
+
+    meta = tabla.metadatos
+    print(
+        f"📦 {args.tabla}: {meta['entradas']} entradas, hasta {meta.get('max_sintomas')} "
+        f"síntomas, generada {meta.get('generado_en')}"
+    )
+    print(f"📊 Diagnósticos analizados: {len(diagnosticos) - ilegibles} ({ilegibles} ilegibles)")
+    print(f"✅ Cobertura total: {porcentaje(tabla.hits, tabla.hits + tabla.misses)}")
+
+    print("\nPor clase:")
+    for clase, (aciertos, total) in sorted(por_clase.items()):
+        print(f"  {clase:<12} {porcentaje(aciertos, total)}")
+    print("\nPor cantidad de síntomas:")
+    for cantidad, (aciertos, total) in sorted(por_cantidad.items()):
+        print(f"  {cantidad:<12} {porcentaje(aciertos, total)}")
+    if faltantes:
+        print(f"\nCombinaciones faltantes más frecuentes (top {args.faltantes}):")
+        for (clase, sintomas), veces in faltantes.most_common(args.faltantes):
+            print(f"  {veces:>5}  {clase}: {', '.join(sintomas) or '(sin síntomas)'}")
+    tabla.cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,29 @@
+import os
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool, StaticPool
 
-from app.core.database import Base, get_db
+from app.core.database import Base, crear_motor, crear_motor_asincrono, get_async_db, get_db
 from app.main import app
 from app.services.auth import create_access_token
 
-# Crear base de datos de prueba en memoria
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
-)
+# Base de prueba: SQLite en memoria, o la de TEST_DATABASE_URL (p. ej. un PostgreSQL local
+# vacío) para correr la misma suite contra el motor de producción
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL", "")
+
+if TEST_DATABASE_URL:
+    engine = crear_motor(TEST_DATABASE_URL)
+else:
+    SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+    engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
@@ -29,6 +38,41 @@ def db():
         Base.metadata.drop_all(bind=engine)
 
 
+@pytest.fixture(scope="function")
+def db_async(tmp_path):
+    """
+    Base SQLite en un archivo temporal (con los pragmas de producción) para las rutas
+    con ``AsyncSession``, o la de ``TEST_DATABASE_URL`` si está definida.
+
+    Devuelve una sesión síncrona (para preparar datos y verificar) sobre la
+    misma base que usan las sesiones de ``get_async_db`` durante el test.
+    """
+    url = TEST_DATABASE_URL or f"sqlite:///{tmp_path / 'test.db'}"
+    engine_archivo = crear_motor(url)
+    Base.metadata.create_all(bind=engine_archivo)
+    # NullPool: cada solicitud abre su conexión en el loop del TestClient
+    sesiones_async = async_sessionmaker(
+        crear_motor_asincrono(url, poolclass=NullPool),
+        expire_on_commit=False,
+        autoflush=False,
+    )
+
+    async def override_get_async_db():
+        async with sesiones_async() as sesion:
+            yield sesion
+
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine_archivo)()
+    try:
+        yield db
+    finally:
+        db.close()
+        app.dependency_overrides.pop(get_async_db, None)
+        if TEST_DATABASE_URL:
+            Base.metadata.drop_all(bind=engine_archivo)
+        engine_archivo.dispose()
+
+
 @pytest.fixture(scope="function")
 def client(db):
     def override_get_db():
@@ -101,3 +101,43 @@ def test_change_password(authorized_client, test_user):
         "/auth/login", data={"username": "testuser", "password": "newpass123"}
     )
     assert login_response.status_code == status.HTTP_200_OK
+
+
+def test_login_y_cambio_de_contrasena_con_sesion_asincrona(client, db_async):
+    import bcrypt
+
+    from app.models.user import User
+
+    hashed = bcrypt.hashpw(b"vieja123", bcrypt.gensalt(4)).decode("utf-8")
+    db_async.add(
+        User(
+            username="async",
+            email="async@example.com",
+            hashed_password=hashed,
+            full_name="Async",
+            telefono="555",
+            direccion="Granja",
+        )
+    )
+    db_async.commit()
+
+    login = client.post("/auth/login", data={"username": "async", "password": "vieja123"})
+    assert login.status_code == status.HTTP_200_OK
+    assert login.json()["refresh_token"]
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    assert client.get("/auth/me", headers=headers).json()["username"] == "async"
+
+    response = client.post(
+        "/auth/change-password",
+        headers=headers,
+        json={"old_password": "vieja123", "new_password": "nueva123"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    # El cambio quedó guardado: la contraseña vieja ya no sirve
+    assert (
+        client.post("/auth/login/json", json={"username": "async", "password": "vieja123"})
+    ).status_code == status.HTTP_401_UNAUTHORIZED
+    assert (
+        client.post("/auth/login/json", json={"username": "async", "password": "nueva123"})
+    ).status_code == status.HTTP_200_OK
@@ -0,0 +1,37 @@
+from sqlalchemy import text
+
+from app.core.database import crear_motor, opciones_motor
+
+
+def test_opciones_del_motor_segun_la_url():
+    postgres = opciones_motor("postgresql://farmeye@localhost/farmeye")
+    assert postgres["pool_size"] > 0 and postgres["pool_pre_ping"] is True
+    assert postgres["connect_args"] == {"options": "-c statement_timeout=30000"}
+    asyncpg = opciones_motor("postgresql+asyncpg://farmeye@localhost/farmeye")
+    assert asyncpg["connect_args"] == {"server_settings": {"statement_timeout": "30000"}}
+
+    archivo = opciones_motor("sqlite:///./app.db")
+    assert archivo["connect_args"] == {"check_same_thread": False}
+    assert archivo["pool_size"] > 0
+
+    # En memoria hay una sola conexión: se conserva el pool de SQLAlchemy
+    assert "pool_size" not in opciones_motor("sqlite:///:memory:")
+
+
+def test_wal_deja_leer_mientras_otra_conexion_escribe(tmp_path):
+    motor = crear_motor(f"sqlite:///{tmp_path / 'wal.db'}")
+    try:
+        with motor.begin() as conexion:
+            conexion.execute(text("CREATE TABLE t (x INTEGER)"))
+            conexion.execute(text("INSERT INTO t VALUES (1)"))
+            assert conexion.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            assert conexion.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+
+        with motor.connect() as escritor, motor.connect() as lector:
+            escritor.execute(text("INSERT INTO t VALUES (2)"))  # transacción abierta
+            # El lector no espera al escritor y ve el último commit
+            assert lector.execute(text("SELECT count(*) FROM t")).scalar() == 1
+            escritor.commit()
+            assert lector.execute(text("SELECT count(*) FROM t")).scalar() == 2
+    finally:
+        motor.dispose()
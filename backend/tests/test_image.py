@@ -125,3 +125,176 @@ def test_get_nonexistent_analysis(authorized_client):
 def test_get_analysis_unauthorized(client):
     response = client.get("/api/analyses/1")
     assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_scan_batch_ndjson(client, db_async, monkeypatch):
+    import io
+    import json
+
+    import numpy as np
+    from PIL import Image
+
+    from app.main import app
+    from app.models.diagnosis import Diagnosis
+    from app.models.user import User
+    from app.services import auth, batch_scan, image
+    from app.services.backends import InferenceBackend
+
+    db = db_async
+    user = User(username="lote", email="lote@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+
+    monkeypatch.setattr(image, "get_model", lambda: InferenceBackend("prueba"))
+    monkeypatch.setattr(
+        batch_scan, "predecir_lote", lambda lote: np.tile([0.9, 0.1, 0, 0], (len(lote), 1))
+    )
+    app.dependency_overrides[auth.get_current_user] = lambda: user
+
+    def jpeg():
+        buffer = io.BytesIO()
+        Image.new("RGB", (300, 200), color="white").save(buffer, "JPEG")
+        return buffer.getvalue()
+
+    archivos = [("files", (f"foto_{i}.jpg", jpeg(), "image/jpeg")) for i in range(3)]
+    archivos.append(("files", ("roto.jpg", b"no es imagen", "image/jpeg")))
+    response = client.post(
+        "/api/scan/batch", files=archivos, data={"sintomas": json.dumps(["Tos"])}
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lineas = [json.loads(linea) for linea in response.text.splitlines()]
+    assert [linea.get("resultado") for linea in lineas[:4]] == ["Sanas"] * 3 + [None]
+    assert "error" in lineas[3]
+    resumen = lineas[-1]["resumen"]
+    assert resumen["total"] == 4 and resumen["guardados"] == 3 and resumen["errores"] == 1
+    guardados = db.query(Diagnosis).filter(Diagnosis.id.in_(resumen["ids"])).all()
+    assert len(guardados) == 3 and all(json.loads(d.sintomas) == ["Tos"] for d in guardados)
+
+
+def test_scan_responde_antes_que_la_recomendacion_ia(client, db_async, monkeypatch):
+    import asyncio
+    import json
+
+    from sqlalchemy.orm import sessionmaker
+
+    from app.core.database import get_async_db
+    from app.main import app
+    from app.models.user import User
+    from app.routes import image as rutas
+    from app.services import auth, diagnosis, recommendation_cache
+    from app.services.recommendation_cache import RecommendationCache
+
+    db = db_async
+    user = User(username="ia", email="ia@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+
+    async def prediccion(*args, **kwargs):
+        return "Coriza", 0.88
+
+    async def openrouter_lento(texto, sintomas, al_recibir=None):
+        await asyncio.sleep(0.3)
+        return "Recomendación del veterinario IA"
+
+    monkeypatch.setenv("OPENROUTER_API_KEY", "clave")
+    monkeypatch.setattr(rutas, "predecir_bytes", prediccion)
+    monkeypatch.setattr(diagnosis, "recomendacion_openrouter", openrouter_lento)
+    monkeypatch.setattr(diagnosis, "SessionLocal", sessionmaker(bind=db.get_bind()))
+    monkeypatch.setattr(recommendation_cache, "_cache", RecommendationCache(3600, 10))
+    app.dependency_overrides[auth.get_current_user] = lambda: user
+
+    # Registrar las sesiones de las solicitudes y, en cada espera del SSE, si alguna sigue
+    # dentro de una transacción (con una conexión del pool tomada)
+    sesiones, en_transaccion = [], []
+    obtener_sesion = app.dependency_overrides[get_async_db]
+    esperar = rutas.esperar_recomendacion
+
+    async def sesion_registrada():
+        async for sesion in obtener_sesion():
+            sesiones.append(sesion)
+            yield sesion
+
+    async def esperar_registrando(*args, **kwargs):
+        en_transaccion.append(any(sesion.in_transaction() for sesion in sesiones))
+        return await esperar(*args, **kwargs)
+
+    app.dependency_overrides[get_async_db] = sesion_registrada
+    monkeypatch.setattr(rutas, "esperar_recomendacion", esperar_registrando)
+
+    response = client.post(
+        "/api/scan",
+        files={"file": ("a.jpg", b"img", "image/jpeg")},
+        data={"sintomas": json.dumps(["fiebre"])},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["estado_recomendacion"] == "pendiente"
+    assert "Mantener reposo" in data["recomendacion"]
+
+    eventos = client.get(f"/api/analyses/{data['id']}/recommendation/events")
+    assert "event: recomendacion" in eventos.text
+    # El SSE no retiene la conexión mientras espera la recomendación
+    assert en_transaccion and not any(en_transaccion)
+
+    detalle = client.get(f"/api/analyses/{data['id']}").json()
+    assert detalle["estado_recomendacion"] == "completa"
+    assert detalle["recomendacion"] == "Recomendación del veterinario IA"
+
+
+def test_stream_de_recomendacion_reenvia_los_fragmentos_y_guarda_el_texto(
+    client, db_async, monkeypatch
+):
+    import asyncio
+    import json
+
+    from sqlalchemy.orm import sessionmaker
+
+    from app.main import app
+    from app.models.user import User
+    from app.routes import image as rutas
+    from app.services import auth, diagnosis, recommendation_cache
+    from app.services.recommendation_cache import RecommendationCache
+
+    db = db_async
+    user = User(username="stream", email="stream@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+
+    async def prediccion(*args, **kwargs):
+        return "Coriza", 0.88
+
+    async def openrouter_en_partes(texto, sintomas, al_recibir=None):
+        for parte in ("Aislar ", "el ", "ave"):
+            await asyncio.sleep(0.1)
+            al_recibir(parte)
+        return "Aislar el ave"
+
+    monkeypatch.setenv("OPENROUTER_API_KEY", "clave")
+    monkeypatch.setattr(rutas, "predecir_bytes", prediccion)
+    monkeypatch.setattr(diagnosis, "recomendacion_openrouter", openrouter_en_partes)
+    monkeypatch.setattr(diagnosis, "SessionLocal", sessionmaker(bind=db.get_bind()))
+    monkeypatch.setattr(recommendation_cache, "_cache", RecommendationCache(3600, 10))
+    app.dependency_overrides[auth.get_current_user] = lambda: user
+
+    data = client.post(
+        "/api/scan",
+        files={"file": ("a.jpg", b"img", "image/jpeg")},
+        data={"sintomas": json.dumps(["tos"])},
+    ).json()
+    assert data["estado_recomendacion"] == "pendiente"
+
+    eventos = client.get(f"/api/analyses/{data['id']}/recommendation/stream").text
+    fragmentos = [
+        json.loads(linea[len("data: ") :])["texto"]
+        for bloque in eventos.split("\n\n")
+        if bloque.startswith("event: fragmento")
+        for linea in bloque.splitlines()[1:]
+    ]
+    assert fragmentos == ["Aislar ", "el ", "ave"]
+    assert eventos.rstrip().split("\n\n")[-1].startswith("event: recomendacion")
+
+    detalle = client.get(f"/api/analyses/{data['id']}").json()
+    assert detalle["estado_recomendacion"] == "completa"
+    assert detalle["recomendacion"] == "Aislar el ave"
@@ -0,0 +1,644 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.services.backends import InferenceBackend, afinidad_temporal, crear_backend
+from app.services.batching import InferenceBatcher
+from app.services.cascade import CascadeBackend
+from app.services.executor import BoundedExecutor
+from app.services.image import decodificar_imagen, imagen_a_tensor
+from app.services.inference_server import InferenceServer, RemoteBackend
+from app.services.phash import PerceptualIndex, dhash
+from app.services.prediction_cache import PredictionCache
+from app.services.tiling import agregar_rebano, lote_de_teselas, preparar_rebano, teselas
+from app.services.warmup import estado, tamanos_de_lote
+
+
+def _predict_identidad(batch):
+    # Devuelve, para cada imagen, un vector con su primer píxel
+    return batch[:, 0, 0, :].copy()
+
+
+def test_batcher_agrupa_solicitudes_concurrentes():
+    batcher = InferenceBatcher(_predict_identidad, max_batch_size=4, max_wait_ms=50)
+
+    async def run():
+        tensores = [np.full((1, 2, 2, 3), i, dtype=np.float32) for i in range(10)]
+        resultados = await asyncio.gather(*(batcher.predict(t) for t in tensores))
+        await batcher.detener()
+        return resultados
+
+    resultados = asyncio.run(run())
+
+    for i, resultado in enumerate(resultados):
+        assert resultado.tolist() == [i, i, i]
+    stats = batcher.estadisticas()
+    assert stats["total_procesadas"] == 10
+    assert stats["total_lotes"] == 3
+    assert stats["histograma_lotes"] == {"2": 1, "4": 2}
+
+
+def test_batcher_propaga_errores_a_todo_el_lote():
+    def predict_falla(batch):
+        raise RuntimeError("modelo no disponible")
+
+    batcher = InferenceBatcher(predict_falla, max_batch_size=4, max_wait_ms=10)
+
+    async def run():
+        tensores = [np.zeros((1, 2, 2, 3), dtype=np.float32) for _ in range(3)]
+        resultados = await asyncio.gather(
+            *(batcher.predict(t) for t in tensores), return_exceptions=True
+        )
+        await batcher.detener()
+        return resultados
+
+    resultados = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in resultados)
+
+
+def test_bounded_executor_limita_trabajos_pendientes():
+    executor = BoundedExecutor(max_workers=2, max_pending=2, nombre="test")
+    activos = []
+    lock = threading.Lock()
+    maximo = [0]
+
+    def trabajo(i):
+        with lock:
+            activos.append(i)
+            maximo[0] = max(maximo[0], len(activos))
+        time.sleep(0.01)
+        with lock:
+            activos.remove(i)
+        return i * 2
+
+    async def run():
+        return await asyncio.gather(*(executor.run(trabajo, i) for i in range(6)))
+
+    try:
+        assert asyncio.run(run()) == [0, 2, 4, 6, 8, 10]
+    finally:
+        executor.shutdown()
+    assert maximo[0] <= 2
+    assert executor.estadisticas()["total_esperas"] > 0
+
+
+def test_crear_backend_desconocido():
+    with pytest.raises(ValueError):
+        crear_backend("tensorrt")
+
+
+# Pesos del clasificador de juguete: promedio de cada canal -> 5 clases
+PESOS_JUGUETE = np.array(
+    [[4.0, -2.0, 0.5, 1.0, -1.0], [-3.0, 2.5, 1.0, 0.0, 0.5], [1.0, 0.5, -4.0, 2.0, 0.0]],
+    dtype=np.float32,
+)
+
+
+def _probabilidades_juguete(batch):
+    """Salida esperada: softmax(promedio por canal @ PESOS_JUGUETE), en float32 [0, 1]."""
+    logits = batch.astype(np.float32).mean(axis=(1, 2)) @ PESOS_JUGUETE
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def _lote_de_prueba(n, dtype):
+    pixeles = np.random.default_rng(n).integers(0, 256, (n, 224, 224, 3), dtype=np.uint8)
+    return pixeles if dtype == np.uint8 else pixeles.astype(np.float32) / 255.0
+
+
+def _onnx_juguete(destino, dtype):
+    onnx = pytest.importorskip("onnx")
+    from onnx import TensorProto, helper, numpy_helper
+
+    tipo = TensorProto.UINT8 if dtype == np.uint8 else TensorProto.FLOAT
+    nodos = []
+    x = "input"
+    if dtype == np.uint8:
+        # Igual que el modelo de export_uint8_model.py: conversión y escalado en el grafo
+        nodos += [
+            helper.make_node("Cast", ["input"], ["flotante"], to=TensorProto.FLOAT),
+            helper.make_node("Mul", ["flotante", "escala"], ["normalizada"]),
+        ]
+        x = "normalizada"
+    nodos += [
+        helper.make_node("ReduceMean", [x], ["promedio"], axes=[1, 2], keepdims=0),
+        helper.make_node("MatMul", ["promedio", "pesos"], ["logits"]),
+        helper.make_node("Softmax", ["logits"], ["probabilidades"], axis=-1),
+    ]
+    grafo = helper.make_graph(
+        nodos,
+        "juguete",
+        [helper.make_tensor_value_info("input", tipo, ["N", 224, 224, 3])],
+        [helper.make_tensor_value_info("probabilidades", TensorProto.FLOAT, ["N", 5])],
+        initializer=[
+            numpy_helper.from_array(PESOS_JUGUETE, "pesos"),
+            numpy_helper.from_array(np.array(1 / 255, dtype=np.float32), "escala"),
+        ],
+    )
+    modelo = helper.make_model(grafo, opset_imports=[helper.make_opsetid("", 13)])
+    onnx.checker.check_model(modelo)
+    onnx.save(modelo, str(destino))
+
+
+def _tflite_juguete(destino, dtype, int8=False):
+    tf = pytest.importorskip("tensorflow")
+
+    entrada = tf.keras.Input(shape=(224, 224, 3), dtype="uint8" if dtype == np.uint8 else None)
+    x = tf.keras.layers.Rescaling(1.0 / 255)(entrada) if dtype == np.uint8 else entrada
+    x = tf.keras.layers.GlobalAveragePooling2D()(x)
+    salida = tf.keras.layers.Dense(5, activation="softmax", use_bias=False)(x)
+    modelo = tf.keras.Model(entrada, salida)
+    modelo.layers[-1].set_weights([PESOS_JUGUETE])
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(modelo)
+    if int8:
+        # Cuantización completa como en convert_model.py, con entrada y salida int8
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([_lote_de_prueba(1, dtype)] for _ in range(4))
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    destino.write_bytes(converter.convert())
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.uint8], ids=["float32", "uint8"])
+def test_backend_onnx_predice_probabilidades_por_lote(tmp_path, dtype):
+    pytest.importorskip("onnxruntime")
+    ruta = tmp_path / "juguete.onnx"
+    _onnx_juguete(ruta, dtype)
+
+    backend = crear_backend("onnx", str(ruta))
+
+    assert backend.input_dtype == dtype
+    # El eje del lote es dinámico: distintos tamaños con la misma sesión
+    for n in (1, 3):
+        lote = _lote_de_prueba(n, dtype)
+        salida = backend.predict(lote)
+        assert salida.shape == (n, 5) and salida.dtype == np.float32
+        np.testing.assert_allclose(salida.sum(axis=1), 1.0, rtol=1e-5)
+        esperado = _probabilidades_juguete(_lote_de_prueba(n, np.float32))
+        np.testing.assert_allclose(salida, esperado, atol=1e-5)
+
+
+@pytest.mark.parametrize(
+    "dtype,int8,tolerancia",
+    [(np.float32, False, 1e-5), (np.uint8, False, 1e-5), (np.float32, True, 0.05)],
+    ids=["float32", "uint8", "int8-cuantizado"],
+)
+def test_backend_tflite_predice_probabilidades_por_lote(tmp_path, dtype, int8, tolerancia):
+    ruta = tmp_path / "juguete.tflite"
+    _tflite_juguete(ruta, dtype, int8)
+
+    backend = crear_backend("tflite", str(ruta))
+
+    # Con entrada int8 cuantizada el backend recibe float32 y cuantiza él mismo
+    assert backend.input_dtype == dtype
+    assert (backend._input["dtype"] == np.int8) == int8
+    # El modelo se convierte con lote 1: el intérprete se redimensiona al del pedido
+    for n in (1, 3, 2):
+        lote = _lote_de_prueba(n, dtype)
+        salida = backend.predict(lote)
+        assert salida.shape == (n, 5) and salida.dtype == np.float32
+        np.testing.assert_allclose(salida.sum(axis=1), 1.0, atol=tolerancia)
+        esperado = _probabilidades_juguete(_lote_de_prueba(n, np.float32))
+        np.testing.assert_allclose(salida, esperado, atol=tolerancia)
+
+
+@pytest.mark.skipif(not hasattr(os, "sched_setaffinity"), reason="requiere sched_setaffinity")
+def test_afinidad_temporal_restaura_la_mascara():
+    original = os.sched_getaffinity(0)
+    cpu = min(original)
+    resultado = {}
+
+    def en_hilo():
+        with afinidad_temporal([cpu]):
+            resultado["dentro"] = os.sched_getaffinity(0)
+        resultado["despues"] = os.sched_getaffinity(0)
+
+    hilo = threading.Thread(target=en_hilo)
+    hilo.start()
+    hilo.join()
+
+    assert resultado["dentro"] == {cpu}
+    assert resultado["despues"] == original
+    assert os.sched_getaffinity(0) == original
+
+
+def test_tamanos_de_lote_por_defecto(monkeypatch):
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "INFERENCE_MAX_BATCH_SIZE", 12)
+    assert tamanos_de_lote() == [1, 2, 4, 8, 12]
+
+
+def test_ready_responde_503_mientras_calienta(client, monkeypatch):
+    monkeypatch.setitem(estado, "listo", False)
+    assert client.get("/health/ready").status_code == 503
+
+    monkeypatch.setitem(estado, "listo", True)
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    assert response.json()["estado"] == "listo"
+
+
+def test_prediction_cache_lru_disco_e_invalidacion(tmp_path):
+    modelo = tmp_path / "modelo.h5"
+    modelo.write_bytes(b"v1")
+    cache = PredictionCache(str(modelo), max_entries=2, disk_dir=str(tmp_path / "cache"))
+
+    claves = [cache.clave(contenido) for contenido in (b"a", b"b", b"c")]
+    for i, clave in enumerate(claves):
+        cache.set(clave, ("Sanas", 0.5 + i / 10))
+
+    # La primera entrada salió de memoria pero sigue en disco
+    assert cache.get(claves[0]) == ("Sanas", 0.5)
+    stats = cache.estadisticas()
+    assert stats["expulsiones"] >= 1
+    assert stats["hits_disco"] == 1
+
+    # Cambiar el archivo del modelo invalida ambos niveles
+    modelo.write_bytes(b"version 2")
+    assert cache.get(claves[2]) is None
+    assert cache.estadisticas()["invalidaciones"] == 1
+
+
+def test_prediction_cache_se_invalida_al_cambiar_la_cascada(tmp_path):
+    modelo = tmp_path / "modelo.h5"
+    rapido = tmp_path / "modelo_small.h5"
+    modelo.write_bytes(b"v1")
+    rapido.write_bytes(b"v1")
+    clave = PredictionCache.clave(b"foto")
+
+    cache = PredictionCache(str(modelo), rutas_extra=[str(rapido)], parametros="cascada:0.9")
+    cache.set(clave, ("Sanas", 0.95))
+    # Reentrenar el modelo rápido cambia las predicciones aunque el completo sea el mismo
+    rapido.write_bytes(b"version 2")
+    assert cache.get(clave) is None
+
+    # Otro umbral (o activar la cascada) usa otra huella en disco
+    disco = str(tmp_path / "cache")
+    PredictionCache(str(modelo), disk_dir=disco, parametros="cascada:0.9").set(
+        clave, ("Sanas", 0.9)
+    )
+    assert PredictionCache(str(modelo), disk_dir=disco, parametros="cascada:0.8").get(clave) is None
+    assert PredictionCache(str(modelo), disk_dir=disco).get(clave) is None
+
+
+def test_predecir_bytes_consulta_la_cache_fuera_del_event_loop(tmp_path, monkeypatch):
+    from app.services import image
+
+    modelo = tmp_path / "modelo.h5"
+    modelo.write_bytes(b"v1")
+    cache = PredictionCache(str(modelo), disk_dir=str(tmp_path / "cache"))
+    hilos = []
+    for metodo in ("get", "set"):
+        original = getattr(cache, metodo)
+
+        def registrar(*args, _original=original):
+            hilos.append(threading.get_ident())
+            return _original(*args)
+
+        monkeypatch.setattr(cache, metodo, registrar)
+
+    async def confianza(imagen):
+        return "Sanas", 0.9
+
+    monkeypatch.setattr(image, "get_prediction_cache", lambda: cache)
+    monkeypatch.setattr(image, "preprocesar_con_hash", lambda contenido: (None, 0))
+    monkeypatch.setattr(image, "get_prediction_confidence", confianza)
+
+    assert asyncio.run(image.predecir_bytes(b"foto")) == ("Sanas", 0.9)
+    assert asyncio.run(image.predecir_bytes(b"foto")) == ("Sanas", 0.9)
+    assert cache.estadisticas()["hits_memoria"] == 1
+    assert len(hilos) == 3 and threading.get_ident() not in hilos
+
+
+def test_metricas_de_cascada_no_cargan_el_modelo(client, monkeypatch):
+    from app.config import settings
+    from app.services import image
+
+    monkeypatch.setattr(settings, "CASCADE_ENABLED", True)
+    monkeypatch.setattr(image, "model", None)
+    monkeypatch.setattr(image, "crear_backend", lambda *a, **k: pytest.fail("cargó el modelo"))
+
+    assert client.get("/metrics/cascade").json() == {"habilitada": True, "cargada": False}
+
+
+def test_dhash_tolera_cambios_leves():
+    from PIL import Image
+
+    gradiente = np.tile(np.arange(0, 256, 2, dtype=np.uint8), (128, 1))
+    original = Image.fromarray(np.stack([gradiente] * 3, axis=-1))
+    ruido = np.random.default_rng(0).integers(-3, 4, (128, 128, 3))
+    parecida = Image.fromarray(np.clip(np.asarray(original) + ruido, 0, 255).astype(np.uint8))
+    invertida = original.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+
+    indice = PerceptualIndex(max_distance=4, window_seconds=60, max_entries=4)
+    indice.agregar(1, dhash(original), ("Sanas", 0.9), ahora=0.0)
+
+    assert indice.buscar(1, dhash(parecida), ahora=10.0) == (("Sanas", 0.9), 0)
+    assert indice.buscar(1, dhash(invertida), ahora=10.0) is None
+    # Otro usuario o fuera de la ventana de tiempo: no se reutiliza
+    assert indice.buscar(2, dhash(original), ahora=10.0) is None
+    assert indice.buscar(1, dhash(original), ahora=120.0) is None
+
+
+def test_decodificacion_rapida_jpeg_grande():
+    import io
+
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (4000, 3000), color=(120, 200, 80)).save(buffer, "JPEG")
+
+    rapida = decodificar_imagen(buffer.getvalue(), rapido=True)
+    original = decodificar_imagen(buffer.getvalue(), rapido=False)
+
+    assert rapida.size == original.size == (224, 224)
+    diferencia = np.abs(np.asarray(rapida, dtype=np.int16) - np.asarray(original, dtype=np.int16))
+    assert diferencia.mean() < 2
+
+
+def test_imagen_a_tensor_uint8_sin_copias_float():
+    from PIL import Image
+
+    image = Image.new("RGB", (224, 224), color=(255, 128, 0))
+
+    tensor_uint8 = imagen_a_tensor(image, np.uint8)
+    tensor_float = imagen_a_tensor(image)
+
+    assert tensor_uint8.dtype == np.uint8 and tensor_uint8.shape == (1, 224, 224, 3)
+    assert tensor_uint8.base is not None  # la dimensión de lote es una vista
+    assert np.allclose(tensor_uint8 / 255.0, tensor_float)
+
+
+CLAVE_INFERENCIA = b"clave-de-prueba-inferencia"
+
+
+class _BackendPrimerPixel(InferenceBackend):
+    nombre = "prueba"
+    input_dtype = np.uint8
+
+    def predict(self, batch):
+        if batch[0, 0, 0, 0] == 255:
+            raise ValueError("entrada inválida")
+        return _predict_identidad(batch).astype(np.float32)
+
+
+def test_servidor_inferencia_memoria_compartida(tmp_path):
+    address = str(tmp_path / "inferencia.sock")
+    servidor = InferenceServer(address, CLAVE_INFERENCIA, _BackendPrimerPixel("prueba"))
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    for _ in range(50):
+        if (tmp_path / "inferencia.sock").exists():
+            break
+        time.sleep(0.02)
+
+    remoto = RemoteBackend([address], CLAVE_INFERENCIA, slots=2, max_batch_size=4)
+    try:
+        assert remoto.input_dtype == np.uint8
+        lote = np.zeros((6, 224, 224, 3), dtype=np.uint8)
+        lote[:, 0, 0, 0] = np.arange(6)
+        # Un lote mayor que el slot se parte en varias pasadas
+        resultado = remoto.predict(lote)
+        assert resultado.shape == (6, 3)
+        assert resultado[:, 0].tolist() == list(range(6))
+        assert servidor.total_lotes == 2 and servidor.total_imagenes == 6
+
+        lote[0, 0, 0, 0] = 255
+        with pytest.raises(RuntimeError, match="entrada inválida"):
+            remoto.predict(lote[:1])
+    finally:
+        remoto.close()
+        servidor.close()
+
+
+def test_servidor_inferencia_exige_clave_propia_y_socket_privado(tmp_path):
+    import stat
+
+    from app.services.inference_server import validar_direccion
+
+    for clave in (b"", b"cambiar_en_produccion", b"corta"):
+        with pytest.raises(RuntimeError, match="INFERENCE_SERVER_AUTHKEY"):
+            InferenceServer(str(tmp_path / "s.sock"), clave, _BackendPrimerPixel("prueba"))
+    with pytest.raises(RuntimeError, match="loopback"):
+        validar_direccion(("0.0.0.0", 6000))
+    validar_direccion(("127.0.0.1", 6000))
+
+    compartido = tmp_path / "compartido"
+    compartido.mkdir()
+    compartido.chmod(0o777)
+    with pytest.raises(RuntimeError, match="directorio privado"):
+        validar_direccion(str(compartido / "inferencia.sock"), crear=True)
+    with pytest.raises(RuntimeError, match="directorio privado"):
+        RemoteBackend([str(compartido / "inferencia.sock")], CLAVE_INFERENCIA)
+
+    # El servidor crea su directorio con 0700 y el socket queda con 0600
+    socket_privado = tmp_path / "privado" / "inferencia.sock"
+    servidor = InferenceServer(str(socket_privado), CLAVE_INFERENCIA, _BackendPrimerPixel("p"))
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    try:
+        for _ in range(50):
+            if socket_privado.exists() and stat.S_IMODE(socket_privado.stat().st_mode) == 0o600:
+                break
+            time.sleep(0.02)
+        assert stat.S_IMODE(socket_privado.parent.stat().st_mode) == 0o700
+        assert stat.S_IMODE(socket_privado.stat().st_mode) == 0o600
+    finally:
+        servidor.close()
+
+
+def _servir_en_proceso(address):
+    InferenceServer(address, CLAVE_INFERENCIA, _BackendPrimerPixel("prueba")).serve_forever()
+
+
+def _levantar_servidor(address):
+    import multiprocessing
+
+    proceso = multiprocessing.get_context("fork").Process(
+        target=_servir_en_proceso, args=(address,), daemon=True
+    )
+    proceso.start()
+    # El archivo del socket aparece en bind(), un instante antes de listen()
+    for _ in range(100):
+        with socket.socket(socket.AF_UNIX) as sonda:
+            if sonda.connect_ex(address) == 0:
+                break
+        time.sleep(0.02)
+    return proceso
+
+
+def test_remoto_se_reconecta_cuando_el_servidor_se_reinicia(tmp_path):
+    address = str(tmp_path / "inferencia.sock")
+    servidor = _levantar_servidor(address)
+    remoto = RemoteBackend([address], CLAVE_INFERENCIA, slots=1, max_batch_size=2)
+    lote = np.zeros((1, 224, 224, 3), dtype=np.uint8)
+    try:
+        lote[0, 0, 0, 0] = 7
+        assert remoto.predict(lote)[0, 0] == 7
+
+        servidor.kill()
+        servidor.join()
+        os.unlink(address)  # el proceso muerto no borró su socket
+        # Sin servidor, la solicitud falla pero el slot no queda inutilizado
+        with pytest.raises(OSError):
+            remoto.predict(lote)
+
+        servidor = _levantar_servidor(address)
+        lote[0, 0, 0, 0] = 9
+        assert remoto.predict(lote)[0, 0] == 9
+        assert remoto.reconexiones == 1
+    finally:
+        remoto.close()
+        servidor.kill()
+
+
+class _BackendFijo(InferenceBackend):
+    def __init__(self, probabilidades):
+        super().__init__("fijo")
+        self.probabilidades = np.asarray(probabilidades, dtype=np.float32)
+        self.lotes = []
+
+    def predict(self, batch):
+        self.lotes.append(batch.shape[0])
+        return self.probabilidades[batch[:, 0, 0, 0].astype(int)]
+
+
+def test_cascada_escala_solo_las_imagenes_dudosas():
+    rapido = _BackendFijo([[0.95, 0.05], [0.6, 0.4], [0.1, 0.9]])
+    completo = _BackendFijo([[0.0, 1.0], [0.2, 0.8], [0.0, 1.0]])
+    cascada = CascadeBackend(rapido, completo, threshold=0.9)
+
+    lote = np.zeros((3, 2, 2, 3), dtype=np.float32)
+    lote[:, 0, 0, 0] = [0, 1, 2]
+    resultado = cascada.predict(lote)
+
+    assert np.allclose(resultado, [[0.95, 0.05], [0.2, 0.8], [0.1, 0.9]])
+    # Una sola pasada del modelo completo con la imagen dudosa
+    assert completo.lotes == [1]
+    stats = cascada.estadisticas()
+    assert stats["escaladas"] == 1 and stats["resueltas_etapa1"] == 2
+    assert stats["tasa_escalado"] == pytest.approx(1 / 3)
+
+
+def test_teselas_son_vistas_que_cubren_la_imagen():
+    arreglo = np.random.default_rng(0).integers(0, 256, (500, 900, 3), dtype=np.uint8)
+
+    grilla = teselas(arreglo, 224, solape=0.25)
+
+    filas, columnas = grilla.shape[:2]
+    assert grilla.shape[2:] == (224, 224, 3)
+    assert np.shares_memory(grilla, arreglo)
+    assert np.array_equal(grilla[0, 0], arreglo[:224, :224])
+    # La última tesela llega al borde salvo por el redondeo del paso
+    paso_y = grilla.strides[0] // arreglo.strides[0]
+    paso_x = grilla.strides[1] // arreglo.strides[1]
+    assert paso_y <= 168 and paso_x <= 168
+    assert arreglo.shape[0] - ((filas - 1) * paso_y + 224) < filas
+    assert arreglo.shape[1] - ((columnas - 1) * paso_x + 224) < columnas
+
+    lote = lote_de_teselas(grilla, np.float32)
+    assert lote.shape == (filas * columnas, 224, 224, 3) and lote.flags.c_contiguous
+    assert np.allclose(lote[columnas + 1], grilla[1, 1] / 255.0)
+
+
+def test_preparar_rebano_rechaza_fotos_con_demasiadas_teselas(monkeypatch):
+    import io
+    from types import SimpleNamespace
+
+    from PIL import Image
+
+    from app.config import settings
+    from app.services import tiling
+
+    def png(ancho, alto):
+        buffer = io.BytesIO()
+        Image.new("RGB", (ancho, alto), "white").save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    monkeypatch.setattr(tiling, "get_model", lambda: SimpleNamespace(input_dtype=np.uint8))
+
+    # Foto cuadrada grande: MAX_SIDE la acota a una grilla de 7x7
+    lote, (filas, columnas), _ = preparar_rebano(png(3000, 3000))
+    assert (filas, columnas) == (7, 7) and len(lote) == 49 <= settings.TILING_MAX_TILES
+    # Alargada pero dentro del tope: el lado menor sube a 224 (grilla de 1x11)
+    lote, (filas, columnas), _ = preparar_rebano(png(800, 100))
+    assert (filas, columnas) == (1, 11)
+
+    # Los rechazos salen de la cabecera: no se llega a decodificar ni a remuestrear
+    def sin_decodificar(*args, **kwargs):
+        raise AssertionError("la foto se decodificó antes de rechazarla")
+
+    monkeypatch.setattr(Image.Image, "convert", sin_decodificar)
+    monkeypatch.setattr(Image.Image, "resize", sin_decodificar)
+    with pytest.raises(ValueError, match="alargada"):
+        preparar_rebano(png(8000, 100))
+    monkeypatch.setattr(settings, "TILING_MAX_TILES", 20)
+    with pytest.raises(ValueError, match="49 teselas"):
+        preparar_rebano(png(3000, 3000))
+
+
+def test_agregar_rebano_prioriza_teselas_enfermas_confiables():
+    probabilidades = np.array(
+        [[0.9, 0.1, 0, 0], [0.95, 0.05, 0, 0], [0.1, 0.8, 0.1, 0], [0.4, 0.3, 0.3, 0]],
+        dtype=np.float32,
+    )
+
+    resultado = agregar_rebano(probabilidades, columnas=2, umbral=0.7, min_enfermas=1)
+
+    assert resultado["veredicto"] == "Coriza"
+    assert resultado["confianza"] == pytest.approx(0.8)
+    assert resultado["distribucion"] == {"Sanas": 2, "Coriza": 1}
+    assert resultado["teselas_concluyentes"] == 3
+    assert resultado["teselas"][2]["fila"] == 1 and resultado["teselas"][2]["columna"] == 0
+
+    sanas = agregar_rebano(probabilidades, columnas=2, umbral=0.7, min_enfermas=2)
+    assert sanas["veredicto"] == "Sanas"
+
+
+def test_sesion_en_vivo_gana_el_frame_mas_reciente(monkeypatch):
+    from app.services import live_scan
+
+    hashes = {b"a": 0, b"b": 0b1, b"c": 0xFFFF}
+    monkeypatch.setattr(live_scan, "preprocesar_con_hash", lambda f: (f, hashes[f]))
+
+    async def probabilidades(tensor):
+        return np.array([0.2, 0.8, 0, 0]) if tensor == b"c" else np.array([1.0, 0, 0, 0])
+
+    monkeypatch.setattr(live_scan, "predecir_probabilidades", probabilidades)
+    sesion = live_scan.SesionEnVivo(min_cambio_bits=4, alpha=0.5, max_bytes_frame=10)
+
+    async def run():
+        mensajes = []
+
+        async def enviar(mensaje):
+            mensajes.append(mensaje)
+
+        # Sin consumidor activo, solo sobrevive el último frame del slot
+        sesion.recibir(b"x")
+        sesion.recibir(b"a")
+        sesion.recibir(b"demasiado grande")
+        tarea = asyncio.create_task(sesion.ejecutar(enviar))
+        await asyncio.sleep(0.05)
+        sesion.recibir(b"b")  # apenas distinto de "a": no pasa por el modelo
+        await asyncio.sleep(0.05)
+        sesion.recibir(b"c")
+        await asyncio.sleep(0.05)
+        sesion.cerrar()
+        await tarea
+        return mensajes
+
+    mensajes = asyncio.run(run())
+
+    stats = sesion.estadisticas()
+    assert stats["descartados"] == 1 and stats["rechazados"] == 1
+    assert stats["sin_cambio"] == 1 and stats["inferidos"] == 2
+    assert [m["resultado_frame"] for m in mensajes] == ["Sanas", "Coriza"]
+    # Promedio exponencial: 0.5 * [0.2, 0.8] + 0.5 * [1, 0]
+    assert mensajes[-1]["resultado"] == "Sanas"
+    assert mensajes[-1]["confianza"] == pytest.approx(0.6)
@@ -0,0 +1,37 @@
+import os
+from pathlib import Path
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.pool import NullPool
+
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from app.config import settings
+from app.core.database import Base
+
+BACKEND = Path(__file__).resolve().parents[1]
+
+
+def test_migraciones_crean_el_esquema_de_los_modelos(tmp_path, monkeypatch):
+    # Con TEST_DATABASE_URL (PostgreSQL) se migra esa base, que debe estar vacía
+    url = os.getenv("TEST_DATABASE_URL") or f"sqlite:///{tmp_path / 'migraciones.db'}"
+    monkeypatch.setattr(settings, "DATABASE_URL", url)
+    config = Config(str(BACKEND / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND / "alembic"))
+    config.attributes["configure_logger"] = False
+    motor = create_engine(url, poolclass=NullPool)
+
+    try:
+        command.upgrade(config, "head")
+        with motor.connect() as conexion:
+            # Sin diferencias: la migración y Base.metadata describen el mismo esquema
+            assert compare_metadata(MigrationContext.configure(conexion), Base.metadata) == []
+
+        command.downgrade(config, "base")
+        assert inspect(motor).get_table_names() == ["alembic_version"]
+    finally:
+        with motor.begin() as conexion:
+            conexion.execute(text("DROP TABLE IF EXISTS alembic_version"))
+        motor.dispose()
@@ -0,0 +1,316 @@
+import asyncio
+import json
+import time
+
+import httpx
+
+from app.config import settings
+from app.services import openrouter
+
+
+def test_completar_chat_usa_un_cliente_compartido(monkeypatch):
+    solicitudes = []
+
+    def responder(request: httpx.Request) -> httpx.Response:
+        solicitudes.append(request)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "Aislar el ave"}}]})
+
+    monkeypatch.setenv("OPENROUTER_API_KEY", "clave")
+    monkeypatch.setattr(settings, "OPENROUTER_BASE_URL", "http://llm.local/api/v1")
+
+    async def escenario():
+        cliente = openrouter.crear_cliente(transport=httpx.MockTransport(responder))
+        monkeypatch.setattr(openrouter, "_cliente", cliente)
+        respuestas = [
+            await openrouter.completar_chat([{"role": "user", "content": "hola"}]) for _ in range(3)
+        ]
+        assert openrouter.get_cliente() is cliente
+        await openrouter.cerrar_cliente()
+        return respuestas
+
+    assert asyncio.run(escenario()) == ["Aislar el ave"] * 3
+    assert {str(s.url) for s in solicitudes} == {"http://llm.local/api/v1/chat/completions"}
+    assert solicitudes[0].headers["Authorization"] == "Bearer clave"
+    assert openrouter._cliente is None
+
+
+def test_completar_chat_sin_api_key(monkeypatch):
+    monkeypatch.delenv("OPENROUTER_API_KEY", raising=False)
+    assert asyncio.run(openrouter.completar_chat([])) is None
+
+
+def test_single_flight_comparte_resultado_y_errores():
+    from app.services.single_flight import SingleFlight
+
+    vuelos = SingleFlight()
+    llamadas = []
+
+    async def upstream(valor):
+        llamadas.append(valor)
+        await asyncio.sleep(0.05)
+        if valor == "falla":
+            raise RuntimeError("OpenRouter caído")
+        return valor.upper()
+
+    async def escenario():
+        resultados = await asyncio.gather(
+            *(vuelos.ejecutar("a", lambda: upstream("a")) for _ in range(10)),
+            vuelos.ejecutar("b", lambda: upstream("b")),
+        )
+        errores = await asyncio.gather(
+            *(vuelos.ejecutar("f", lambda: upstream("falla")) for _ in range(3)),
+            return_exceptions=True,
+        )
+        # Terminada la llamada, la clave se libera y la siguiente vuelve a salir
+        await vuelos.ejecutar("a", lambda: upstream("a"))
+        return resultados, errores
+
+    resultados, errores = asyncio.run(escenario())
+
+    assert resultados == ["A"] * 10 + ["B"]
+    assert all(isinstance(e, RuntimeError) for e in errores)
+    assert llamadas == ["a", "b", "falla", "a"]
+    estadisticas = vuelos.estadisticas()
+    assert estadisticas["ahorradas"] == 11 and estadisticas["llamadas_upstream"] == 4
+    assert estadisticas["errores"] == 1 and estadisticas["en_vuelo"] == 0
+
+
+def test_single_flight_cancelar_un_llamador_no_corta_a_los_demas():
+    from app.services.single_flight import SingleFlight
+
+    vuelos = SingleFlight()
+    canceladas = []
+
+    async def upstream():
+        try:
+            await asyncio.sleep(0.1)
+            return "ok"
+        except asyncio.CancelledError:
+            canceladas.append(True)
+            raise
+
+    async def escenario():
+        primero = asyncio.ensure_future(vuelos.ejecutar("k", upstream))
+        segundo = asyncio.ensure_future(vuelos.ejecutar("k", upstream))
+        await asyncio.sleep(0.01)
+        primero.cancel()
+        resultado = await segundo
+
+        # Si se cancelan todos los que esperan, se cancela la llamada compartida
+        solo = asyncio.ensure_future(vuelos.ejecutar("k", upstream))
+        await asyncio.sleep(0.01)
+        solo.cancel()
+        await asyncio.gather(solo, return_exceptions=True)
+        await asyncio.sleep(0.01)
+        return primero.cancelled(), resultado
+
+    assert asyncio.run(escenario()) == (True, "ok")
+    assert canceladas == [True]
+    assert vuelos.estadisticas()["cancelaciones"] == 2
+
+
+def test_circuit_breaker_abre_rechaza_y_sondea():
+    from app.services.circuit_breaker import CircuitBreaker
+
+    ahora = [0.0]
+    breaker = CircuitBreaker(
+        "prueba",
+        ventana=4,
+        min_llamadas=4,
+        umbral_error=0.5,
+        latencia_lenta_s=2.0,
+        tiempo_abierto_s=10.0,
+        reloj=lambda: ahora[0],
+    )
+    for exito, duracion in [(True, 0.1), (False, 0.1), (True, 0.1), (True, 5.0)]:
+        assert breaker.permitir()
+        breaker.registrar(exito, duracion)
+
+    # Un fallo y una llamada lenta de cuatro: 50 % de error, se abre
+    assert breaker.estado == "abierto" and not breaker.disponible()
+    assert not breaker.permitir()
+
+    ahora[0] = 11.0
+    assert breaker.permitir() and breaker.estado == "semiabierto"
+    assert not breaker.permitir()  # solo una sonda a la vez
+    breaker.registrar(False, 0.1)
+    assert breaker.estado == "abierto"
+
+    ahora[0] = 22.0
+    assert breaker.permitir()
+    breaker.registrar(True, 0.1)
+    assert breaker.estado == "cerrado"
+    estadisticas = breaker.estadisticas()
+    assert estadisticas["aperturas"] == 2 and estadisticas["total_rechazadas"] == 2
+
+
+def test_plazo_recorta_timeouts_y_se_hereda_en_tareas():
+    from app.core import deadline
+
+    async def escenario():
+        assert deadline.restante() is None
+        with deadline.plazo(5):
+            with deadline.plazo(60):  # un plazo anidado más largo no lo extiende
+                assert deadline.acotar_timeout(15) <= 5
+            heredado = await asyncio.create_task(asyncio.sleep(0, deadline.restante()))
+            with deadline.plazo(0.01):
+                try:
+                    await deadline.con_plazo(asyncio.sleep(1))
+                except deadline.PlazoVencido:
+                    vencido = True
+        return heredado, vencido
+
+    heredado, vencido = asyncio.run(escenario())
+    assert 0 < heredado <= 5 and vencido
+
+
+def test_completar_chat_con_circuito_abierto_no_llama(monkeypatch):
+    from app.services.circuit_breaker import CircuitBreaker, CircuitoAbierto
+
+    solicitudes = []
+
+    def responder(request: httpx.Request) -> httpx.Response:
+        solicitudes.append(request)
+        return httpx.Response(503)
+
+    breaker = CircuitBreaker("openrouter", ventana=2, min_llamadas=2, tiempo_abierto_s=60)
+    monkeypatch.setattr(openrouter, "_breaker", breaker)
+    monkeypatch.setenv("OPENROUTER_API_KEY", "clave")
+
+    async def escenario():
+        cliente = openrouter.crear_cliente(transport=httpx.MockTransport(responder))
+        monkeypatch.setattr(openrouter, "_cliente", cliente)
+        errores = []
+        for _ in range(4):
+            try:
+                await openrouter.completar_chat([{"role": "user", "content": "hola"}])
+            except Exception as e:
+                errores.append(type(e))
+        await openrouter.cerrar_cliente()
+        return errores
+
+    errores = asyncio.run(escenario())
+
+    assert errores == [httpx.HTTPStatusError] * 2 + [CircuitoAbierto] * 2
+    assert len(solicitudes) == 2 and not openrouter.disponible()
+
+
+def test_stream_chat_entrega_fragmentos_y_libera_la_conexion_al_cerrar(monkeypatch):
+    cerrados = []
+
+    class CuerpoSSE(httpx.AsyncByteStream):
+        async def __aiter__(self):
+            yield b": OPENROUTER PROCESSING\n\n"
+            for palabra in ("Aislar ", "el ", "ave"):
+                datos = json.dumps({"choices": [{"delta": {"content": palabra}}]})
+                yield f"data: {datos}\n\n".encode()
+            yield b"data: [DONE]\n\n"
+
+        async def aclose(self):
+            cerrados.append(True)
+
+    def responder(request: httpx.Request) -> httpx.Response:
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(200, stream=CuerpoSSE())
+
+    monkeypatch.setenv("OPENROUTER_API_KEY", "clave")
+    monkeypatch.setattr(openrouter, "_breaker", None)
+
+    async def escenario():
+        cliente = openrouter.crear_cliente(transport=httpx.MockTransport(responder))
+        monkeypatch.setattr(openrouter, "_cliente", cliente)
+        mensajes = [{"role": "user", "content": "hola"}]
+        completos = [fragmento async for fragmento in openrouter.stream_chat(mensajes)]
+
+        # El cliente se va tras el primer fragmento: la respuesta se cierra igual
+        parcial = openrouter.stream_chat(mensajes)
+        primero = await parcial.__anext__()
+        await parcial.aclose()
+        await openrouter.cerrar_cliente()
+        return completos, primero
+
+    completos, primero = asyncio.run(escenario())
+
+    assert completos == ["Aislar ", "el ", "ave"] and primero == "Aislar "
+    assert cerrados == [True, True]
+
+
+def test_stream_chat_cortado_a_mitad_cuenta_como_fallo(monkeypatch):
+    from app.services.circuit_breaker import CircuitBreaker
+
+    class CuerpoCortado(httpx.AsyncByteStream):
+        async def __aiter__(self):
+            datos = json.dumps({"choices": [{"delta": {"content": "Aislar "}}]})
+            yield f"data: {datos}\n\n".encode()
+            raise httpx.ReadError("conexión cortada")
+
+    breaker = CircuitBreaker("openrouter", ventana=1, min_llamadas=1, tiempo_abierto_s=60)
+    monkeypatch.setattr(openrouter, "_breaker", breaker)
+    monkeypatch.setenv("OPENROUTER_API_KEY", "clave")
+
+    async def escenario():
+        cliente = openrouter.crear_cliente(
+            transport=httpx.MockTransport(lambda _: httpx.Response(200, stream=CuerpoCortado()))
+        )
+        monkeypatch.setattr(openrouter, "_cliente", cliente)
+        recibidos = []
+        try:
+            async for fragmento in openrouter.stream_chat([{"role": "user", "content": "hola"}]):
+                recibidos.append(fragmento)
+        except httpx.ReadError:
+            pass
+        await openrouter.cerrar_cliente()
+        return recibidos
+
+    assert asyncio.run(escenario()) == ["Aislar "]
+    # Una sola llamada registrada, como fallo: el primer fragmento no la cuenta como éxito
+    estadisticas = breaker.estadisticas()
+    assert estadisticas["total_llamadas"] == 1 and estadisticas["total_fallos"] == 1
+    assert not openrouter.disponible()
+
+
+def test_plazo_corta_respuestas_que_llegan_de_a_poco(monkeypatch):
+    from app.core import deadline
+    from app.services.circuit_breaker import CircuitBreaker
+
+    class CuerpoLento(httpx.AsyncByteStream):
+        # Cada lectura llega a tiempo (no vence el timeout de httpx) pero nunca termina
+        async def __aiter__(self):
+            datos = json.dumps({"choices": [{"delta": {"content": "Aislar "}}]})
+            yield f"data: {datos}\n\n".encode()
+            while True:
+                await asyncio.sleep(0.02)
+                yield b": OPENROUTER PROCESSING\n\n"
+
+    breaker = CircuitBreaker("openrouter", ventana=1, min_llamadas=1, tiempo_abierto_s=60)
+    monkeypatch.setattr(openrouter, "_breaker", breaker)
+    monkeypatch.setenv("OPENROUTER_API_KEY", "clave")
+    mensajes = [{"role": "user", "content": "hola"}]
+
+    async def escenario():
+        cliente = openrouter.crear_cliente(
+            transport=httpx.MockTransport(lambda _: httpx.Response(200, stream=CuerpoLento()))
+        )
+        monkeypatch.setattr(openrouter, "_cliente", cliente)
+        duraciones, recibidos = [], []
+        for llamada in ("completar", "stream"):
+            inicio = time.monotonic()
+            with deadline.plazo(0.2):
+                try:
+                    if llamada == "completar":
+                        await openrouter.completar_chat(mensajes)
+                    else:
+                        async for fragmento in openrouter.stream_chat(mensajes):
+                            recibidos.append(fragmento)
+                except deadline.PlazoVencido:
+                    duraciones.append(time.monotonic() - inicio)
+        await openrouter.cerrar_cliente()
+        return duraciones, recibidos
+
+    duraciones, recibidos = asyncio.run(escenario())
+
+    assert len(duraciones) == 2 and all(d < 1 for d in duraciones)
+    assert recibidos == ["Aislar "]
+    # Venció nuestro plazo, no el de OpenRouter: ninguna de las dos cuenta como fallo
+    estadisticas = breaker.estadisticas()
+    assert estadisticas["total_fallos"] == 0 and openrouter.disponible()
@@ -0,0 +1,333 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.recommendation_cache import RecommendationCacheEntry
+from app.models.user import User
+from app.services import diagnosis, recommendation_cache
+from app.services.recommendation_cache import ConsultaRecomendacion, RecommendationCache
+
+
+def consulta(clase="Coriza", confianza=0.83, sintomas=("Tos",)):
+    return ConsultaRecomendacion(clase, confianza, sintomas, 0.1, "modelo")
+
+
+def test_consultas_equivalentes_comparten_clave():
+    base = consulta(sintomas=["Tos", "Diarrea"])
+
+    assert consulta(confianza=0.89, sintomas=["diarrea ", "tos", "Tos"]).clave == base.clave
+    assert consulta(confianza=0.91, sintomas=["Tos", "Diarrea"]).clave != base.clave
+    assert consulta(clase="Newcastle", sintomas=["Tos", "Diarrea"]).clave != base.clave
+    assert (
+        base.diagnostico
+        == "Coriza - Nivel de confianza: 80%-90% - Síntomas reportados: diarrea, tos"
+    )
+
+
+def test_cache_persiste_vence_y_expulsa_las_menos_usadas(db):
+    cache = RecommendationCache(ttl_segundos=3600, max_entradas=2)
+    cache.set(db, consulta(sintomas=["a"]), "A")
+    cache.set(db, consulta(sintomas=["b"]), "B")
+
+    # Otra instancia (otro proceso) la encuentra en la tabla
+    otra = RecommendationCache(ttl_segundos=3600, max_entradas=2)
+    assert otra.get(db, consulta(sintomas=["a"])) == "A"
+    assert otra.hits_db == 1 and otra.get(db, consulta(sintomas=["a"])) == "A"
+    assert otra.hits_memoria == 1
+
+    # "b" es la usada hace más tiempo: sale al superar el tope
+    otra.set(db, consulta(sintomas=["c"]), "C")
+    claves = {e.clave for e in db.query(RecommendationCacheEntry).all()}
+    assert claves == {consulta(sintomas=["a"]).clave, consulta(sintomas=["c"]).clave}
+
+    entrada = db.get(RecommendationCacheEntry, consulta(sintomas=["c"]).clave)
+    entrada.creado_en = datetime.utcnow() - timedelta(hours=2)
+    db.commit()
+    assert RecommendationCache(3600, 2).get(db, consulta(sintomas=["c"])) is None
+
+
+def test_los_aciertos_se_vuelcan_a_la_tabla_por_lotes(db, monkeypatch):
+    RecommendationCache(3600, 10).set(db, consulta(), "A")
+    cache = RecommendationCache(3600, 10, volcado_segundos=60)
+    commits = []
+    monkeypatch.setattr(db, "commit", lambda _original=db.commit: commits.append(_original()))
+
+    for _ in range(3):
+        assert cache.get(db, consulta()) == "A"
+    assert not commits and db.get(RecommendationCacheEntry, consulta().clave).hits == 0
+
+    cache.volcar_hits(db)
+    db.expire_all()
+    assert db.get(RecommendationCacheEntry, consulta().clave).hits == 3
+
+    # Vencido el intervalo, la próxima lectura desde la tabla vuelca con un solo commit
+    otra = RecommendationCache(3600, 10, volcado_segundos=0)
+    assert otra.get(db, consulta()) == "A" and len(commits) == 1
+    db.expire_all()
+    assert db.get(RecommendationCacheEntry, consulta().clave).hits == 4
+
+
+@pytest.mark.parametrize("en_cache", [True, False])
+def test_guardar_diagnostico_usa_la_cache_antes_que_openrouter(db, monkeypatch, en_cache):
+    user = User(username="cache", email="cache@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    cache = RecommendationCache(ttl_segundos=3600, max_entradas=10)
+    monkeypatch.setattr(recommendation_cache, "_cache", cache)
+    monkeypatch.setenv("OPENROUTER_API_KEY", "clave")
+    programadas = []
+    monkeypatch.setattr(
+        diagnosis, "programar_recomendacion", lambda *args: programadas.append(args)
+    )
+
+    resultado = diagnosis.ajustar_diagnostico("Coriza", ["Tos"], 0.87)
+    if en_cache:
+        cache.set(db, recommendation_cache.normalizar_consulta("Coriza", 0.82, ["tos"]), "IA")
+
+    guardado = asyncio.run(
+        diagnosis.guardar_diagnostico(
+            db=db, user=user, resultado=resultado, archivo="a.jpg", sintomas=["Tos"]
+        )
+    )
+
+    if en_cache:
+        assert guardado.recomendacion == "IA" and not programadas
+        assert diagnosis.estado_recomendacion(guardado) == "completa"
+    else:
+        assert diagnosis.estado_recomendacion(guardado) == "pendiente" and len(programadas) == 1
+
+
+def test_diagnosticos_concurrentes_comparten_una_llamada_a_openrouter(db_async, monkeypatch):
+    # Base en archivo: las actualizaciones concurrentes corren en hilos con conexiones propias
+    db = db_async
+    from sqlalchemy.orm import sessionmaker
+
+    from app.services.single_flight import SingleFlight
+
+    user = User(username="brote", email="brote@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    llamadas = []
+
+    async def openrouter(texto, sintomas, al_recibir=None):
+        llamadas.append(texto)
+        await asyncio.sleep(0.05)
+        return "Vacunar al lote"
+
+    monkeypatch.setattr(recommendation_cache, "_cache", RecommendationCache(3600, 10))
+    monkeypatch.setattr(diagnosis, "_vuelos_openrouter", SingleFlight())
+    monkeypatch.setattr(diagnosis, "recomendacion_openrouter", openrouter)
+    monkeypatch.setattr(diagnosis, "SessionLocal", sessionmaker(bind=db.get_bind()))
+    monkeypatch.setenv("OPENROUTER_API_KEY", "clave")
+    monkeypatch.setattr(diagnosis, "programar_recomendacion", lambda *args: None)
+
+    resultado = diagnosis.ajustar_diagnostico("Newcastle", ["Tos"], 0.95)
+    filas = [
+        asyncio.run(
+            diagnosis.guardar_diagnostico(
+                db=db, user=user, resultado=resultado, archivo=f"{i}.jpg", sintomas=["Tos"]
+            )
+        )
+        for i in range(5)
+    ]
+    consulta_normalizada = recommendation_cache.normalizar_consulta("Newcastle", 0.95, ["Tos"])
+
+    async def brote():
+        await asyncio.gather(
+            *(diagnosis.completar_recomendacion(f.id, consulta_normalizada) for f in filas)
+        )
+
+    asyncio.run(brote())
+
+    assert len(llamadas) == 1
+    for fila in filas:
+        db.refresh(fila)
+        assert fila.recomendacion == "Vacunar al lote"
+    assert diagnosis.estadisticas_recomendaciones()["single_flight"]["ahorradas"] == 4
+
+
+def test_la_recomendacion_en_segundo_plano_no_usa_la_base_en_el_event_loop(db, monkeypatch):
+    import threading
+
+    from sqlalchemy.orm import sessionmaker
+
+    from app.services.single_flight import SingleFlight
+
+    user = User(username="hilos", email="hilos@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    fila = diagnosis.construir_diagnostico(
+        user_id=user.id,
+        resultado=diagnosis.ajustar_diagnostico("Coriza", ["Tos"], 0.7),
+        archivo="a.jpg",
+        sintomas=["Tos"],
+        recomendacion="Locales",
+        estado_recomendacion=diagnosis.RECOMENDACION_PENDIENTE,
+    )
+    db.add(fila)
+    db.commit()
+    sesiones = sessionmaker(bind=db.get_bind())
+    hilos = []
+
+    def sesion_en_hilo():
+        hilos.append(threading.get_ident())
+        return sesiones()
+
+    async def openrouter(texto, sintomas, al_recibir=None):
+        return "Aislar el ave"
+
+    monkeypatch.setattr(recommendation_cache, "_cache", RecommendationCache(3600, 10))
+    monkeypatch.setattr(diagnosis, "_vuelos_openrouter", SingleFlight())
+    monkeypatch.setattr(diagnosis, "recomendacion_openrouter", openrouter)
+    monkeypatch.setattr(diagnosis, "SessionLocal", sesion_en_hilo)
+    consulta_normalizada = recommendation_cache.normalizar_consulta("Coriza", 0.7, ["Tos"])
+
+    asyncio.run(diagnosis.completar_recomendacion(fila.id, consulta_normalizada))
+
+    # Una sesión para la caché y otra para el diagnóstico, ninguna en el hilo del loop
+    assert len(hilos) == 2 and threading.get_ident() not in hilos
+    db.refresh(fila)
+    assert fila.recomendacion == "Aislar el ave"
+
+
+def test_error_de_openrouter_se_comparte_y_se_conservan_las_locales(db_async, monkeypatch):
+    # Base en archivo: las actualizaciones concurrentes corren en hilos con conexiones propias
+    db = db_async
+    import httpx
+    from sqlalchemy.orm import sessionmaker
+
+    from app.config import settings
+    from app.services.single_flight import SingleFlight
+
+    user = User(username="sin_red", email="sin_red@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    llamadas = []
+
+    async def completar_chat(mensajes):
+        llamadas.append(mensajes)
+        await asyncio.sleep(0.05)
+        raise httpx.ConnectError("sin conexión")
+
+    monkeypatch.setattr(recommendation_cache, "_cache", RecommendationCache(3600, 10))
+    monkeypatch.setattr(diagnosis, "_vuelos_openrouter", SingleFlight())
+    monkeypatch.setattr(diagnosis, "completar_chat", completar_chat)
+    monkeypatch.setattr(diagnosis, "SessionLocal", sessionmaker(bind=db.get_bind()))
+    monkeypatch.setattr(settings, "OPENROUTER_STREAM", False)
+    monkeypatch.setenv("OPENROUTER_API_KEY", "clave")
+    monkeypatch.setattr(diagnosis, "programar_recomendacion", lambda *args: None)
+
+    resultado = diagnosis.ajustar_diagnostico("Coriza", ["Tos"], 0.9)
+    filas = [
+        asyncio.run(
+            diagnosis.guardar_diagnostico(
+                db=db, user=user, resultado=resultado, archivo=f"{i}.jpg", sintomas=["Tos"]
+            )
+        )
+        for i in range(3)
+    ]
+    consulta_normalizada = recommendation_cache.normalizar_consulta("Coriza", 0.9, ["Tos"])
+
+    async def brote():
+        await asyncio.gather(
+            *(diagnosis.completar_recomendacion(f.id, consulta_normalizada) for f in filas)
+        )
+
+    asyncio.run(brote())
+
+    # Una sola llamada, y su error llega a todos los diagnósticos que la esperaban
+    assert len(llamadas) == 1
+    for fila in filas:
+        db.refresh(fila)
+        assert diagnosis.estado_recomendacion(fila) == "local"
+    assert diagnosis.estadisticas_recomendaciones()["single_flight"]["errores"] == 1
+
+
+def test_diagnostico_que_se_suma_a_una_llamada_en_vuelo_no_deja_generaciones(db, monkeypatch):
+    from sqlalchemy.orm import sessionmaker
+
+    from app.config import settings
+    from app.services.single_flight import SingleFlight
+
+    user = User(username="tarde", email="tarde@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    fila = diagnosis.construir_diagnostico(
+        user_id=user.id,
+        resultado=diagnosis.ajustar_diagnostico("Gumboro", ["Tos"], 0.8),
+        archivo="a.jpg",
+        sintomas=["Tos"],
+        recomendacion="Locales",
+        estado_recomendacion=diagnosis.RECOMENDACION_PENDIENTE,
+    )
+    db.add(fila)
+    db.commit()
+    monkeypatch.setattr(recommendation_cache, "_cache", RecommendationCache(3600, 10))
+    monkeypatch.setattr(diagnosis, "_vuelos_openrouter", SingleFlight())
+    monkeypatch.setattr(diagnosis, "_en_curso", {})
+    monkeypatch.setattr(diagnosis, "SessionLocal", sessionmaker(bind=db.get_bind()))
+    monkeypatch.setattr(settings, "RECOMMENDATION_POLL_SECONDS", 30.0)
+    consulta_normalizada = recommendation_cache.normalizar_consulta("Gumboro", 0.8, ["Tos"])
+
+    async def escenario():
+        liberar = asyncio.Event()
+
+        async def llamada_sin_generacion():
+            await liberar.wait()
+            return "Vacunar al lote"
+
+        # La llamada sigue en vuelo pero ya quitó su generación de _en_curso
+        vuelo = asyncio.ensure_future(
+            diagnosis._vuelos_openrouter.ejecutar(
+                consulta_normalizada.clave, llamada_sin_generacion
+            )
+        )
+        await asyncio.sleep(0)
+        diagnosis.programar_recomendacion(fila.id, consulta_normalizada)
+        en_curso = diagnosis._en_curso[consulta_normalizada.clave]
+
+        async def suscriptor():
+            return [f async for f in diagnosis.fragmentos_recomendacion(fila.id)]
+
+        stream = asyncio.ensure_future(suscriptor())
+        await asyncio.sleep(0)
+        liberar.set()
+        await vuelo
+        await asyncio.gather(*diagnosis._tareas_recomendacion)
+        # El stream termina con la tarea, sin esperar al siguiente sondeo
+        return en_curso, await asyncio.wait_for(stream, 1)
+
+    en_curso, fragmentos = asyncio.run(escenario())
+
+    assert fragmentos == [] and en_curso.terminada and diagnosis._en_curso == {}
+    db.refresh(fila)
+    assert fila.recomendacion == "Vacunar al lote"
+
+
+def test_con_circuito_abierto_se_guardan_las_locales_sin_esperar(db, monkeypatch):
+    from app.services import openrouter
+    from app.services.circuit_breaker import CircuitBreaker
+
+    user = User(username="caido", email="caido@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    breaker = CircuitBreaker("openrouter", ventana=1, min_llamadas=1, tiempo_abierto_s=60)
+    breaker.registrar(False, 15.0)
+    monkeypatch.setattr(openrouter, "_breaker", breaker)
+    monkeypatch.setattr(recommendation_cache, "_cache", RecommendationCache(3600, 10))
+    monkeypatch.setenv("OPENROUTER_API_KEY", "clave")
+    programadas = []
+    monkeypatch.setattr(
+        diagnosis, "programar_recomendacion", lambda *args: programadas.append(args)
+    )
+
+    resultado = diagnosis.ajustar_diagnostico("Gumboro", ["fiebre"], 0.7)
+    guardado = asyncio.run(
+        diagnosis.guardar_diagnostico(
+            db=db, user=user, resultado=resultado, archivo="a.jpg", sintomas=["fiebre"]
+        )
+    )
+
+    assert diagnosis.estado_recomendacion(guardado) == "local" and not programadas
+    assert "Mantener reposo" in guardado.recomendacion
@@ -0,0 +1,89 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.config import settings
+from app.models.user import User
+from app.services import diagnosis, recommendation_table
+from app.services.recommendation_cache import normalizar_consulta
+from app.services.recommendation_table import TablaRecomendaciones, escribir_tabla
+
+
+def generar_tabla(ruta, textos):
+    entradas = {
+        normalizar_consulta(clase, confianza, sintomas).clave: texto
+        for (clase, confianza, sintomas), texto in textos.items()
+    }
+    metadatos = {
+        "granularidad": settings.RECOMMENDATION_CACHE_CONFIDENCE_STEP,
+        "modelo": settings.OPENROUTER_MODEL,
+        "max_sintomas": 1,
+    }
+    escribir_tabla(str(ruta), entradas, metadatos)
+    return str(ruta)
+
+
+def test_tabla_encuentra_consultas_equivalentes_y_comparte_textos(tmp_path):
+    ruta = generar_tabla(
+        tmp_path / "tabla.bin",
+        {
+            ("Coriza", 0.85, ("Tos",)): "Aislar",
+            ("Coriza", 0.85, ()): "Aislar",
+            ("Newcastle", 0.95, ("Diarrea",)): "Vacunar",
+        },
+    )
+    tabla = TablaRecomendaciones(ruta)
+    try:
+        assert tabla.buscar(normalizar_consulta("Coriza", 0.81, ["tos "])) == "Aislar"
+        assert tabla.buscar(normalizar_consulta("Newcastle", 0.99, ["Diarrea"])) == "Vacunar"
+        assert tabla.buscar(normalizar_consulta("Coriza", 0.75, ["Tos"])) is None
+        assert tabla.estadisticas()["cobertura"] == 2 / 3
+        assert tabla.compatible(settings.RECOMMENDATION_CACHE_CONFIDENCE_STEP, "otro") is False
+    finally:
+        tabla.cerrar()
+
+
+def test_guardar_diagnostico_responde_desde_la_tabla_sin_openrouter(db, tmp_path, monkeypatch):
+    ruta = generar_tabla(tmp_path / "tabla.bin", {("Coriza", 0.85, ("Tos",)): "Precalculada"})
+    monkeypatch.setattr(settings, "RECOMMENDATION_TABLE_PATH", ruta)
+    monkeypatch.delenv("OPENROUTER_API_KEY", raising=False)
+    programadas = []
+    monkeypatch.setattr(
+        diagnosis, "programar_recomendacion", lambda *args: programadas.append(args)
+    )
+    user = User(username="tabla", email="tabla@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+
+    recommendation_table.cargar_tabla()
+    try:
+        guardados = [
+            asyncio.run(
+                diagnosis.guardar_diagnostico(
+                    db=db,
+                    user=user,
+                    resultado=diagnosis.ajustar_diagnostico("Coriza", sintomas, 0.87),
+                    archivo="a.jpg",
+                    sintomas=sintomas,
+                )
+            )
+            for sintomas in (["Tos"], ["Diarrea"])
+        ]
+    finally:
+        recommendation_table.liberar_tabla()
+
+    assert guardados[0].recomendacion == "Precalculada"
+    assert diagnosis.estado_recomendacion(guardados[0]) == "completa"
+    # Sin entrada en la tabla y sin clave de OpenRouter quedan las locales
+    assert diagnosis.estado_recomendacion(guardados[1]) == "local" and not programadas
+
+
+def test_tabla_encuentra_claves_que_terminan_en_byte_nulo(tmp_path):
+    claves = ["57be928fe543b21b5865ec6cf5053000", "00" * 16, "0123456789abcdef0123456789abcdef"]
+    ruta = str(tmp_path / "tabla.bin")
+    escribir_tabla(ruta, {clave: f"texto {clave}" for clave in claves}, {"max_sintomas": 1})
+    tabla = TablaRecomendaciones(ruta)
+    try:
+        for clave in claves:
+            assert tabla.buscar(SimpleNamespace(clave=clave)) == f"texto {clave}"
+    finally:
+        tabla.cerrar()
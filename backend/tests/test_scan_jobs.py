@@ -0,0 +1,100 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app.config import settings
+from app.core.database import crear_motor_asincrono
+from app.models.scan_job import ScanJob
+from app.models.user import User
+from app.services import scan_jobs
+
+
+@pytest.fixture
+def usuario(db):
+    user = User(username="cola", email="cola@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    return user
+
+
+def test_reclamar_no_entrega_el_mismo_trabajo_dos_veces(db, usuario):
+    job = scan_jobs.encolar_escaneo(db, usuario.id, "a.jpg", b"img", [])
+
+    tomado = scan_jobs.reclamar_trabajo(db)
+
+    assert tomado.id == job.id and tomado.estado == "procesando" and tomado.intentos == 1
+    assert scan_jobs.reclamar_trabajo(db) is None
+
+
+def test_trabajo_fallido_se_reintenta_con_espera_y_luego_falla(db, usuario, monkeypatch):
+    async def falla(*args, **kwargs):
+        raise RuntimeError("modelo caído")
+
+    monkeypatch.setattr(scan_jobs, "predecir_bytes", falla)
+    monkeypatch.setattr(settings, "SCAN_JOB_MAX_ATTEMPTS", 2)
+    job = scan_jobs.encolar_escaneo(db, usuario.id, "a.jpg", b"img", [])
+
+    asyncio.run(scan_jobs.procesar_trabajo(db, scan_jobs.reclamar_trabajo(db)))
+    assert job.estado == "pendiente" and job.error == "modelo caído"
+    assert job.disponible_en > datetime.utcnow()
+    assert scan_jobs.reclamar_trabajo(db) is None  # todavía en espera
+
+    job.disponible_en = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    asyncio.run(scan_jobs.procesar_trabajo(db, scan_jobs.reclamar_trabajo(db)))
+    assert job.estado == "fallido" and job.intentos == 2 and job.imagen is None
+
+
+def test_trabajo_completado_guarda_el_diagnostico(db, usuario, monkeypatch):
+    async def prediccion(*args, **kwargs):
+        return "Sanas", 0.93
+
+    monkeypatch.setattr(scan_jobs, "predecir_bytes", prediccion)
+    monkeypatch.delenv("OPENROUTER_API_KEY", raising=False)
+    job = scan_jobs.encolar_escaneo(db, usuario.id, "a.jpg", b"img", ["Tos"])
+
+    asyncio.run(scan_jobs.procesar_trabajo(db, scan_jobs.reclamar_trabajo(db)))
+
+    db.refresh(job)
+    assert job.estado == "completado" and job.diagnosis_id is not None
+    assert job.imagen is None
+    assert db.query(ScanJob).filter(ScanJob.estado == "pendiente").count() == 0
+
+
+def test_worker_procesa_la_cola_con_sesion_asincrona(db_async, monkeypatch):
+    db = db_async
+    user = User(username="cola", email="cola@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+
+    async def prediccion(*args, **kwargs):
+        return "Sanas", 0.93
+
+    monkeypatch.setattr(scan_jobs, "predecir_bytes", prediccion)
+    monkeypatch.delenv("OPENROUTER_API_KEY", raising=False)
+    monkeypatch.setattr(settings, "SCAN_JOB_WORKERS", 1)
+    job = scan_jobs.encolar_escaneo(db, user.id, "a.jpg", b"img", ["Tos"])
+    motor = crear_motor_asincrono(str(db.get_bind().url), poolclass=NullPool)
+    monkeypatch.setattr(
+        scan_jobs, "AsyncSessionLocal", async_sessionmaker(motor, expire_on_commit=False)
+    )
+
+    async def correr():
+        scan_jobs.iniciar_workers()
+        try:
+            for _ in range(200):
+                await asyncio.sleep(0.01)
+                db.expire_all()
+                if job.estado == "completado":
+                    break
+        finally:
+            await scan_jobs.detener_workers()
+            await motor.dispose()
+
+    asyncio.run(correr())
+
+    db.refresh(job)
+    assert job.estado == "completado" and job.diagnosis_id is not None